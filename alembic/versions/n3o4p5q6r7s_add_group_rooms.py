@@ -0,0 +1,66 @@
+"""add group rooms, room members and room messages
+
+Revision ID: n3o4p5q6r7s
+Revises: m2n3o4p5q6r
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "n3o4p5q6r7s"
+down_revision = "m2n3o4p5q6r"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # tables may already exist when init_db() ran create_all before migrating
+    if "rooms" not in tables:
+        op.create_table(
+            "rooms",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), server_default=sa.sql.expression.false(), nullable=False),
+        )
+        op.create_index("ix_rooms_id", "rooms", ["id"])
+        op.create_index("ix_rooms_owner_id", "rooms", ["owner_id"])
+
+    if "room_members" not in tables:
+        op.create_table(
+            "room_members",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("role", sa.String(), server_default="member", nullable=False),
+            sa.Column("joined_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.UniqueConstraint("room_id", "user_id", name="uq_room_members_room_user"),
+        )
+        op.create_index("ix_room_members_id", "room_members", ["id"])
+        op.create_index("ix_room_members_user_id", "room_members", ["user_id"])
+
+    if "room_messages" not in tables:
+        op.create_table(
+            "room_messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=False),
+            sa.Column("user_from_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("text", sa.String(), nullable=False),
+            sa.Column("image_url", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_room_messages_id", "room_messages", ["id"])
+        op.create_index("ix_room_messages_user_from_id", "room_messages", ["user_from_id"])
+        op.create_index("ix_room_messages_room_id_id", "room_messages", ["room_id", "id"])
+
+
+def downgrade():
+    op.drop_table("room_messages")
+    op.drop_table("room_members")
+    op.drop_table("rooms")
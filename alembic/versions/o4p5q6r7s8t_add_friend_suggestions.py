@@ -0,0 +1,62 @@
+"""add materialized friend_suggestions table
+
+Revision ID: o4p5q6r7s8t
+Revises: n3o4p5q6r7s
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "o4p5q6r7s8t"
+down_revision = "n3o4p5q6r7s"
+branch_labels = None
+depends_on = None
+
+
+# (user, candidate, mutual_count) for every friend-of-friend pair that is not
+# already a friendship. Mirrors friend_service.REBUILD_SUGGESTIONS_SQL.
+BACKFILL_SQL = """
+INSERT INTO friend_suggestions (user_id, candidate_id, mutual_count)
+WITH edges AS (
+    SELECT user_id AS u, friend_id AS v FROM friends
+    WHERE is_accepted = true AND is_active = false
+    UNION
+    SELECT friend_id AS u, user_id AS v FROM friends
+    WHERE is_accepted = true AND is_active = false
+)
+SELECT e1.u, e2.v, COUNT(DISTINCT e1.v)
+FROM edges e1
+JOIN edges e2 ON e2.u = e1.v
+WHERE e2.v <> e1.u
+  AND NOT EXISTS (SELECT 1 FROM edges e3 WHERE e3.u = e1.u AND e3.v = e2.v)
+GROUP BY e1.u, e2.v
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # table may already exist when init_db() ran create_all before migrating
+    if "friend_suggestions" not in tables:
+        op.create_table(
+            "friend_suggestions",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("candidate_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("mutual_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index(
+            "ix_friend_suggestions_user_rank",
+            "friend_suggestions",
+            ["user_id", "mutual_count", "candidate_id"],
+        )
+
+    op.execute("DELETE FROM friend_suggestions")
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade():
+    op.drop_table("friend_suggestions")
@@ -0,0 +1,106 @@
+"""add canonical (low_id, high_id) pair columns and indexes to friends
+
+Revision ID: p5q6r7s8t9u
+Revises: o4p5q6r7s8t
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "p5q6r7s8t9u"
+down_revision = "o4p5q6r7s8t"
+branch_labels = None
+depends_on = None
+
+# rows updated per backfill statement; each batch commits on its own
+BATCH_SIZE = 5000
+
+BACKFILL_BATCH_SQL = sa.text(
+    """
+    UPDATE friends
+    SET low_id = CASE WHEN user_id < friend_id THEN user_id ELSE friend_id END,
+        high_id = CASE WHEN user_id < friend_id THEN friend_id ELSE user_id END
+    WHERE id IN (SELECT id FROM friends WHERE low_id IS NULL ORDER BY id LIMIT :batch)
+    """
+)
+
+# the unique live-pair index cannot be built while a pair has several live
+# rows (possible from racing requests); keep the newest, preferring accepted,
+# and mark the rest removed like remove_friend does
+DEDUPE_LIVE_SQL = """
+UPDATE friends
+SET is_active = true
+WHERE is_active = false
+  AND EXISTS (
+    SELECT 1 FROM friends keep
+    WHERE keep.low_id = friends.low_id
+      AND keep.high_id = friends.high_id
+      AND keep.is_active = false
+      AND (
+        (keep.is_accepted = true AND friends.is_accepted = false)
+        OR (keep.is_accepted = friends.is_accepted AND keep.id > friends.id)
+      )
+  )
+"""
+
+LIVE = sa.text("is_active = false")
+PENDING = sa.text("is_active = false AND is_accepted = false")
+ACCEPTED = sa.text("is_active = false AND is_accepted = true")
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns("friends")}
+    indexes = {i["name"] for i in inspector.get_indexes("friends")}
+
+    # columns may already exist when init_db() ran create_all before migrating
+    if "low_id" not in columns:
+        op.add_column("friends", sa.Column("low_id", sa.Integer(), nullable=True))
+    if "high_id" not in columns:
+        op.add_column("friends", sa.Column("high_id", sa.Integer(), nullable=True))
+
+    # env.py runs the migration in one transaction; commit every batch
+    # instead, so locks are held for one batch at a time. Re-running after a
+    # failure resumes with the rows still NULL.
+    with op.get_context().autocommit_block():
+        while bind.execute(BACKFILL_BATCH_SQL, {"batch": BATCH_SIZE}).rowcount:
+            pass
+
+    if bind.dialect.name != "sqlite":
+        # SQLite cannot alter nullability in place; the ORM always fills both
+        op.alter_column("friends", "low_id", nullable=False)
+        op.alter_column("friends", "high_id", nullable=False)
+
+    op.execute(DEDUPE_LIVE_SQL)
+
+    def create(name, columns, unique=False, where=None):
+        if name in indexes:
+            return
+        op.create_index(
+            name,
+            "friends",
+            columns,
+            unique=unique,
+            sqlite_where=where,
+            postgresql_where=where,
+        )
+
+    create("ix_friends_pair", ["low_id", "high_id"])
+    create("uq_friends_live_pair", ["low_id", "high_id"], unique=True, where=LIVE)
+    create("ix_friends_pending_recipient", ["friend_id", "user_id"], where=PENDING)
+    create("ix_friends_accepted_user", ["user_id", "friend_id"], where=ACCEPTED)
+    create("ix_friends_accepted_friend", ["friend_id", "user_id"], where=ACCEPTED)
+
+
+def downgrade():
+    op.drop_index("ix_friends_accepted_friend", table_name="friends")
+    op.drop_index("ix_friends_accepted_user", table_name="friends")
+    op.drop_index("ix_friends_pending_recipient", table_name="friends")
+    op.drop_index("uq_friends_live_pair", table_name="friends")
+    op.drop_index("ix_friends_pair", table_name="friends")
+    with op.batch_alter_table("friends") as batch:
+        batch.drop_column("high_id")
+        batch.drop_column("low_id")
@@ -0,0 +1,57 @@
+"""add indexed random_key to users for random sampling
+
+Revision ID: q6r7s8t9u0v
+Revises: p5q6r7s8t9u
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "q6r7s8t9u0v"
+down_revision = "p5q6r7s8t9u"
+branch_labels = None
+depends_on = None
+
+# users updated per backfill statement (one commit each)
+BATCH_SIZE = 5000
+
+# uniform value in [0, 1); SQLite's random() is a signed 64-bit integer
+RANDOM_EXPR = {
+    "sqlite": "(random() / 18446744073709551616.0 + 0.5)",
+    "postgresql": "random()",
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns("users")}
+    indexes = {i["name"] for i in inspector.get_indexes("users")}
+
+    # column may already exist when init_db() ran create_all before migrating
+    if "random_key" not in columns:
+        op.add_column("users", sa.Column("random_key", sa.Float(), nullable=True))
+
+    random_expr = RANDOM_EXPR.get(bind.dialect.name, "random()")
+    backfill = sa.text(
+        f"""
+        UPDATE users SET random_key = {random_expr}
+        WHERE id IN (SELECT id FROM users WHERE random_key IS NULL ORDER BY id LIMIT :batch)
+        """
+    )
+    # outside the migration transaction, so every batch commits and releases
+    # its locks; an interrupted backfill resumes with the remaining NULL keys
+    with op.get_context().autocommit_block():
+        while bind.execute(backfill, {"batch": BATCH_SIZE}).rowcount:
+            pass
+
+    if "ix_users_random_key" not in indexes:
+        op.create_index("ix_users_random_key", "users", ["random_key"])
+
+
+def downgrade():
+    op.drop_index("ix_users_random_key", table_name="users")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("random_key")
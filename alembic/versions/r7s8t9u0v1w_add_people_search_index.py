@@ -0,0 +1,83 @@
+"""add people-search index on users (FTS5 on SQLite, pg_trgm on Postgres)
+
+Revision ID: r7s8t9u0v1w
+Revises: q6r7s8t9u0v
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "r7s8t9u0v1w"
+down_revision = "q6r7s8t9u0v"
+branch_labels = None
+depends_on = None
+
+# Mirrors services/search_service.SQLITE_FTS_DDL / POSTGRES_TRGM_DDL.
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, full_name, email,
+        content='users', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_au
+    AFTER UPDATE OF username, full_name, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+        INSERT INTO users_fts(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+    # (re)index every existing user
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS users_fts_au",
+    "DROP TRIGGER IF EXISTS users_fts_ad",
+    "DROP TRIGGER IF EXISTS users_fts_ai",
+    "DROP TABLE IF EXISTS users_fts",
+]
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+]
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_users_email_trgm",
+    "DROP INDEX IF EXISTS ix_users_full_name_trgm",
+    "DROP INDEX IF EXISTS ix_users_username_trgm",
+]
+
+
+def _statements(upgrade: bool):
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        return SQLITE_UPGRADE if upgrade else SQLITE_DOWNGRADE
+    if dialect == "postgresql":
+        return POSTGRES_UPGRADE if upgrade else POSTGRES_DOWNGRADE
+    return []
+
+
+def upgrade():
+    for sql in _statements(upgrade=True):
+        op.execute(sql)
+
+
+def downgrade():
+    for sql in _statements(upgrade=False):
+        op.execute(sql)
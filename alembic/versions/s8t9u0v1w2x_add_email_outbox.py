@@ -0,0 +1,43 @@
+"""add email_outbox table for background email delivery
+
+Revision ID: s8t9u0v1w2x
+Revises: r7s8t9u0v1w
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "s8t9u0v1w2x"
+down_revision = "r7s8t9u0v1w"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # table may already exist when init_db() ran create_all before migrating
+    if "email_outbox" not in tables:
+        op.create_table(
+            "email_outbox",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("recipient", sa.String(), nullable=False),
+            sa.Column("subject", sa.String(), nullable=False),
+            sa.Column("body", sa.Text(), nullable=False),
+            sa.Column("html", sa.Text(), nullable=True),
+            sa.Column("status", sa.String(), server_default="pending", nullable=False),
+            sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("available_at", sa.Float(), nullable=False),
+            sa.Column("last_error", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_email_outbox_due", "email_outbox", ["status", "available_at"])
+
+
+def downgrade():
+    op.drop_index("ix_email_outbox_due", table_name="email_outbox")
+    op.drop_table("email_outbox")
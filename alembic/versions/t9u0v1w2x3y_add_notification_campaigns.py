@@ -0,0 +1,49 @@
+"""add notification_campaigns table for admin bulk notifications
+
+Revision ID: t9u0v1w2x3y
+Revises: s8t9u0v1w2x
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "t9u0v1w2x3y"
+down_revision = "s8t9u0v1w2x"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # table may already exist when init_db() ran create_all before migrating
+    if "notification_campaigns" not in tables:
+        op.create_table(
+            "notification_campaigns",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_by", sa.Integer(), sa.ForeignKey("user_admins.id"), nullable=True),
+            sa.Column("subject", sa.String(), nullable=False),
+            sa.Column("message", sa.Text(), nullable=False),
+            sa.Column("segment", sa.String(), server_default="all", nullable=False),
+            sa.Column("status", sa.String(), server_default="pending", nullable=False),
+            sa.Column("rate_per_second", sa.Integer(), nullable=False),
+            sa.Column("cursor_user_id", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("lease_until", sa.Float(), nullable=True),
+            sa.Column("total", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("processed", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("sent_ws", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("sent_email", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_notification_campaigns_id", "notification_campaigns", ["id"])
+        op.create_index("ix_notification_campaigns_status", "notification_campaigns", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_notification_campaigns_status", table_name="notification_campaigns")
+    op.drop_index("ix_notification_campaigns_id", table_name="notification_campaigns")
+    op.drop_table("notification_campaigns")
@@ -0,0 +1,37 @@
+"""add avatar_assets table for deduplicated avatar variants
+
+Revision ID: u0v1w2x3y4z
+Revises: t9u0v1w2x3y
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "u0v1w2x3y4z"
+down_revision = "t9u0v1w2x3y"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # table may already exist when init_db() ran create_all before migrating
+    if "avatar_assets" not in tables:
+        op.create_table(
+            "avatar_assets",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("sha256", sa.String(length=64), nullable=False),
+            sa.Column("variants", sa.Text(), nullable=False),
+            sa.Column("storage", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_avatar_assets_sha256", "avatar_assets", ["sha256"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_avatar_assets_sha256", table_name="avatar_assets")
+    op.drop_table("avatar_assets")
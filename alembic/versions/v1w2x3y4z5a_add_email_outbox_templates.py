@@ -0,0 +1,44 @@
+"""render templated outbox emails at send time
+
+Revision ID: v1w2x3y4z5a
+Revises: u0v1w2x3y4z
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "v1w2x3y4z5a"
+down_revision = "u0v1w2x3y4z"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    cols = {c["name"]: c for c in sa.inspect(bind).get_columns("email_outbox")}
+
+    # batch mode so SQLite can relax the NOT NULL constraints (table copy)
+    with op.batch_alter_table("email_outbox") as batch:
+        if "template" not in cols:
+            batch.add_column(sa.Column("template", sa.String(), nullable=True))
+        if "params" not in cols:
+            batch.add_column(sa.Column("params", sa.Text(), nullable=True))
+        # templated rows carry no pre-rendered subject/body
+        if not cols["subject"]["nullable"]:
+            batch.alter_column("subject", existing_type=sa.String(), nullable=True)
+        if not cols["body"]["nullable"]:
+            batch.alter_column("body", existing_type=sa.Text(), nullable=True)
+
+
+def downgrade():
+    # pending templated rows cannot be kept without a rendered subject/body
+    op.execute("DELETE FROM email_outbox WHERE template IS NOT NULL AND status = 'pending'")
+    op.execute("UPDATE email_outbox SET subject = '' WHERE subject IS NULL")
+    op.execute("UPDATE email_outbox SET body = '' WHERE body IS NULL")
+    with op.batch_alter_table("email_outbox") as batch:
+        batch.alter_column("body", existing_type=sa.Text(), nullable=False)
+        batch.alter_column("subject", existing_type=sa.String(), nullable=False)
+        batch.drop_column("params")
+        batch.drop_column("template")
@@ -0,0 +1,31 @@
+"""add lease_owner to notification_campaigns
+
+Revision ID: w2x3y4z5a6b
+Revises: v1w2x3y4z5a
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "w2x3y4z5a6b"
+down_revision = "v1w2x3y4z5a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    cols = {c["name"] for c in sa.inspect(bind).get_columns("notification_campaigns")}
+
+    # column may already exist when init_db() ran create_all before migrating
+    if "lease_owner" not in cols:
+        op.add_column(
+            "notification_campaigns", sa.Column("lease_owner", sa.String(), nullable=True)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("notification_campaigns") as batch:
+        batch.drop_column("lease_owner")
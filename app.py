@@ -5,6 +5,7 @@ import uvicorn
 from fastapi import FastAPI
 from middleware.request_logger import RequestLoggerMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.staticfiles import StaticFiles
 
 # Import routers from controllers
 from controllers.root import router as root_router
@@ -12,9 +13,11 @@ from controllers.user import router as user_router
 from controllers.admin import router as admin_router
 from controllers.friend import router as friend_router
 from controllers.chat import router as chat_router
+from controllers.room import router as room_router
 from controllers.google_auth import router as google_auth_router
 from controllers.ws import router as ws_router
 from scripts.auto_migrate import autogenerate_and_upgrade, should_auto_migrate
+from services.media_storage import MEDIA_ROOT, MEDIA_STORAGE, MEDIA_URL_PREFIX
 
 app = FastAPI()
 
@@ -29,9 +32,15 @@ app.include_router(root_router)
 app.include_router(user_router)
 app.include_router(admin_router)
 app.include_router(chat_router)
+app.include_router(room_router)
 app.include_router(google_auth_router)
 app.include_router(ws_router)
 
+# serve uploaded media when it is stored on local disk
+if MEDIA_STORAGE == "local":
+    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    app.mount(MEDIA_URL_PREFIX, StaticFiles(directory=MEDIA_ROOT), name="media")
+
 # install middleware
 app.add_middleware(RequestLoggerMiddleware)
 
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, Request, Response
+from fastapi import APIRouter, Depends, File, Request, Response, UploadFile
 from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
 
 from database import get_db, init_db
 from entities import schemas as s
@@ -7,6 +8,11 @@ from services import admin_service as service
 from utils.auth import auth_required, get_current_user_id
 from utils.limit import rate_limit
 from utils.roles import require_role
+from utils.db_metrics import pool_metrics
+from services import friend_cache, friend_ranking, profile_cache, role_cache, token_cache
+from services.password_service import hasher
+from services import campaign_service, email_outbox, user_import
+from services.media_service import media
 
 router = APIRouter(prefix="/api/v1", tags=["admin"])
 
@@ -15,6 +21,8 @@ router = APIRouter(prefix="/api/v1", tags=["admin"])
 def on_startup():
     # create tables if they don't exist (convenience)
     init_db()
+    # resume notification campaigns interrupted by a restart
+    campaign_service.runner.start()
 
 
 def get_user_or_404(db: Session, user_id: int):
@@ -28,9 +36,9 @@ def get_user_or_404(db: Session, user_id: int):
     response_model=s.MessageOut,
     dependencies=[Depends(rate_limit(max_requests=100, window_seconds=60))],
 )
-def create_user_admin(user: s.UserCreate, db: Session = Depends(get_db)):
+async def create_user_admin(user: s.UserCreate, db: Session = Depends(get_db)):
     """Create a new admin user and return a simple message on success or an HTTP error on failure."""
-    return service.create_user_admin(db, user)
+    return await service.create_user_admin(db, user)
 
 
 @router.post(
@@ -38,7 +46,7 @@ def create_user_admin(user: s.UserCreate, db: Session = Depends(get_db)):
     response_model=s.MessageOut,
     dependencies=[Depends(rate_limit(max_requests=100, window_seconds=60))],
 )
-def login_user_admin(
+async def login_user_admin(
     user: s.UserLogin,
     response: Response,
     request: Request,
@@ -50,7 +58,7 @@ def login_user_admin(
     """
     # pass request host so the service can set cookie domain explicitly (helps clients like Postman)
     host = request.url.hostname
-    return service.login_user_admin(db, user, response, domain=host)
+    return await service.login_user_admin(db, user, response, domain=host)
 
 
 @router.post(
@@ -146,14 +154,14 @@ def reset_password_admin(
         Depends(rate_limit(max_requests=1000, window_seconds=60))  
     ],
 )
-def change_password_admin(
+async def change_password_admin(
     new_password: str,
     db: Session = Depends(get_db),
     request: Request = None,
 ):
     """Change the password for the currently authenticated admin user."""
     userId = get_current_user_id(request)
-    return service.change_password(db, userId, new_password)
+    return await service.change_password(db, userId, new_password)
 
 
 @router.delete(
@@ -188,3 +196,161 @@ def delete_user_admin(
 def list_users_admin(db: Session = Depends(get_db), page: int = 1, per_page: int = 20):
     """List all regular users. Only admins/super_admins are allowed."""
     return service.get_all_users(db, page, per_page)
+
+
+@router.post(
+    "/admin/users/import",
+    response_model=s.UserImportOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=10, window_seconds=60)),
+    ],
+)
+def import_users(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    send_welcome_email: bool = True,
+    db: Session = Depends(get_db),
+):
+    """Create users in bulk from a CSV or NDJSON upload."""
+    fmt = format or user_import.detect_format(file.filename)
+    report = user_import.import_users(
+        db, user_import.read_records(file.file, fmt), send_welcome=send_welcome_email
+    )
+    if send_welcome_email and report["created"]:
+        email_outbox.worker.wake()
+    return report
+
+
+@router.post(
+    "/admin/campaigns",
+    response_model=s.CampaignOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=100, window_seconds=60)),
+    ],
+)
+def create_campaign(
+    data: s.CampaignCreate, request: Request, db: Session = Depends(get_db)
+):
+    """Start a notification campaign; delivery runs in the background."""
+    return campaign_service.create_campaign(db, get_current_user_id(request), data)
+
+
+@router.get(
+    "/admin/campaigns",
+    response_model=List[s.CampaignOut],
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def list_campaigns(db: Session = Depends(get_db), page: int = 1, per_page: int = 20):
+    """List notification campaigns, newest first, with their progress."""
+    return campaign_service.list_campaigns(db, page, per_page)
+
+
+@router.get(
+    "/admin/campaigns/{campaign_id}",
+    response_model=s.CampaignOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    """Return one campaign and its delivery progress."""
+    return campaign_service.get_campaign(db, campaign_id)
+
+
+@router.post(
+    "/admin/campaigns/{campaign_id}/{action}",
+    response_model=s.CampaignOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=100, window_seconds=60)),
+    ],
+)
+def change_campaign_state(
+    campaign_id: int,
+    action: Literal["pause", "resume", "cancel"],
+    db: Session = Depends(get_db),
+):
+    """Pause, resume or cancel a campaign."""
+    return campaign_service.set_campaign_state(db, campaign_id, action)
+
+
+@router.get(
+    "/admin/metrics/db-pool",
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def db_pool_metrics():
+    """Return live connection pool metrics (checkouts, waits, hold times, leaks)."""
+    return pool_metrics.snapshot()
+
+
+@router.get(
+    "/admin/metrics/password-hashing",
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def password_hashing_metrics():
+    """Return password hashing executor load, rejections and bcrypt cost."""
+    return hasher.stats()
+
+
+@router.get(
+    "/admin/metrics/email-outbox",
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def email_outbox_metrics():
+    """Return outbox backlog and delivery counters of the email worker."""
+    return email_outbox.worker.stats()
+
+
+@router.get(
+    "/admin/metrics/media",
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def media_metrics():
+    """Return media storage pool load, failures, retries and circuit state."""
+    return media.stats()
+
+
+@router.get(
+    "/admin/metrics/caches",
+    dependencies=[
+        Depends(auth_required),
+        Depends(require_role("admin", "super_admin")),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def cache_metrics():
+    """Return size and hit-rate statistics for the in-process caches."""
+    return {
+        "friend_adjacency": friend_cache.adjacency.stats(),
+        "friend_ranking": friend_ranking.ranking.stats(),
+        "auth_tokens": token_cache.verified_tokens.stats(),
+        "profiles": profile_cache.profiles.stats(),
+        "admin_roles": role_cache.admin_roles.stats(),
+    }
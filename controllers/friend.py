@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
@@ -101,6 +103,28 @@ def accept_friend(
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
+@router.post(
+    "/friends/requests/bulk",
+    response_model=s.FriendBulkOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def bulk_friend_requests(
+    payload: s.FriendBulkRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    """Accept, decline or cancel several pending friend requests in one call."""
+    try:
+        return friend_service.bulk_friend_requests(
+            db, user_id, payload.action, payload.user_ids
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
 @router.get(
     "/friends/list",
     dependencies=[
@@ -163,10 +187,70 @@ def list_unfriended_users(
     user_id: int = Depends(get_current_user_id),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=200),
+    before_id: Optional[int] = Query(None, ge=1),
+    sample: bool = False,
 ):
-    """List users who are not friends with the current user."""
-    result = friend_service.list_unfriended_users(
-        db, user_id, page=page, per_page=per_page
+    """List users who are not friends with the current user.
+
+    Pages are keyset-based: pass `next_before_id` from the previous response
+    as `before_id` (required when `page` > 1). `sample=true` returns a random
+    page instead.
+    """
+    try:
+        result = friend_service.list_unfriended_users(
+            db, user_id, page=page, per_page=per_page, before_id=before_id, sample=sample
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return {
+        "friends": result.get("friends", []),
+        "total": result.get("total"),
+        "page": int(result.get("page", page)),
+        "per_page": int(result.get("per_page", per_page)),
+        "next_page": result.get("next_page"),
+        "prev_page": result.get("prev_page"),
+        "next_before_id": result.get("next_before_id"),
+    }
+
+
+@router.get(
+    "/friends/mutual",
+    response_model=s.MutualCountsOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def mutual_counts(
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+    ids: List[int] = Query(...),
+):
+    """Mutual friend counts between the current user and each of `ids` (e.g. a page of profiles)."""
+    try:
+        return {"counts": friend_service.mutual_counts(db, user_id, ids)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get(
+    "/friends/mutual/{other_id}",
+    response_model=s.FriendListOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def list_mutual_friends(
+    other_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=200),
+):
+    """List the friends the current user shares with `other_id`."""
+    result = friend_service.list_mutual_friends(
+        db, user_id, other_id, page=page, per_page=per_page
     )
     return {
         "friends": result.get("friends", []),
@@ -7,12 +7,13 @@ import logging
 import json
 from entities.user import User
 from entities import schemas as s
-import os, bcrypt
+import os
 import jwt
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import get_db, init_db
-from services.mailer_service import send_welcome_email_with_google, send_reset_password_email
+from services import email_outbox
+from services.password_service import hasher
 
 router = APIRouter(prefix="/api/v1", tags=["google_auth"])
 
@@ -169,12 +170,9 @@ async def google_callback(
                             status_code=400, detail="Username already exists"
                         )
 
-                    # Hash the password before storing it (for security)
-                    # Use bcrypt to hash the password (includes salt)
-                    salt = bcrypt.gensalt()  # generate a random salt
-                    hashed_password = bcrypt.hashpw(password.encode("utf-8"), salt)
-                    # store as utf-8 string so DB String column can hold it
-                    hashed_password_str = hashed_password.decode("utf-8")
+                    # Hash the password before storing it (for security); awaited
+                    # on the hashing executor so bcrypt never blocks the event loop
+                    hashed_password_str = await hasher.hash_async(password)
 
                     db_user = User(
                         username=username,
@@ -186,10 +184,12 @@ async def google_callback(
                         f"[debug] creating user: {db_user.username}, email: {db_user.email}"
                     )
                     db.add(db_user)
+                    email_outbox.enqueue_template(
+                        db, "welcome_google", db_user.email, username=db_user.username
+                    )
                     db.commit()
                     db.refresh(db_user)
-                    
-                    send_welcome_email_with_google(db_user.email, db_user.username)
+                    email_outbox.worker.wake()
 
                 except Exception as e:
                     print("Failed to decode id_token:", e)
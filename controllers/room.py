@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+
+from entities import schemas as s
+from services import room_service
+from utils.auth import auth_required, get_current_user_id
+from utils.limit import rate_limit
+
+router = APIRouter(prefix="/api/v1", tags=["rooms"])
+
+
+def _call(fn, *args, **kwargs):
+    """Run a room_service call, mapping its exceptions to HTTP errors."""
+    try:
+        return fn(*args, **kwargs)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.post(
+    "/rooms",
+    response_model=s.RoomOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=100, window_seconds=60)),
+    ],
+)
+def create_room(room: s.RoomCreate, user_id: int = Depends(get_current_user_id)):
+    """Create a group room owned by the current user."""
+    return _call(room_service.create_room, user_id, room.name, room.member_ids)
+
+
+@router.get(
+    "/rooms",
+    response_model=List[s.RoomOut],
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def list_rooms(user_id: int = Depends(get_current_user_id)):
+    """List the rooms the current user belongs to."""
+    return room_service.list_rooms_for_user(user_id)
+
+
+@router.post(
+    "/rooms/{room_id}/members",
+    response_model=s.MessageOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def add_room_member(
+    room_id: int,
+    member: s.RoomMemberRequest,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Add a member to a room (owner only)."""
+    return _call(room_service.add_member, room_id, user_id, member.user_id)
+
+
+@router.delete(
+    "/rooms/{room_id}/members/{member_id}",
+    response_model=s.MessageOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def remove_room_member(
+    room_id: int, member_id: int, user_id: int = Depends(get_current_user_id)
+):
+    """Remove a member from a room (owner), or leave it (the member themself)."""
+    return _call(room_service.remove_member, room_id, user_id, member_id)
+
+
+@router.get(
+    "/rooms/{room_id}/messages",
+    response_model=s.RoomMessageListOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def get_room_messages(
+    room_id: int,
+    user_id: int = Depends(get_current_user_id),
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Return room messages newest first; pass `next_before_id` to page back."""
+    return _call(
+        room_service.get_room_messages, room_id, user_id, before_id=before_id, limit=limit
+    )
+
+
+@router.post(
+    "/rooms/{room_id}/messages",
+    response_model=s.RoomMessageOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def post_room_message(
+    room_id: int,
+    message: s.RoomMessageCreate,
+    user_id: int = Depends(get_current_user_id),
+):
+    """Post a message to a room; online members receive a `room_message` event."""
+    return _call(
+        room_service.post_message, room_id, user_id, message.text, message.image_url
+    )
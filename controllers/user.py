@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Response, Request, HTTPException
+from fastapi import APIRouter, Depends, Response, Request, HTTPException, Query
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, File
 import logging
@@ -6,7 +6,10 @@ import logging
 from database import get_db, init_db
 from entities import schemas as s
 from services import user_service
-from services import cloudinary_service
+from services import avatar_service
+from services import search_service
+from services import email_outbox
+from services.password_service import hasher
 from utils.auth import get_current_user_id, auth_required
 from utils.limit import rate_limit
 
@@ -17,6 +20,10 @@ router = APIRouter(prefix="/api/v1", tags=["users"])
 def on_startup():
     # create tables if they don't exist (convenience)
     init_db()
+    # deliver emails left in the outbox by a previous run
+    email_outbox.worker.start()
+    # settle the bcrypt cost before serving logins
+    hasher.calibrate()
 
 
 def get_user_or_404(db: Session, user_id: int):
@@ -24,14 +31,30 @@ def get_user_or_404(db: Session, user_id: int):
     return user_service.get_profile(db, user_id)
 
 
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """True when an If-None-Match header lists `etag` exactly (or is `*`)."""
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _profile_response(request: Request, response: Response, db: Session, user_id: int):
+    """Serve a cached profile with an ETag; 304 when the client's copy is current."""
+    profile, etag = user_service.get_profile_with_etag(db, user_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return profile
+
+
 @router.post("/users/register", response_model=s.MessageOut)
-def create_user(
+async def create_user(
     user: s.UserCreate,
     db: Session = Depends(get_db),
     _rl: None = Depends(rate_limit(max_requests=100, window_seconds=60)),
 ):
     """Create a new user and return a simple message on success or an HTTP error on failure."""
-    return user_service.create_user(db, user)
+    return await user_service.create_user(db, user)
 
 
 @router.post(
@@ -39,7 +62,7 @@ def create_user(
     response_model=s.MessageOut,
     dependencies=[Depends(rate_limit(max_requests=100, window_seconds=60))],
 )
-def login_user(
+async def login_user(
     user: s.UserLogin,
     response: Response,
     request: Request,
@@ -54,7 +77,7 @@ def login_user(
     # apply rate limit (per-IP per-endpoint)
     # we call the dependency inline to keep response signature unchanged
     # However the dependency has already been injected via decorator below
-    return user_service.login_user(db, user, response, domain=host)
+    return await user_service.login_user(db, user, response, domain=host)
 
 
 @router.post(
@@ -85,19 +108,55 @@ def logout_user(response: Response):
         Depends(rate_limit(max_requests=1000, window_seconds=60)),
     ],
 )
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def get_current_user(request: Request, response: Response, db: Session = Depends(get_db)):
     """Return the profile of the currently authenticated user.
 
     The user id is retrieved from the `access_token` cookie set at login.
+    Supports `If-None-Match` revalidation (304 when unchanged).
     """
     userId = get_current_user_id(request)
-    return user_service.get_profile(db, user_id=userId)
+    return _profile_response(request, response, db, userId)
+
+
+# declared before /users/{user_id} so "search" is not parsed as an id
+@router.get(
+    "/users/search",
+    response_model=s.UserSearchOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def search_users(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=search_service.MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Autocomplete people search by username, full name or email, best match first."""
+    user_id = get_current_user_id(request)
+    return {"items": search_service.search_users(db, q, limit=limit, exclude_id=user_id)}
+
+
+@router.post(
+    "/users/batch",
+    response_model=s.UserBatchOut,
+    dependencies=[
+        Depends(auth_required),
+        Depends(rate_limit(max_requests=1000, window_seconds=60)),
+    ],
+)
+def get_users_batch(body: s.UserBatchRequest, db: Session = Depends(get_db)):
+    """Return many user profiles in one call (one IN query for cache misses)."""
+    return user_service.get_profiles(db, body.ids, fields=body.fields)
 
 
 @router.get("/users/{user_id}", response_model=s.UserOut)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    """Get a user by ID. Returns 404 if not found."""
-    return get_user_or_404(db, user_id)
+def get_user(
+    user_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    """Get a user by ID. Returns 404 if not found, 304 if the client's ETag is current."""
+    return _profile_response(request, response, db, user_id)
 
 
 @router.put(
@@ -161,16 +220,15 @@ def reset_password(request: Request, db: Session = Depends(get_db)):
         Depends(rate_limit(max_requests=1000, window_seconds=60)),
     ],
 )
-def change_password(request: Request, new_password: str, db: Session = Depends(get_db)):
+async def change_password(request: Request, new_password: str, db: Session = Depends(get_db)):
     """Change the password for the user with the given ID.
 
     This is a placeholder implementation. In a real application, this would require authentication and verification of the old password or a reset token.
     """
     userId = get_current_user_id(request)
-    return user_service.change_password(db, userId, new_password)
+    return await user_service.change_password(db, userId, new_password)
 
 
-# Test upload avatar on cloudinary
 @router.post(
     "/users/upload-avatar",
     dependencies=[
@@ -178,12 +236,16 @@ def change_password(request: Request, new_password: str, db: Session = Depends(g
         Depends(rate_limit(max_requests=1000, window_seconds=60)),
     ],
 )
-def upload_avatar(
+async def upload_avatar(
     request: Request,
     file: UploadFile = File(alias="file"),
     db: Session = Depends(get_db),
 ):
-    """Upload an avatar image for the currently authenticated user."""
+    """Upload an avatar image for the currently authenticated user.
+
+    The image is size-capped, resized to fixed variants off the request thread
+    and deduplicated by content hash (see services/avatar_service.py).
+    """
 
     logger = logging.getLogger(__name__)
     logger.debug(
@@ -195,11 +257,4 @@ def upload_avatar(
     if not file or not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
 
-    # Pass the UploadFile object directly; cloudinary_service.upload_image understands UploadFile
-    result = cloudinary_service.upload_image(file)
-
-    if not result.get("url"):
-        raise HTTPException(status_code=500, detail="Failed to upload avatar")
-
-    # Update user's avatar_url in the database
-    return user_service.upload_avatar(db, userId, result.get("url"))
\ No newline at end of file
+    return await avatar_service.store_avatar(db, userId, file)
@@ -1,13 +1,33 @@
 import contextlib
 import datetime
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+from database import run_unit_of_work
 from services import ws_service
 from services import chat_service
+from services import room_service
 from typing import Dict
 
 router = APIRouter()
 
 
+def _serialize_messages(items):
+    """Copy history items, converting datetimes to ISO strings for JSON."""
+    out = []
+    for m in items:
+        try:
+            # copy dict to avoid mutating service return
+            mm = dict(m)
+        except Exception:
+            mm = m
+        ca = mm.get("created_at")
+        if isinstance(ca, datetime.datetime):
+            mm["created_at"] = ca.isoformat()
+        out.append(mm)
+    return out
+
+
 @router.websocket("/ws/test")
 async def websocket_test(websocket: WebSocket, data: Dict = None):
     """Simple test endpoint to verify WebSocket functionality.
@@ -36,6 +56,11 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
     """WebSocket endpoint for a user. Clients should connect providing their
     user id in the path. Server pushes events like `new_message`,
     `message_seen`, `message_sent`, and `unread_count`.
+
+    Each action runs inside one unit of work (`run_unit_of_work`): every
+    chat_service call shares a single session/transaction, notifications go
+    out after commit, and the whole action is re-run if SQLite is busy. Units
+    run on the thread pool so busy waits and retries never block the loop.
     """
     await ws_service.manager.connect(websocket, user_id)
     try:
@@ -43,7 +68,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
             data = await websocket.receive_json()
             # simple protocol: expect {"action": "mark_seen", "chat_id": 123}
             action = data.get("action")
-            # actions supported: join_chat, leave_chat, mark_seen, send_message
+            # actions supported: join_chat, leave_chat, mark_seen, send_message, send_room_message
             if action == "join_chat":
                 # client indicates it's viewing a chat with another user
                 chat_with = data.get("chat_with")
@@ -53,8 +78,11 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
 
                 # send recent history to the client who just joined the chat
                 try:
-                    history = chat_service.get_conversation_between_users(
-                        user_id, chat_with, page=1, per_page=50
+                    history = await run_in_threadpool(
+                        run_unit_of_work,
+                        lambda uow: chat_service.get_conversation_between_users(
+                            user_id, chat_with, page=1, per_page=50
+                        )
                     )
                     # service may return a paginated dict or a plain list
                     raw_messages = (
@@ -62,22 +90,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                         if isinstance(history, dict)
                         else history
                     )
-                    # ensure datetimes are JSON-serializable
-                    def serialize_messages(items):
-                        out = []
-                        for m in items:
-                            try:
-                                # copy dict to avoid mutating service return
-                                mm = dict(m)
-                            except Exception:
-                                mm = m
-                            ca = mm.get("created_at")
-                            if isinstance(ca, datetime.datetime):
-                                mm["created_at"] = ca.isoformat()
-                            out.append(mm)
-                        return out
-
-                    messages_payload = serialize_messages(raw_messages)
+                    messages_payload = _serialize_messages(raw_messages)
 
                     # send directly to the joining websocket (immediate)
                     await websocket.send_json(
@@ -108,8 +121,11 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
             elif action == "leave_chat":
                 ws_service.manager.set_current_chat(websocket, None)
                 # send unread count update to the user who left the chat, so their client can decide what to do (e.g., show unread badge)
-                unread = chat_service.count_unread_chats_for_user_and_group_by_sender(
-                    user_id
+                unread = await run_in_threadpool(
+                    run_unit_of_work,
+                    lambda uow: chat_service.count_unread_chats_for_user_and_group_by_sender(
+                        user_id
+                    )
                 )
                 ws_service.manager.send_personal_sync(
                     user_id, {"type": "unread_count", "count": unread}
@@ -117,21 +133,28 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
 
             elif action == "mark_seen":
                 if chat_id := data.get("chat_id"):
-                    if updated := chat_service.mark_chat_as_seen(chat_id):
-                        sender_id = updated.user_from_id
-                        ws_service.manager.send_personal_sync(
-                            sender_id,
-                            {
-                                "type": "message_seen",
-                                "chat_id": updated.id,
-                                "by": user_id,
-                            },
-                        )
-                        # update unread count for sender
-                        unread = chat_service.count_unread_chats_for_user_and_group_by_sender(sender_id)
-                        ws_service.manager.send_personal_sync(
-                            sender_id, {"type": "unread_count", "count": unread}
-                        )
+
+                    def mark_seen(uow):
+                        if updated := chat_service.mark_chat_as_seen(chat_id):
+                            sender_id = updated.user_from_id
+                            uow.after_commit(
+                                ws_service.manager.send_personal_sync,
+                                sender_id,
+                                {
+                                    "type": "message_seen",
+                                    "chat_id": updated.id,
+                                    "by": user_id,
+                                },
+                            )
+                            # update unread count for sender
+                            unread = chat_service.count_unread_chats_for_user_and_group_by_sender(sender_id)
+                            uow.after_commit(
+                                ws_service.manager.send_personal_sync,
+                                sender_id,
+                                {"type": "unread_count", "count": unread},
+                            )
+
+                    await run_in_threadpool(run_unit_of_work, mark_seen)
 
             elif action == "send_message":
                 # expected payload: { action: 'send_message', to: <recipient_id>, text: '...' }
@@ -146,63 +169,41 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                     to_id, user_id
                 )
 
-                # create chat and notify; if recipient is viewing, mark as seen immediately
-                chat = chat_service.create_chat(
-                    user_to_id=to_id,
-                    user_from_id=user_id,
-                    text=text,
-                    notify=True,
-                    mark_seen=bool(recipient_viewing),
-                )
-                # optionally echo back to sender (ack)
-                ws_service.manager.send_personal_sync(
-                    user_id,
-                    {
-                        "type": "message_sent",
-                        "chat_id": chat.id,
-                        "to": to_id,
-                        "text": chat.text,
-                    },
-                )
-                # send history message to update chat view for sender (and recipient if they're viewing)
-                try:
-                    history = chat_service.get_conversation_between_users(
-                        user_id, to_id, page=1, per_page=50
+                def send_message(uow):
+                    # create chat and notify; if recipient is viewing, mark as seen immediately
+                    chat = chat_service.create_chat(
+                        user_to_id=to_id,
+                        user_from_id=user_id,
+                        text=text,
+                        notify=True,
+                        mark_seen=bool(recipient_viewing),
                     )
-                    if isinstance(history, dict):
-                        raw_messages = history.get("items", [])
-                    else:
-                        raw_messages = history
-
-                    # convert datetimes to ISO strings
-                    def serialize_messages(items):
-                        out = []
-                        for m in items:
-                            try:
-                                mm = dict(m)
-                            except Exception:
-                                mm = m
-                            ca = mm.get("created_at")
-                            if isinstance(ca, datetime.datetime):
-                                mm["created_at"] = ca.isoformat()
-                            out.append(mm)
-                        return out
-
-                    messages_payload = serialize_messages(raw_messages)
-
-                    ws_service.manager.send_personal_sync(
+                    # optionally echo back to sender (ack)
+                    uow.after_commit(
+                        ws_service.manager.send_personal_sync,
                         user_id,
                         {
-                            "type": "history_update",
+                            "type": "message_sent",
                             "chat_id": chat.id,
-                            "messages": messages_payload,
+                            "to": to_id,
+                            "text": chat.text,
                         },
                     )
+                    # send history message to update chat view for sender (and recipient if they're viewing)
+                    try:
+                        history = chat_service.get_conversation_between_users(
+                            user_id, to_id, page=1, per_page=50
+                        )
+                        if isinstance(history, dict):
+                            raw_messages = history.get("items", [])
+                        else:
+                            raw_messages = history
+
+                        messages_payload = _serialize_messages(raw_messages)
 
-                    # if recipient is viewing this chat, also push the updated history to them
-                    if recipient_viewing:
-                        ws_service.manager.send_personal_sync(
-                            to_id,
+                        uow.after_commit(
+                            ws_service.manager.send_personal_sync,
+                            user_id,
                             {
                                 "type": "history_update",
                                 "chat_id": chat.id,
@@ -210,9 +211,45 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                             },
                         )
 
-                except Exception as e:
-                    # log the exception or handle it as needed
-                    print(f"Error updating chat history: {e}")
+                        # if recipient is viewing this chat, also push the updated history to them
+                        if recipient_viewing:
+                            uow.after_commit(
+                                ws_service.manager.send_personal_sync,
+                                to_id,
+                                {
+                                    "type": "history_update",
+                                    "chat_id": chat.id,
+                                    "messages": messages_payload,
+                                },
+                            )
+
+                    except OperationalError:
+                        # e.g. database is locked: let run_unit_of_work roll
+                        # back and re-run the whole action
+                        raise
+                    except Exception as e:
+                        # log the exception or handle it as needed
+                        print(f"Error updating chat history: {e}")
+
+                await run_in_threadpool(run_unit_of_work, send_message)
+
+            elif action == "send_room_message":
+                # expected payload: { action: 'send_room_message', room_id: <id>, text: '...' }
+                room_id = data.get("room_id")
+                text = data.get("text")
+                if not room_id or text is None:
+                    # ignore malformed
+                    continue
+                try:
+                    # stored once; online members (sender included) get a `room_message` event
+                    await run_in_threadpool(
+                        run_unit_of_work,
+                        lambda uow: room_service.post_message(room_id, user_id, text)
+                    )
+                except (PermissionError, LookupError, ValueError) as e:
+                    await websocket.send_json(
+                        {"type": "error", "action": action, "detail": str(e)}
+                    )
 
     except WebSocketDisconnect:
         ws_service.manager.disconnect(websocket, user_id)
@@ -1,5 +1,11 @@
+import contextlib
+import contextvars
+import functools
 import os
-from sqlalchemy import create_engine
+import random
+import time
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Optionally load environment variables from a .env file (development convenience)
@@ -18,7 +24,100 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 # For sqlite we need connect_args, for others (e.g. postgresql+psycopg2) no special args
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings (see SQLAlchemy QueuePool docs). Defaults match
+# SQLAlchemy's own defaults except pre-ping, which we enable so stale
+# connections dropped by the server are replaced transparently.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")
+
+engine_kwargs = {"connect_args": connect_args, "pool_pre_ping": DB_POOL_PRE_PING}
+# in-memory sqlite uses a single-connection pool that does not accept sizing args
+_url = make_url(DATABASE_URL)
+if not (_url.get_backend_name() == "sqlite" and _url.database in (None, "", ":memory:")):
+    engine_kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+# SQLite production profile: WAL lets readers run alongside a writer, and the
+# busy timeout makes writers wait for the lock instead of failing immediately.
+# Set SQLITE_PROFILE=default to keep SQLite's stock rollback journal.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # negative cache_size is in KiB (here 64 MiB), positive is in pages
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "5"))
+
+
+def apply_sqlite_profile(target_engine, pragmas: dict = None):
+    """Run the tuned PRAGMAs on every new DBAPI connection of `target_engine`."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return target_engine
+
+
+def _is_busy_error(exc: Exception) -> bool:
+    msg = str(getattr(exc, "orig", exc)).lower()
+    return "database is locked" in msg or "database is busy" in msg
+
+
+def retry_on_busy(func=None, *, retries: int = None, base_delay: float = 0.05):
+    """Retry a unit of work when SQLite reports the database is locked/busy.
+
+    The wrapped function must open (and roll back) its own session, so a retry
+    re-runs the whole transaction. Other errors are re-raised unchanged.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # inside a unit of work the outer scope owns the transaction;
+            # re-running just this call would reuse a failed session
+            if _active_uow.get() is not None:
+                return fn(*args, **kwargs)
+            attempts = SQLITE_BUSY_RETRIES if retries is None else retries
+            for attempt in range(attempts + 1):
+                try:
+                    return fn(*args, **kwargs)
+                except OperationalError as e:
+                    if attempt >= attempts or not _is_busy_error(e):
+                        raise
+                    # exponential backoff with jitter so writers do not retry in lockstep
+                    time.sleep(base_delay * (2**attempt) * (0.5 + random.random()))
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
+
+engine = create_engine(DATABASE_URL, **engine_kwargs)
+if DATABASE_URL.startswith("sqlite") and SQLITE_PROFILE == "tuned":
+    apply_sqlite_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -32,6 +131,108 @@ def get_db():
         db.close()
 
 
+# Unit of work: one session/transaction shared by every service call made
+# inside `with unit_of_work():` (e.g. a single WebSocket action). Services use
+# `session_scope()` and `commit()` so they work both inside and outside one.
+_active_uow: contextvars.ContextVar = contextvars.ContextVar(
+    "active_unit_of_work", default=None
+)
+
+
+class UnitOfWork:
+    def __init__(self):
+        # objects stay readable after the outer commit closes the session
+        self.session = SessionLocal(expire_on_commit=False)
+        self._after_commit = []
+
+    def after_commit(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` to run once the transaction has committed."""
+        self._after_commit.append((fn, args, kwargs))
+
+
+@contextlib.contextmanager
+def unit_of_work():
+    """Open a unit of work, or join the one already active in this context.
+
+    The outermost scope commits on success (rolls back on error), closes the
+    session, then runs the queued after-commit callbacks such as notifications.
+    """
+    if (uow := _active_uow.get()) is not None:
+        yield uow
+        return
+
+    uow = UnitOfWork()
+    token = _active_uow.set(uow)
+    try:
+        yield uow
+        uow.session.commit()
+    except BaseException:
+        uow.session.rollback()
+        raise
+    finally:
+        _active_uow.reset(token)
+        uow.session.close()
+
+    for fn, args, kwargs in uow._after_commit:
+        with contextlib.suppress(Exception):
+            fn(*args, **kwargs)
+
+
+@retry_on_busy
+def run_unit_of_work(fn, *args, **kwargs):
+    """Run `fn(uow, *args, **kwargs)` in its own unit of work and return its result.
+
+    `with unit_of_work():` cannot re-run its block, and retry_on_busy does not
+    retry calls made inside a unit of work, so callers that want SQLITE_BUSY
+    retries put the whole unit in `fn`: a busy error rolls everything back
+    (queued after-commit callbacks are dropped) and runs `fn` again.
+    """
+    with unit_of_work() as uow:
+        return fn(uow, *args, **kwargs)
+
+
+@contextlib.contextmanager
+def session_scope():
+    """Yield the active unit-of-work session, or a private session closed on exit."""
+    if (uow := _active_uow.get()) is not None:
+        yield uow.session
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def commit(db):
+    """Commit `db`, or only flush it when it belongs to the active unit of work."""
+    uow = _active_uow.get()
+    if uow is not None and db is uow.session:
+        db.flush()
+    else:
+        db.commit()
+
+
+def after_commit(fn, *args, **kwargs):
+    """Run `fn` after the active unit of work commits, or right away without one."""
+    if (uow := _active_uow.get()) is not None:
+        uow.after_commit(fn, *args, **kwargs)
+    else:
+        fn(*args, **kwargs)
+
+
 def init_db():
     """Create tables. Call at application startup or manually."""
     Base.metadata.create_all(bind=engine)
+    # people-search index (FTS5 table + triggers on SQLite, pg_trgm on Postgres)
+    from services.search_service import ensure_search_index
+
+    ensure_search_index(engine)
+
+
+# attach pool instrumentation (checkout counts, wait histogram, hold times, leaks).
+# Imported last: the utils package pulls in services/entities that import from here.
+if _env_flag("DB_POOL_METRICS", "true"):
+    from utils.db_metrics import pool_metrics
+
+    pool_metrics.install(engine)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text, func
+
+from database import Base
+
+
+class NotificationCampaign(Base):
+    """An admin notification sent to a segment of users.
+
+    Recipients are processed in user id order; `cursor_user_id` is the last
+    id handled, so a campaign interrupted by a restart resumes where it
+    stopped instead of starting over.
+    """
+
+    __tablename__ = "notification_campaigns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_by = Column(Integer, ForeignKey("user_admins.id"), nullable=True)
+    subject = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    # all | verified | unverified
+    segment = Column(String, default="all", nullable=False)
+    # pending | running | paused | completed | cancelled
+    status = Column(String, default="pending", index=True, nullable=False)
+    rate_per_second = Column(Integer, nullable=False)
+    cursor_user_id = Column(Integer, default=0, nullable=False)
+    # unix seconds; the runner holding the campaign renews this every chunk,
+    # another process may take over once it lapses
+    lease_until = Column(Float, nullable=True)
+    # runner holding the lease; renewals and progress updates only apply
+    # while it still matches, so a runner that lost the lease stops
+    lease_owner = Column(String, nullable=True)
+    total = Column(Integer, default=0, nullable=False)
+    processed = Column(Integer, default=0, nullable=False)
+    sent_ws = Column(Integer, default=0, nullable=False)
+    sent_email = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
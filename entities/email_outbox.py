@@ -0,0 +1,39 @@
+import time
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text, func
+
+from database import Base
+
+
+class EmailOutbox(Base):
+    """An email waiting to be delivered by the background outbox worker.
+
+    Rows are inserted in the same transaction as the change that triggers the
+    email (e.g. registration), so a committed user always gets their welcome
+    email and a rolled-back one never does.
+    """
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # the worker's "due pending messages" scan
+        Index("ix_email_outbox_due", "status", "available_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    # pre-rendered content; empty for templated messages
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=True)
+    html = Column(Text, nullable=True)
+    # mailer_service.EMAIL_TEMPLATES key and its JSON parameters, rendered by
+    # the worker at send time so links and tokens inside are fresh
+    template = Column(String, nullable=True)
+    params = Column(Text, nullable=True)
+    # pending | sent | failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # unix seconds; not before this time (retry backoff and claim lease)
+    available_at = Column(Float, default=time.time, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
@@ -2,16 +2,36 @@ from sqlalchemy import Column, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 from . import __init__  # keep package import
 from database import Base
-from sqlalchemy import DateTime, Boolean
-from sqlalchemy import func
+from sqlalchemy import DateTime, Boolean, Index
+from sqlalchemy import and_, false, func, true
+
+
+def _low_id(context):
+    params = context.get_current_parameters()
+    return min(params["user_id"], params["friend_id"])
+
+
+def _high_id(context):
+    params = context.get_current_parameters()
+    return max(params["user_id"], params["friend_id"])
 
 
 class Friend(Base):
+    """Friendship row from requester `user_id` to recipient `friend_id`.
+
+    `low_id`/`high_id` hold the same pair in canonical order so a lookup
+    between two users is one index probe regardless of who sent the request.
+    Removed friendships are kept with `is_active = True`; at most one live
+    (`is_active = False`) row may exist per pair.
+    """
+
     __tablename__ = "friends"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     friend_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    low_id = Column(Integer, nullable=False, default=_low_id)
+    high_id = Column(Integer, nullable=False, default=_high_id)
     created_at = Column(DateTime(timezone=True), index=True, default=func.now())
     is_active = Column(Boolean, index=True, default=False)
     is_accepted = Column(Boolean, index=True, default=False)
@@ -19,3 +39,65 @@ class Friend(Base):
     # Relationships to User model (optional, for easier access to user details)
     user = relationship("User", foreign_keys=[user_id], backref="friendships")
     friend = relationship("User", foreign_keys=[friend_id])
+
+    __table_args__ = (
+        # every row for a pair, including removed history
+        Index("ix_friends_pair", "low_id", "high_id"),
+        # one live friendship per pair
+        Index(
+            "uq_friends_live_pair",
+            "low_id",
+            "high_id",
+            unique=True,
+            sqlite_where=is_active == false(),
+            postgresql_where=is_active == false(),
+        ),
+        # incoming pending requests for a recipient
+        Index(
+            "ix_friends_pending_recipient",
+            "friend_id",
+            "user_id",
+            sqlite_where=and_(is_active == false(), is_accepted == false()),
+            postgresql_where=and_(is_active == false(), is_accepted == false()),
+        ),
+        # accepted friendships, one index per direction
+        Index(
+            "ix_friends_accepted_user",
+            "user_id",
+            "friend_id",
+            sqlite_where=and_(is_active == false(), is_accepted == true()),
+            postgresql_where=and_(is_active == false(), is_accepted == true()),
+        ),
+        Index(
+            "ix_friends_accepted_friend",
+            "friend_id",
+            "user_id",
+            sqlite_where=and_(is_active == false(), is_accepted == true()),
+            postgresql_where=and_(is_active == false(), is_accepted == true()),
+        ),
+    )
+
+
+class FriendSuggestion(Base):
+    """Precomputed friend-of-friend suggestion: `candidate_id` shares
+    `mutual_count` accepted friends with `user_id` and is not yet their friend.
+
+    Maintained incrementally by friend_service when friendships are accepted
+    or removed; rebuild from scratch with scripts/rebuild_friend_suggestions.py.
+    """
+
+    __tablename__ = "friend_suggestions"
+    __table_args__ = (
+        # top-N read: WHERE user_id = ? ORDER BY mutual_count DESC, candidate_id
+        Index(
+            "ix_friend_suggestions_user_rank",
+            "user_id",
+            "mutual_count",
+            "candidate_id",
+        ),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    candidate_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    mutual_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text, func
+
+from database import Base
+
+
+class AvatarAsset(Base):
+    """Processed avatar variants, keyed by the SHA-256 of the uploaded bytes.
+
+    A repeat upload of the same image reuses these URLs instead of decoding,
+    resizing and storing it again.
+    """
+
+    __tablename__ = "avatar_assets"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    # JSON object: variant size in pixels (as a string) -> URL
+    variants = Column(Text, nullable=False)
+    # storage backend that holds the variants (local | cloudinary)
+    storage = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
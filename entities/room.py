@@ -0,0 +1,60 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    DateTime,
+    Boolean,
+    Index,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.orm import relationship
+from database import Base
+
+
+class Room(Base):
+    """A multi-party conversation (group chat / team channel)."""
+
+    __tablename__ = "rooms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+    # soft delete flag, same convention as friends/users
+    is_active = Column(Boolean, default=False, nullable=False)
+
+    owner = relationship("User", foreign_keys=[owner_id])
+
+
+class RoomMember(Base):
+    __tablename__ = "room_members"
+    __table_args__ = (UniqueConstraint("room_id", "user_id", name="uq_room_members_room_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    # indexed on its own so "rooms for user" is a single probe
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    role = Column(String, default="member", nullable=False)  # owner | member
+    joined_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+
+    room = relationship("Room", foreign_keys=[room_id])
+    user = relationship("User", foreign_keys=[user_id])
+
+
+class RoomMessage(Base):
+    """A message posted to a room; stored once regardless of member count."""
+
+    __tablename__ = "room_messages"
+    __table_args__ = (Index("ix_room_messages_room_id_id", "room_id", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    user_from_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    text = Column(String, nullable=False)
+    image_url = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+
+    room = relationship("Room", foreign_keys=[room_id])
+    user_from = relationship("User", foreign_keys=[user_from_id])
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import datetime
 from pydantic import BaseModel, Field
 
@@ -146,6 +146,7 @@ class FriendOut(BaseModel):
     date_of_birth: Optional[str] = None
     gender: Optional[str] = None
     avatar_url: Optional[str] = None
+    mutual_count: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -153,12 +154,145 @@ class FriendOut(BaseModel):
 
 class FriendListOut(BaseModel):
     friends: List[FriendOut] = Field(default_factory=list)
-    total: int = 0
+    # None for keyset-paginated listings that skip the COUNT
+    total: Optional[int] = 0
     page: int = 1
     per_page: int = 20
     next_page: Optional[int] = None
     prev_page: Optional[int] = None
+    next_before_id: Optional[int] = None
 
     class Config:
         orm_mode = True
-        from_attributes = True  # allow population from ORM objects
\ No newline at end of file
+        from_attributes = True  # allow population from ORM objects
+
+class MutualCountsOut(BaseModel):
+    # other user id -> number of mutual friends
+    counts: Dict[int, int] = Field(default_factory=dict)
+
+
+class UserSearchHit(BaseModel):
+    id: int
+    username: str
+    full_name: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+
+class UserSearchOut(BaseModel):
+    items: List[UserSearchHit] = Field(default_factory=list)
+
+
+class FriendBulkRequest(BaseModel):
+    # accept/decline: user_ids are requesters; cancel: user_ids are recipients
+    action: str
+    user_ids: List[int] = Field(default_factory=list)
+
+
+class FriendBulkResult(BaseModel):
+    user_id: int
+    # accepted | declined | cancelled | not_found
+    status: str
+
+
+class FriendBulkOut(BaseModel):
+    action: str
+    updated: int = 0
+    results: List[FriendBulkResult] = Field(default_factory=list)
+
+
+class UserBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+    # subset of UserOut fields to return; all of them when omitted
+    fields: Optional[List[str]] = None
+
+
+class UserBatchOut(BaseModel):
+    # profiles in request order, limited to the requested fields
+    items: List[Dict[str, Any]] = Field(default_factory=list)
+    # requested ids with no matching user
+    missing: List[int] = Field(default_factory=list)
+
+
+class CampaignCreate(BaseModel):
+    subject: str = Field(..., min_length=1, max_length=200)
+    message: str = Field(..., min_length=1, max_length=10000)
+    # all | verified | unverified
+    segment: str = "all"
+    # recipients per second; CAMPAIGN_RATE_PER_SECOND when omitted
+    rate_per_second: Optional[int] = None
+
+
+class CampaignOut(BaseModel):
+    id: int
+    subject: str
+    message: str
+    segment: str
+    status: str
+    rate_per_second: int
+    total: int
+    processed: int
+    sent_ws: int
+    sent_email: int
+    created_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class UserImportError(BaseModel):
+    line: int
+    error: str
+
+
+class UserImportOut(BaseModel):
+    created: int
+    skipped: int
+    # the first IMPORT_MAX_ERRORS skipped records
+    errors: List[UserImportError]
+    seconds: float
+
+
+# Room (group conversation) schemas
+class RoomCreate(BaseModel):
+    name: str
+    member_ids: List[int] = Field(default_factory=list)
+
+
+class RoomMemberRequest(BaseModel):
+    user_id: int
+
+
+class RoomMessageCreate(BaseModel):
+    text: str
+    image_url: Optional[str] = None
+
+
+class RoomOut(BaseModel):
+    id: int
+    name: str
+    owner_id: int
+    created_at: Optional[datetime.datetime] = None
+    member_count: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True  # allow population from ORM objects
+
+
+class RoomMessageOut(BaseModel):
+    id: int
+    room_id: int
+    user_from_id: int
+    text: str
+    image_url: Optional[str] = None
+    created_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
+        from_attributes = True  # allow population from ORM objects
+
+
+class RoomMessageListOut(BaseModel):
+    items: List[RoomMessageOut] = Field(default_factory=list)
+    next_before_id: Optional[int] = None
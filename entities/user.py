@@ -1,6 +1,8 @@
+import random
 import uuid
 from sqlalchemy import (
     Column,
+    Float,
     Integer,
     String,
     ForeignKey,
@@ -36,6 +38,8 @@ class User(Base):
     # last_login = Column(String, index=True)
     is_active = Column(Boolean, index=True, default=False)
     is_verified = Column(Boolean, index=True, default=False, nullable=True)
+    # uniform [0, 1) key used to draw random samples with an index range scan
+    random_key = Column(Float, index=True, default=random.random, nullable=True)
 
     # # one-to-many: User -> Post
     # posts = relationship("Post", back_populates="author", cascade="all, delete-orphan")
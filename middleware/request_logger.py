@@ -1,13 +1,26 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
+import re
 import time
 
+from utils.db_metrics import current_endpoint
+
+# collapse numeric path segments so /users/12 and /users/34 share one label
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
 
 class RequestLoggerMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next) -> Response:
         start = time.time()
-        response = await call_next(request)
+        # label DB pool checkouts made while serving this request
+        token = current_endpoint.set(
+            f"{request.method} {_ID_SEGMENT.sub('/{id}', request.url.path)}"
+        )
+        try:
+            response = await call_next(request)
+        finally:
+            current_endpoint.reset(token)
         duration = (time.time() - start) * 1000
         print(
             f"[Request] {request.method} {request.url.path} completed_in={duration:.2f}ms status={response.status_code}"
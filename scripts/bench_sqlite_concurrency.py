@@ -0,0 +1,128 @@
+"""Benchmark SQLite read/write concurrency with the default vs tuned profile.
+
+Writer threads insert chat messages (like `chat_service.create_chat`) while
+reader threads page through a conversation (like
+`get_conversation_between_users`). For each profile we report write/read
+throughput and how many operations failed with "database is locked".
+
+Usage:
+  python scripts/bench_sqlite_concurrency.py [--seconds 5] [--writers 4] [--readers 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project root
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SQLITE_PRAGMAS, apply_sqlite_profile, retry_on_busy
+from entities.chat import Chat
+from entities.user import User
+from entities.friend import Friend  # noqa: F401  (register mapper)
+
+
+def _make_engine(path: str, tuned: bool):
+    # the stock profile still gets pysqlite's default 5s busy wait; we drop it
+    # to 0 so lock contention shows up as errors rather than silent stalls
+    connect_args = {"check_same_thread": False}
+    if not tuned:
+        connect_args["timeout"] = 0
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args=connect_args, pool_size=32, max_overflow=0
+    )
+    if tuned:
+        apply_sqlite_profile(engine)
+    return engine
+
+
+def run(profile: str, seconds: float, writers: int, readers: int) -> dict:
+    tuned = profile == "tuned"
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = _make_engine(path, tuned)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        db.add_all([User(id=1, username="a", email="a@x"), User(id=2, username="b", email="b@x")])
+        db.commit()
+
+    stats = {"writes": 0, "reads": 0, "write_locked": 0, "read_locked": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def _insert():
+        with Session() as db:
+            db.add(Chat(user_to_id=2, user_from_id=1, text="hello"))
+            db.commit()
+
+    insert = retry_on_busy(_insert) if tuned else _insert
+
+    def writer():
+        while time.monotonic() < stop:
+            try:
+                insert()
+                key = "writes"
+            except OperationalError:
+                key = "write_locked"
+            with lock:
+                stats[key] += 1
+
+    def reader():
+        while time.monotonic() < stop:
+            try:
+                with Session() as db:
+                    (
+                        db.query(Chat)
+                        .filter(
+                            ((Chat.user_to_id == 1) & (Chat.user_from_id == 2))
+                            | ((Chat.user_to_id == 2) & (Chat.user_from_id == 1))
+                        )
+                        .order_by(Chat.created_at.desc())
+                        .limit(50)
+                        .all()
+                    )
+                key = "reads"
+            except OperationalError:
+                key = "read_locked"
+            with lock:
+                stats[key] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    stats["writes_per_s"] = round(stats["writes"] / seconds, 1)
+    stats["reads_per_s"] = round(stats["reads"] / seconds, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    print("tuned pragmas:", SQLITE_PRAGMAS)
+    for profile in ("default", "tuned"):
+        result = run(profile, args.seconds, args.writers, args.readers)
+        print(f"[{profile:7}] {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Micro-benchmark: per-call statement overhead of ORM Query vs pre-built select().
+
+For each hot query we time two things per call:
+  - build: constructing the statement and computing its SQL cache key, i.e.
+    the compile-side work left on every call once SQLAlchemy's compiled cache
+    is warm (a pre-built statement memoizes its cache key)
+  - total: build + execute against an in-memory SQLite database
+
+Usage:
+  python scripts/bench_statement_cache.py [--iterations 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project root
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from entities.chat import Chat
+from entities.friend import Friend
+from entities.user import User
+from services import chat_service, friend_service, user_service
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=i, username=f"u{i}", email=f"u{i}@x") for i in range(1, 4)])
+    db.add_all([Chat(user_to_id=2, user_from_id=1, text=f"m{i}") for i in range(50)])
+    db.add_all(
+        [
+            Friend(user_id=1, friend_id=2, is_accepted=True, is_active=False),
+            Friend(user_id=3, friend_id=1, is_accepted=True, is_active=False),
+        ]
+    )
+    db.commit()
+
+    cases = {
+        "conversation page": (
+            lambda: db.query(Chat)
+            .filter(
+                ((Chat.user_to_id == 1) & (Chat.user_from_id == 2))
+                | ((Chat.user_to_id == 2) & (Chat.user_from_id == 1))
+            )
+            .order_by(Chat.created_at.asc())
+            .offset(0)
+            .limit(20),
+            lambda: chat_service._CONVERSATION_PAGE[("created_at", False, False)],
+            {"me": 1, "other": 2, "offset": 0, "limit": 20},
+        ),
+        "unread by sender": (
+            lambda: db.query(Chat.user_from_id, Chat.id)
+            .filter(Chat.user_to_id == 2, Chat.is_seen == False)
+            .group_by(Chat.user_from_id),
+            lambda: chat_service._UNREAD_BY_SENDER,
+            {"user_id": 2},
+        ),
+        "friendship lookup": (
+            lambda: db.query(Friend)
+            .filter(
+                ((Friend.user_id == 1) & (Friend.friend_id == 2))
+                | ((Friend.user_id == 2) & (Friend.friend_id == 1))
+            )
+            .limit(1),
+            lambda: friend_service._FRIENDSHIP_BETWEEN,
+            {"a": 1, "b": 2},
+        ),
+        "profile by id": (
+            lambda: db.query(User).filter(User.id == 1),
+            lambda: user_service._PROFILE_BY_ID,
+            {"user_id": 1},
+        ),
+    }
+
+    print(f"{'query':20} {'build old':>10} {'build new':>10} {'total old':>10} {'total new':>10}  (us/call)")
+    for name, (build_old, build_new, params) in cases.items():
+        b_old = _per_call_us(lambda: build_old()._statement_20()._generate_cache_key(), n)
+        b_new = _per_call_us(lambda: build_new()._generate_cache_key(), n)
+        t_old = _per_call_us(lambda: build_old().all(), n)
+        t_new = _per_call_us(lambda: db.execute(build_new(), params).all(), n)
+        print(f"{name:20} {b_old:10.1f} {b_new:10.1f} {t_old:10.1f} {t_new:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
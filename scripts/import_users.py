@@ -0,0 +1,48 @@
+"""Import users in bulk from a CSV or NDJSON file.
+
+Same import as POST /api/v1/admin/users/import, without the upload size and
+request time limits of an HTTP call. Welcome emails are queued in the email
+outbox and sent by the running server's worker.
+
+Usage:
+  python scripts/import_users.py users.csv
+  python scripts/import_users.py users.ndjson --batch-size 2000 --no-welcome-email
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project root
+
+from database import SessionLocal
+from services import user_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path", help="CSV (with header) or NDJSON file")
+    parser.add_argument("--format", choices=user_import.FORMATS, help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=user_import.IMPORT_BATCH)
+    parser.add_argument("--processes", type=int, default=user_import.IMPORT_HASH_PROCESSES)
+    parser.add_argument("--no-welcome-email", action="store_true")
+    args = parser.parse_args()
+
+    fmt = args.format or user_import.detect_format(args.path)
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as fh:
+            report = user_import.import_users(
+                db,
+                user_import.read_records(fh, fmt),
+                send_welcome=not args.no_welcome_email,
+                batch_size=args.batch_size,
+                processes=args.processes,
+            )
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Rebuild the materialized friend_suggestions table from the friends table.
+
+friend_service keeps suggestions up to date incrementally; run this after
+bulk data changes or if the table is suspected to have drifted.
+
+Usage:
+  python scripts/rebuild_friend_suggestions.py
+"""
+import sys, os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project root
+
+from database import SessionLocal
+from entities.friend import FriendSuggestion
+from services import friend_service
+
+
+def main():
+    db = SessionLocal()
+    try:
+        friend_service.rebuild_friend_suggestions(db)
+        print("friend_suggestions rows:", db.query(FriendSuggestion).count())
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Local SMTP stand-in that accepts every message and prints a summary.
+
+Use it to run the email outbox without a real mail server:
+
+    python scripts/smtp_sink.py --port 1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false uvicorn app:app
+
+Supports the plain (no TLS, no AUTH) subset of SMTP that smtplib uses, and
+many messages per connection, so connection reuse is visible in the output.
+"""
+import argparse
+import socketserver
+from email import message_from_bytes
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        self.server.connections += 1
+        connection = self.server.connections
+        self.reply("220 smtp-sink ready")
+        while line := self.rfile.readline():
+            command = line.decode("utf-8", "replace").strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250 smtp-sink")
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                message = message_from_bytes(b"".join(data))
+                self.server.messages += 1
+                print(
+                    f"[smtp-sink] #{self.server.messages} conn={connection} "
+                    f"to={message['To']} subject={message['Subject']!r}",
+                    flush=True,
+                )
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 command not implemented")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    connections = 0
+    messages = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    with SinkServer((args.host, args.port), SinkHandler) as server:
+        print(f"[smtp-sink] listening on {args.host}:{args.port}", flush=True)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
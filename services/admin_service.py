@@ -11,39 +11,37 @@ from typing import Optional
 
 from entities.user import UserAdmin
 from entities import schemas as s
-import os, bcrypt
+import os
 import jwt
 from datetime import datetime, timedelta
 from entities.user import UserRole
 from typing import Any
+from settings import settings
+from services.user_service import verify_token as user_verify_token
+from services.password_service import hasher
+from starlette.concurrency import run_in_threadpool
+from services.profile_cache import profiles
+from services.role_cache import admin_roles
 
 
-def create_user_admin(db: Session, user: s.UserCreate) -> dict:
+async def create_user_admin(db: Session, user: s.UserCreate) -> dict:
     # Create a User instance and let the database assign the primary key
     try:
-        return _extracted_from_create_user_admin(db, user)
+        return await _extracted_from_create_user_admin(db, user)
     except Exception as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         if isinstance(e, HTTPException):
             raise e  # re-raise HTTP exceptions as they are
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 # TODO Rename this here and in `create_user_admin`
-def _extracted_from_create_user_admin(db, user):
-    if (
-        existing_user := db.query(UserAdmin)
-        .filter(UserAdmin.username == user.username)
-        .first()
-    ):
+async def _extracted_from_create_user_admin(db, user):
+    if existing_user := await run_in_threadpool(_admin_by_username, db, user.username):
         raise HTTPException(status_code=400, detail="Username already exists")
 
     # Hash the password before storing it (for security)
-    # Use bcrypt to hash the password (includes salt)
-    salt = bcrypt.gensalt()  # generate a random salt
-    hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), salt)
-    # store as utf-8 string so DB String column can hold it
-    hashed_password_str = hashed_password.decode("utf-8")
+    hashed_password_str = await hasher.hash_async(user.password)
 
     db_user = UserAdmin(
         username=user.username,
@@ -51,17 +49,27 @@ def _extracted_from_create_user_admin(db, user):
         password=hashed_password_str,
         role=str(user.role) or str(UserRole.ADMIN.value),  # use default role if not provided
     )
+    await run_in_threadpool(_insert_admin, db, db_user)
+    # drop a cached "no admin account" answer for this id
+    admin_roles.invalidate(db_user.id)
+    return {"message": "User created successfully"}
+
+
+def _admin_by_username(db: Session, username: str) -> Optional[UserAdmin]:
+    return db.query(UserAdmin).filter(UserAdmin.username == username).first()
+
+
+def _insert_admin(db: Session, db_user: UserAdmin):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)  # refresh to get the generated id
-    return {"message": "User created successfully"}
 
 
-def login_user_admin(
+async def login_user_admin(
     db: Session, user: s.UserLogin, response: Response, domain: Optional[str] = None
 ) -> dict:
     try:
-        return _extracted_from_login_user_admin(db, user, response, domain)
+        return await _extracted_from_login_user_admin(db, user, response, domain)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e  # re-raise HTTP exceptions as they are
@@ -69,16 +77,15 @@ def login_user_admin(
 
 
 # TODO Rename this here and in `login_user_admin`
-def _extracted_from_login_user_admin(db, user, response, domain):
-    db_user = db.query(UserAdmin).filter(UserAdmin.username == user.username).first()
+async def _extracted_from_login_user_admin(db, user, response, domain):
+    db_user = await run_in_threadpool(_admin_by_username, db, user.username)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # ensure stored password is bytes for bcrypt.checkpw
     stored = db_user.password
-    stored_bytes = stored.encode("utf-8") if isinstance(stored, str) else stored
-    if not bcrypt.checkpw(user.password.encode("utf-8"), stored_bytes):
+    if not await hasher.verify_async(user.password, stored):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    hasher.rehash_if_needed(UserAdmin, db_user.id, user.password, stored)
 
     # use userId key for consistency with /users/me
     token_payload = {"userId": db_user.id, "username": db_user.username}
@@ -96,15 +103,8 @@ def logout_user_admin(response: Response) -> dict:
 
 
 def verify_token(token: str) -> Optional[int]:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
-    try:
-        payload = jwt.decode(token, jwt_secret, algorithms=["HS256"])
-        user_id = payload.get("userId")  # use userId key as set in login_user
-        return None if user_id is None else user_id
-    except jwt.ExpiredSignatureError:
-        return None  # token expired
-    except Exception:
-        return None  # invalid token
+    # admins and users share one token format; reuse the cached verification
+    return user_verify_token(token)
 
 
 def get_profile(db: Session, user_id: int) -> dict:
@@ -141,6 +141,8 @@ def update_profile_admin(db: Session, user_id: int, profile_data: dict) -> dict:
                 setattr(user, key, value)
 
         db.commit()
+        # the role may have changed; require_role must not serve the old one
+        admin_roles.invalidate(user_id)
         return {"message": "Profile updated successfully"}
     except Exception as e:
         db.rollback()
@@ -172,31 +174,31 @@ def reset_password(db: Session, user_id: int) -> dict:
     # In a real application, this would generate a reset token and send an email to the user
     return {"message": f"Password reset requested for user ID {user_id}"}
 
-def change_password(db: Session, user_id: int, new_password: str) -> dict:
-    user = db.query(UserAdmin).filter(UserAdmin.id == user_id).first()
+async def change_password(db: Session, user_id: int, new_password: str) -> dict:
+    user = await run_in_threadpool(
+        lambda: db.query(UserAdmin).filter(UserAdmin.id == user_id).first()
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Hash the new password
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(new_password.encode("utf-8"), salt)
-    user.password = hashed_password.decode("utf-8")  # store as string
+    user.password = await hasher.hash_async(new_password)
 
-    db.commit()
+    await run_in_threadpool(db.commit)
     return {"message": "Password changed successfully"}
 
 
 def generate_token(
     payload: dict, response: Response, domain: Optional[str] = None
 ) -> str:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
-    exp = now + timedelta(hours=1)
+    exp = now + timedelta(seconds=settings.access_token_ttl_seconds)
     token = jwt.encode(
         {**payload, "exp": exp, "iat": now}, jwt_secret, algorithm="HS256"
     )
     # use secure cookies only in production (HTTPS). For local testing over HTTP set secure=False
-    secure_flag = os.getenv("ENV", "development") == "production"
+    secure_flag = settings.secure_cookies
     # set cookie with path and max_age so browsers accept it predictably
     response.set_cookie(
         key="access_token",
@@ -206,7 +208,7 @@ def generate_token(
         samesite="None",  # allow cross-site cookies for testing; set to "Lax" or "Strict" in production
         path="/",
         domain=domain,
-        max_age=3600,  # 1 hour in seconds
+        max_age=settings.access_token_ttl_seconds,
     )
     # debug: print Set-Cookie header that was added to the response
     with contextlib.suppress(Exception):
@@ -217,14 +219,14 @@ def generate_token(
 def generate_refresh_token(
     payload: dict, response: Response, domain: Optional[str] = None
 ) -> str:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
-    exp = now + timedelta(days=7)  # refresh token valid for 7 days
+    exp = now + timedelta(seconds=settings.refresh_token_ttl_seconds)
     token = jwt.encode(
         {**payload, "exp": exp, "iat": now}, jwt_secret, algorithm="HS256"
     )
     # use secure cookies only in production (HTTPS). For local testing over HTTP set secure=False
-    secure_flag = os.getenv("ENV", "development") == "production"
+    secure_flag = settings.secure_cookies
     response.set_cookie(
         key="refresh_token",
         value=token,
@@ -233,7 +235,7 @@ def generate_refresh_token(
         samesite="None",  # allow cross-site cookies for testing; set to "Lax" or "Strict" in production
         path="/",
         domain=domain,
-        max_age=7 * 24 * 3600,
+        max_age=settings.refresh_token_ttl_seconds,
     )
     with contextlib.suppress(Exception):
         print("[debug] set-refresh-cookie header:", response.headers.get("set-cookie"))
@@ -254,6 +256,7 @@ def delete_user_account(db: Session, target_user_id: int) -> dict:
         user.is_active = True  # soft delete by deactivating the account
         # db.delete(user)
         db.commit()
+        profiles.invalidate(target_user_id)
         return {"message": "User deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -0,0 +1,206 @@
+"""Avatar upload pipeline.
+
+An upload is read in chunks, capped at AVATAR_MAX_BYTES (413 beyond) and
+hashed with SHA-256 on the way. If an image with the same hash was processed
+before, its stored variants are reused and nothing is decoded or uploaded.
+Otherwise the image is decoded, EXIF-rotated, centre-cropped and resized to
+each of AVATAR_SIZES as WebP on a small worker pool (AVATAR_WORKERS), and
+the variants are uploaded concurrently through media_service under
+content-addressed keys. Concurrent uploads of the same image share one job.
+The request's event loop only awaits the job, so no server thread is held
+while images are resized or uploaded.
+
+Without Pillow installed, the original bytes are stored once and used for
+every variant (no resizing).
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import bindparam, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from entities.media import AvatarAsset
+from services import user_service
+from services.media_service import media
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # Pillow is optional; variants fall back to the original
+    Image = None
+    logger.warning("Pillow is not installed; avatars are stored without resizing")
+
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", str(40_000_000)))
+AVATAR_SIZES = tuple(
+    sorted(int(size) for size in os.getenv("AVATAR_SIZES", "64,128,256").split(","))
+)
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+AVATAR_QUEUE = int(os.getenv("AVATAR_QUEUE", "8"))
+READ_CHUNK = 64 * 1024
+
+# leading bytes -> content type; anything else is rejected before decoding
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_VARIANTS_BY_HASH = select(AvatarAsset.variants).where(
+    AvatarAsset.sha256 == bindparam("sha256")
+)
+
+_executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatar")
+# sha256 -> job, so concurrent uploads of one image share the work; only
+# touched from the event loop, so no lock is needed
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+async def read_upload(file: UploadFile, max_bytes: int = AVATAR_MAX_BYTES) -> Tuple[bytes, str]:
+    """Read an upload in chunks up to `max_bytes`; returns (data, sha256 hex)."""
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while chunk := await file.read(READ_CHUNK):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"Avatar must be at most {max_bytes} bytes"
+            )
+        digest.update(chunk)
+        chunks.append(chunk)
+    if not size:
+        raise HTTPException(status_code=400, detail="Empty file")
+    return b"".join(chunks), digest.hexdigest()
+
+
+def render_variants(data: bytes) -> Dict[int, bytes]:
+    """Square WebP variants for every size in AVATAR_SIZES.
+
+    Raises ValueError for data that is not a decodable image of sane size.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        # the header is parsed; check the size before decoding any pixels
+        if image.width * image.height > AVATAR_MAX_PIXELS:
+            raise ValueError("Image dimensions are too large")
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError("Unreadable image") from e
+    with image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        variants = {}
+        for size in AVATAR_SIZES:
+            resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, "WEBP", quality=85)
+            variants[size] = buffer.getvalue()
+        return variants
+
+
+async def _process(sha256: str, data: bytes, content_type: str) -> Dict[str, str]:
+    if Image is None:
+        url = await media.put(f"avatars/{sha256}/original", data, content_type)
+        urls = {str(size): url for size in AVATAR_SIZES}
+    else:
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            _executor, render_variants, data
+        )
+        uploaded = await asyncio.gather(
+            *(
+                media.put(f"avatars/{sha256}/{size}.webp", variant, "image/webp")
+                for size, variant in rendered.items()
+            )
+        )
+        urls = {str(size): url for size, url in zip(rendered, uploaded)}
+    await run_in_threadpool(_record_asset, sha256, urls)
+    return urls
+
+
+def _record_asset(sha256: str, urls: Dict[str, str]):
+    with SessionLocal() as db:
+        db.add(AvatarAsset(sha256=sha256, variants=json.dumps(urls), storage=media.storage.name))
+        try:
+            db.commit()
+        except IntegrityError:
+            # another process stored the same image first; keys are identical
+            db.rollback()
+
+
+def _submit(sha256: str, data: bytes, content_type: str) -> asyncio.Task:
+    if task := _inflight.get(sha256):
+        return task
+    if len(_inflight) >= AVATAR_WORKERS + AVATAR_QUEUE:
+        raise HTTPException(
+            status_code=503,
+            detail="Avatar processing is busy, please retry shortly",
+            headers={"Retry-After": "2"},
+        )
+    task = asyncio.ensure_future(_process(sha256, data, content_type))
+    _inflight[sha256] = task
+    task.add_done_callback(lambda _: _inflight.pop(sha256, None))
+    return task
+
+
+def existing_variants(db: Session, sha256: str) -> Optional[Dict[str, str]]:
+    variants = db.scalar(_VARIANTS_BY_HASH, {"sha256": sha256})
+    return json.loads(variants) if variants else None
+
+
+async def store_avatar(db: Session, user_id: int, file: UploadFile) -> dict:
+    """Process an uploaded avatar and make it the user's avatar.
+
+    Returns the URL stored as `avatar_url` (the largest variant) and every
+    variant by size, so clients can load the smallest that fits.
+    """
+    data, sha256 = await read_upload(file)
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        raise HTTPException(
+            status_code=415, detail="Avatar must be a JPEG, PNG, GIF or WebP image"
+        )
+
+    variants = await run_in_threadpool(existing_variants, db, sha256)
+    deduplicated = variants is not None
+    if variants is None:
+        task = _submit(sha256, data, content_type)
+        try:
+            # shielded: one client disconnecting must not cancel a shared job
+            variants = await asyncio.shield(task)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("avatar processing failed")
+            raise HTTPException(status_code=500, detail="Failed to upload avatar") from e
+
+    avatar_url = variants[str(AVATAR_SIZES[-1])]
+    await run_in_threadpool(user_service.upload_avatar, db, user_id, avatar_url)
+    return {
+        "message": "Avatar updated successfully",
+        "avatar": avatar_url,
+        "variants": variants,
+        "deduplicated": deduplicated,
+    }
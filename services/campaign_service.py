@@ -0,0 +1,320 @@
+"""Admin notification campaigns.
+
+A campaign sends one notification to a segment of users. Online users get a
+websocket frame, and everyone else gets an email through the email outbox:
+
+    {"type": "notification", "campaign_id": 3, "subject": "...", "message": "..."}
+
+Creating a campaign only inserts a row. A background runner walks the
+recipients in user id order, CAMPAIGN_CHUNK at a time, and throttles each
+campaign to its `rate_per_second`. The chunk's emails, progress counters and
+cursor are committed together, so after a restart the campaign resumes at the
+next unprocessed user and no email is queued twice. A runner leases the
+campaign it works on (CAMPAIGN_LEASE_SECONDS, renewed every chunk), so with
+several server processes each campaign is worked on by one of them. The lease
+records its owner, and renewals and progress updates only apply while the
+runner still owns it: a runner that stalled past its lease and was replaced
+stops at its next chunk instead of writing over its successor's cursor.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, false, func, or_, select, true, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from entities import schemas as s
+from entities.campaign import NotificationCampaign
+from entities.user import User
+from services import email_outbox, ws_service
+
+CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK", "500"))
+DEFAULT_RATE = int(os.getenv("CAMPAIGN_RATE_PER_SECOND", "100"))
+MAX_RATE = int(os.getenv("CAMPAIGN_MAX_RATE_PER_SECOND", "1000"))
+LEASE_SECONDS = float(os.getenv("CAMPAIGN_LEASE_SECONDS", "60"))
+POLL_SECONDS = float(os.getenv("CAMPAIGN_POLL_SECONDS", "10"))
+
+# soft-deleted users have is_active = true (see admin_service.delete_user_account)
+_SEGMENTS = {
+    "all": (User.is_active == false(),),
+    "verified": (User.is_active == false(), User.is_verified == true()),
+    "unverified": (
+        User.is_active == false(),
+        or_(User.is_verified == false(), User.is_verified.is_(None)),
+    ),
+}
+# next chunk of recipients after the cursor (primary key range scan)
+_RECIPIENTS = {
+    segment: select(User.id, User.email)
+    .where(User.id > bindparam("after"), *filters)
+    .order_by(User.id)
+    .limit(bindparam("chunk"))
+    for segment, filters in _SEGMENTS.items()
+}
+_SEGMENT_SIZE = {
+    segment: select(func.count()).select_from(User).where(*filters)
+    for segment, filters in _SEGMENTS.items()
+}
+# take the lease on a runnable campaign
+_CLAIM = (
+    update(NotificationCampaign)
+    .where(
+        NotificationCampaign.id == bindparam("campaign_id"),
+        NotificationCampaign.status.in_(("pending", "running")),
+        or_(
+            NotificationCampaign.lease_until.is_(None),
+            NotificationCampaign.lease_until < bindparam("now"),
+        ),
+    )
+    .values(
+        status="running",
+        lease_until=bindparam("lease_until"),
+        lease_owner=bindparam("owner"),
+    )
+    .execution_options(synchronize_session=False)
+)
+# only while this runner still holds the lease
+_OWNED = (
+    NotificationCampaign.id == bindparam("campaign_id"),
+    NotificationCampaign.lease_owner == bindparam("owner"),
+)
+_RENEW = (
+    update(NotificationCampaign)
+    .where(*_OWNED, NotificationCampaign.status == "running")
+    .values(lease_until=bindparam("lease_until"))
+    .execution_options(synchronize_session=False)
+)
+# a chunk's progress, committed with the chunk's emails; still recorded if
+# the campaign was paused meanwhile, since the chunk went out
+_ADVANCE = (
+    update(NotificationCampaign)
+    .where(*_OWNED)
+    .values(
+        cursor_user_id=bindparam("cursor"),
+        processed=NotificationCampaign.processed + bindparam("processed"),
+        sent_ws=NotificationCampaign.sent_ws + bindparam("sent_ws"),
+        sent_email=NotificationCampaign.sent_email + bindparam("sent_email"),
+        lease_until=bindparam("lease_until"),
+    )
+    .execution_options(synchronize_session=False)
+)
+_COMPLETE = (
+    update(NotificationCampaign)
+    .where(*_OWNED, NotificationCampaign.status == "running")
+    .values(status="completed", finished_at=func.now(), lease_until=None, lease_owner=None)
+    .execution_options(synchronize_session=False)
+)
+_RUNNABLE = (
+    select(NotificationCampaign.id)
+    .where(
+        NotificationCampaign.status.in_(("pending", "running")),
+        or_(
+            NotificationCampaign.lease_until.is_(None),
+            NotificationCampaign.lease_until < bindparam("now"),
+        ),
+    )
+    .order_by(NotificationCampaign.id)
+)
+
+
+def create_campaign(db: Session, admin_id: int, data: s.CampaignCreate) -> NotificationCampaign:
+    if data.segment not in _SEGMENTS:
+        raise HTTPException(
+            status_code=400, detail=f"segment must be one of: {', '.join(_SEGMENTS)}"
+        )
+    rate = data.rate_per_second or DEFAULT_RATE
+    if not 1 <= rate <= MAX_RATE:
+        raise HTTPException(
+            status_code=400, detail=f"rate_per_second must be between 1 and {MAX_RATE}"
+        )
+    campaign = NotificationCampaign(
+        created_by=admin_id,
+        subject=data.subject,
+        message=data.message,
+        segment=data.segment,
+        rate_per_second=rate,
+        total=db.scalar(_SEGMENT_SIZE[data.segment]),
+    )
+    db.add(campaign)
+    db.commit()
+    db.refresh(campaign)
+    runner.wake()
+    return campaign
+
+
+def get_campaign(db: Session, campaign_id: int) -> NotificationCampaign:
+    if campaign := db.get(NotificationCampaign, campaign_id):
+        return campaign
+    raise HTTPException(status_code=404, detail="Campaign not found")
+
+
+def list_campaigns(db: Session, page: int = 1, per_page: int = 20) -> list:
+    page, per_page = max(page, 1), min(max(per_page, 1), 100)
+    return db.scalars(
+        select(NotificationCampaign)
+        .order_by(NotificationCampaign.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    ).all()
+
+
+# action -> (statuses it applies to, new status)
+_TRANSITIONS = {
+    "pause": (("pending", "running"), "paused"),
+    "resume": (("paused",), "pending"),
+    "cancel": (("pending", "running", "paused"), "cancelled"),
+}
+
+
+def set_campaign_state(db: Session, campaign_id: int, action: str) -> NotificationCampaign:
+    """Pause, resume or cancel a campaign; the runner notices before its next chunk."""
+    campaign = get_campaign(db, campaign_id)
+    allowed, new_status = _TRANSITIONS[action]
+    if campaign.status not in allowed:
+        raise HTTPException(
+            status_code=409, detail=f"Cannot {action} a {campaign.status} campaign"
+        )
+    campaign.status = new_status
+    if new_status == "pending":
+        campaign.lease_until = None
+        campaign.lease_owner = None
+    elif new_status == "cancelled":
+        campaign.finished_at = func.now()
+    db.commit()
+    db.refresh(campaign)
+    if new_status == "pending":
+        runner.wake()
+    return campaign
+
+
+class CampaignRunner:
+    def __init__(self, poll_seconds: float, chunk_size: int):
+        self.poll_seconds = poll_seconds
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        # identifies this runner's leases across server processes
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def start(self):
+        """Start the runner thread (idempotent); it resumes unfinished campaigns."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="notification-campaigns", daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def run_campaign(self, campaign_id: int) -> Optional[str]:
+        """Deliver a campaign until it finishes, is paused/cancelled or its
+        lease is lost; returns the final status (None if it was not claimed
+        or the lease was lost to another runner)."""
+        with SessionLocal() as db:
+            if not self._lease(db, campaign_id):
+                return None
+            campaign = db.get(NotificationCampaign, campaign_id)
+            recipients = _RECIPIENTS[campaign.segment]
+            chunk = max(1, min(self.chunk_size, campaign.rate_per_second))
+            frame = {
+                "type": "notification",
+                "campaign_id": campaign.id,
+                "subject": campaign.subject,
+                "message": campaign.message,
+            }
+            owned = {"campaign_id": campaign_id, "owner": self.owner}
+            while True:
+                started = time.monotonic()
+                renewed = db.execute(
+                    _RENEW, {**owned, "lease_until": time.time() + LEASE_SECONDS}
+                ).rowcount
+                db.commit()
+                db.refresh(campaign)
+                if not renewed:
+                    # paused/cancelled, or taken over after our lease lapsed
+                    return campaign.status if campaign.lease_owner == self.owner else None
+                rows = db.execute(
+                    recipients, {"after": campaign.cursor_user_id, "chunk": chunk}
+                ).all()
+                if not rows:
+                    completed = db.execute(_COMPLETE, owned).rowcount
+                    db.commit()
+                    return "completed" if completed else None
+
+                online = ws_service.manager.connections
+                online_ids = [row.id for row in rows if row.id in online]
+                offline = [row for row in rows if row.id not in online and row.email]
+                # at-least-once for online users: a crash before the commit
+                # below re-sends this chunk's frames, never loses them
+                ws_service.manager.send_users_sync(online_ids, frame)
+                email_outbox.enqueue_many(
+                    db,
+                    (
+                        {"subject": campaign.subject, "recipient": row.email, "body": campaign.message}
+                        for row in offline
+                    ),
+                )
+                advanced = db.execute(
+                    _ADVANCE,
+                    {
+                        **owned,
+                        "cursor": rows[-1].id,
+                        "processed": len(rows),
+                        "sent_ws": len(online_ids),
+                        "sent_email": len(offline),
+                        "lease_until": time.time() + LEASE_SECONDS,
+                    },
+                ).rowcount
+                if not advanced:
+                    # lease lost: the new owner re-sends this chunk, so drop
+                    # our emails instead of queueing them twice
+                    db.rollback()
+                    return None
+                db.commit()
+                if offline:
+                    email_outbox.worker.wake()
+
+                # throttle to rate_per_second recipients
+                remaining = len(rows) / campaign.rate_per_second - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    # -- internals ---------------------------------------------------------
+    def _lease(self, db: Session, campaign_id: int) -> bool:
+        now = time.time()
+        claimed = db.execute(
+            _CLAIM,
+            {
+                "campaign_id": campaign_id,
+                "now": now,
+                "lease_until": now + LEASE_SECONDS,
+                "owner": self.owner,
+            },
+        ).rowcount
+        db.commit()
+        return bool(claimed)
+
+    def _run(self):
+        while True:
+            try:
+                with SessionLocal() as db:
+                    runnable = db.scalars(_RUNNABLE, {"now": time.time()}).all()
+                for campaign_id in runnable:
+                    self.run_campaign(campaign_id)
+            except Exception:
+                traceback.print_exc()
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+
+runner = CampaignRunner(poll_seconds=POLL_SECONDS, chunk_size=CHUNK_SIZE)
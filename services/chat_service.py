@@ -5,12 +5,46 @@ from typing import Optional
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add
 
-from database import SessionLocal
+from database import after_commit, commit, retry_on_busy, session_scope
 from entities.chat import Chat
 from services import ws_service
-from sqlalchemy import func
-
-
+from sqlalchemy import and_, bindparam, false, func, or_, select
+
+
+# Hot-path statements are built once at import time with bound parameters, so
+# each call only supplies values and SQLAlchemy reuses the cached compiled SQL.
+_CONVERSATION_WHERE = or_(
+    and_(Chat.user_to_id == bindparam("me"), Chat.user_from_id == bindparam("other")),
+    and_(Chat.user_to_id == bindparam("other"), Chat.user_from_id == bindparam("me")),
+)
+_CONVERSATION_SEARCH = Chat.text.ilike(bindparam("like"))
+_CONVERSATION_SORT_FIELDS = {"created_at": Chat.created_at, "id": Chat.id}
+
+# (searching) -> COUNT statement
+_CONVERSATION_COUNT = {
+    False: select(func.count(Chat.id)).where(_CONVERSATION_WHERE),
+    True: select(func.count(Chat.id)).where(_CONVERSATION_WHERE, _CONVERSATION_SEARCH),
+}
+# (sort field, descending, searching) -> page statement
+_CONVERSATION_PAGE = {
+    (field, desc, searching): select(Chat)
+    .where(_CONVERSATION_WHERE, *((_CONVERSATION_SEARCH,) if searching else ()))
+    .order_by(col.desc() if desc else col.asc())
+    .offset(bindparam("offset"))
+    .limit(bindparam("limit"))
+    for field, col in _CONVERSATION_SORT_FIELDS.items()
+    for desc in (False, True)
+    for searching in (False, True)
+}
+
+_UNREAD_BY_SENDER = (
+    select(Chat.user_from_id, func.count(Chat.id))
+    .where(Chat.user_to_id == bindparam("user_id"), Chat.is_seen == false())
+    .group_by(Chat.user_from_id)
+)
+
+
+@retry_on_busy
 def create_chat(
     user_to_id: int,
     user_from_id: int,
@@ -26,9 +60,11 @@ def create_chat(
     - notify: if True, send websocket notifications to recipient/sender.
     - mark_seen: if True, mark the message as seen immediately (used when recipient
       is currently viewing the chat) so unread count does not increase.
+
+    Inside a `unit_of_work()` the message is only flushed and notifications are
+    queued until the outer transaction commits.
     """
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         chat = Chat(
             user_to_id=user_to_id,
             user_from_id=user_from_id,
@@ -40,23 +76,20 @@ def create_chat(
             chat.is_seen = True
 
         db.add(chat)
-        db.commit()
+        commit(db)
         db.refresh(chat)
 
         if notify:
             # notify recipient in real-time (non-blocking)
             with contextlib.suppress(Exception):
-                _extracted_from_create_chat_36(
-                    user_to_id, chat, user_from_id, mark_seen
-                )
+                _notify_new_message(user_to_id, chat, user_from_id, mark_seen)
         return chat
-    finally:
-        db.close()
 
 
-# TODO Rename this here and in `create_chat`
-def _extracted_from_create_chat_36(user_to_id, chat, user_from_id, mark_seen):
-    ws_service.manager.send_personal_sync(
+def _notify_new_message(user_to_id, chat, user_from_id, mark_seen):
+    send = ws_service.manager.send_personal_sync
+    after_commit(
+        send,
         user_to_id,
         {
             "type": "new_message",
@@ -68,7 +101,8 @@ def _extracted_from_create_chat_36(user_to_id, chat, user_from_id, mark_seen):
 
     # If recipient immediately saw the message, notify sender with message_seen
     if mark_seen:
-        ws_service.manager.send_personal_sync(
+        after_commit(
+            send,
             user_from_id,
             {
                 "type": "message_seen",
@@ -77,43 +111,38 @@ def _extracted_from_create_chat_36(user_to_id, chat, user_from_id, mark_seen):
             },
         )
 
-    # update unread counts for both parties (client can decide what to do)
-    unread_recipient = count_unread_chats_for_user(user_to_id)
-    ws_service.manager.send_personal_sync(
-        user_to_id, {"type": "unread_count", "count": unread_recipient}
-    )
+    # update unread counts for both parties (client can decide what to do);
+    # counted now so they include the new message, delivered after commit
+    unread_recipient = count_unread_chats_for_user_and_group_by_sender(user_to_id)
+    after_commit(send, user_to_id, {"type": "unread_count", "count": unread_recipient})
 
-    unread_sender = count_unread_chats_for_user(user_from_id)
-    ws_service.manager.send_personal_sync(
-        user_from_id, {"type": "unread_count", "count": unread_sender}
-    )
+    unread_sender = count_unread_chats_for_user_and_group_by_sender(user_from_id)
+    after_commit(send, user_from_id, {"type": "unread_count", "count": unread_sender})
 
 
 def get_chats_for_user(user_id: int):
     """Get all chat messages for a given user (both sent and received)."""
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         return (
             db.query(Chat)
             .filter((Chat.user_to_id == user_id) | (Chat.user_from_id == user_id))
             .order_by(Chat.created_at.desc())
             .all()
         )
-    finally:
-        db.close()
 
 
+@retry_on_busy
 def mark_chat_as_seen(chat_id: int):
     """Mark a chat message as seen."""
-    db = SessionLocal()
-    try:
-        if chat := db.query(Chat).filter(Chat.id == chat_id).first():
+    with session_scope() as db:
+        if chat := db.get(Chat, chat_id):
             chat.is_seen = True
-            db.commit()
+            commit(db)
             db.refresh(chat)
             # notify sender that recipient has seen the message
             with contextlib.suppress(Exception):
-                ws_service.manager.send_personal_sync(
+                after_commit(
+                    ws_service.manager.send_personal_sync,
                     chat.user_from_id,
                     {
                         "type": "message_seen",
@@ -123,107 +152,86 @@ def mark_chat_as_seen(chat_id: int):
                 )
                 # update unread count for sender
                 unread = count_unread_chats_for_user_and_group_by_sender(chat.user_from_id)
-                ws_service.manager.send_personal_sync(
-                    chat.user_from_id, {"type": "unread_count", "count": unread}
+                after_commit(
+                    ws_service.manager.send_personal_sync,
+                    chat.user_from_id,
+                    {"type": "unread_count", "count": unread},
                 )
             return chat
         return None
-    finally:
-        db.close()
 
 
+@retry_on_busy
 def mark_chat_as_sent(chat_id: int):
     """Mark a chat message as sent (for delivery status)."""
-    db = SessionLocal()
-    try:
-        if chat := db.query(Chat).filter(Chat.id == chat_id).first():
+    with session_scope() as db:
+        if chat := db.get(Chat, chat_id):
             chat.is_sent = True
-            db.commit()
+            commit(db)
             db.refresh(chat)
             # notify sender or recipient about sent status
             with contextlib.suppress(Exception):
-                ws_service.manager.send_personal_sync(
+                after_commit(
+                    ws_service.manager.send_personal_sync,
                     chat.user_from_id,
                     {"type": "message_sent", "chat_id": chat.id},
                 )
             return chat
         return None
-    finally:
-        db.close()
 
 def count_unread_chats_for_user_and_group_by_sender(user_id: int) -> dict:
     """Count the number of unread chat messages for a given user."""
-    db = SessionLocal()
-    try:
-        count = (
-            db.query(Chat)
-            .filter(Chat.user_to_id == user_id, Chat.is_seen == False)
-            .count()
-        )
-        # TODO: for a more advanced version, we could group by user_from_id to get counts per sender
-        sender_counts = (
-            db.query(Chat.user_from_id, func.count(Chat.id))
-            .filter(Chat.user_to_id == user_id, Chat.is_seen == False)
-            .group_by(Chat.user_from_id)
-            .all()
+    with session_scope() as db:
+        # one grouped query; the total is the sum of the per-sender counts
+        sender_counts = dict(
+            db.execute(_UNREAD_BY_SENDER, {"user_id": user_id}).all()
         )
         return {
-            "unread_count": count,
+            "unread_count": sum(sender_counts.values()),
             "user_id": user_id,
-            "sender_counts": dict(sender_counts),
+            "sender_counts": sender_counts,
         }
-    finally:
-        db.close()
 
 
+@retry_on_busy
 def delete_chat(chat_id: int):
     """Delete a chat message by ID."""
-    db = SessionLocal()
-    try:
-        if chat := db.query(Chat).filter(Chat.id == chat_id).first():
+    with session_scope() as db:
+        if chat := db.get(Chat, chat_id):
             db.delete(chat)
-            db.commit()
+            commit(db)
             return True
         return False
-    finally:
-        db.close()
 
 
+@retry_on_busy
 def update_chat_text(chat_id: int, new_text: str):
     """Update the text of a chat message."""
-    db = SessionLocal()
-    try:
-        if chat := db.query(Chat).filter(Chat.id == chat_id).first():
+    with session_scope() as db:
+        if chat := db.get(Chat, chat_id):
             chat.text = new_text
-            db.commit()
+            commit(db)
             db.refresh(chat)
             return chat
         return None
-    finally:
-        db.close()
 
 
+@retry_on_busy
 def update_chat_image(chat_id: int, new_image_url: str):
     """Update the image URL of a chat message."""
-    db = SessionLocal()
-    try:
-        if chat := db.query(Chat).filter(Chat.id == chat_id).first():
+    with session_scope() as db:
+        if chat := db.get(Chat, chat_id):
             chat.image_url = new_image_url
-            db.commit()
+            commit(db)
             db.refresh(chat)
             return chat
         return None
-    finally:
-        db.close()
 
 
 def get_chat_by_id(chat_id: int):
     """Get a chat message by ID."""
-    db = SessionLocal()
-    try:
-        return db.query(Chat).filter(Chat.id == chat_id).first()
-    finally:
-        db.close()
+    with session_scope() as db:
+        return db.get(Chat, chat_id)
 
 
 def get_conversation_between_users(
@@ -236,28 +244,20 @@ def get_conversation_between_users(
     sort_order: str = "asc",
 ):
     """Get the conversation (chat messages) between two users."""
-    db = SessionLocal()
-    try:
-        # build base query for messages between the two users
-        base_query = db.query(Chat).filter(
-            ((Chat.user_to_id == user1_id) & (Chat.user_from_id == user2_id))
-            | ((Chat.user_to_id == user2_id) & (Chat.user_from_id == user1_id))
-        )
+    with session_scope() as db:
+        params = {"me": user1_id, "other": user2_id}
 
         # optional search on text
-        if q:
-            like = f"%{q}%"
-            base_query = base_query.filter(Chat.text.ilike(like))
+        searching = bool(q)
+        if searching:
+            params["like"] = f"%{q}%"
 
         # determine ordering safely (allow only certain fields)
-        allowed_sort_fields = {"created_at": Chat.created_at, "id": Chat.id}
-        sort_col = allowed_sort_fields.get(sort_by, Chat.created_at)
-        if sort_order.lower() == "desc":
-            order_clause = sort_col.desc()
-        else:
-            order_clause = sort_col.asc()
+        if sort_by not in _CONVERSATION_SORT_FIELDS:
+            sort_by = "created_at"
+        descending = sort_order.lower() == "desc"
 
-        total = base_query.count()
+        total = db.execute(_CONVERSATION_COUNT[searching], params).scalar_one()
 
         # pagination
         page = max(page, 1)
@@ -266,7 +266,12 @@ def get_conversation_between_users(
         offset = (page - 1) * per_page
 
         messages = (
-            base_query.order_by(order_clause).offset(offset).limit(per_page).all()
+            db.execute(
+                _CONVERSATION_PAGE[(sort_by, descending, searching)],
+                {**params, "offset": offset, "limit": per_page},
+            )
+            .scalars()
+            .all()
         )
 
         # build serialized list matching ChatOut schema
@@ -307,5 +312,3 @@ def get_conversation_between_users(
             "next_page": next_page,
             "prev_page": prev_page,
         }
-    finally:
-        db.close()
@@ -63,7 +63,9 @@ def _to_filelike(obj: Any):
     return obj, None
 
 
-def upload_image(file: Any) -> Dict[str, Optional[str]]:
+def upload_image(
+    file: Any, public_id: Optional[str] = None, timeout: Optional[float] = None
+) -> Dict[str, Optional[str]]:
     """Upload an image file to Cloudinary and return a dict with url and public_id.
 
     The `file` parameter may be:
@@ -71,6 +73,10 @@ def upload_image(file: Any) -> Dict[str, Optional[str]]:
     - bytes
     - a file-like object with .read()
     - a Starlette/FastAPI UploadFile (has .file and .filename)
+
+    `public_id` stores the image under a fixed name (overwriting any previous
+    upload with that id) instead of a random one. `timeout` bounds the HTTP
+    request in seconds (the SDK default is no limit).
     """
     try:
         file_obj, filename = _to_filelike(file)
@@ -79,7 +85,10 @@ def upload_image(file: Any) -> Dict[str, Optional[str]]:
         if cloudinary_uploader is None:
             raise RuntimeError("cloudinary.uploader is not available; install 'cloudinary' package")
         # use resource_type='image' explicitly
-        result = cloudinary_uploader.upload(file_obj, resource_type="image")
+        options = {"public_id": public_id, "overwrite": True} if public_id else {}
+        if timeout:
+            options["timeout"] = timeout
+        result = cloudinary_uploader.upload(file_obj, resource_type="image", **options)
         return {
             "url": result.get("secure_url"),
             "public_id": result.get("public_id"),
@@ -89,7 +98,7 @@ def upload_image(file: Any) -> Dict[str, Optional[str]]:
         return {"url": None, "public_id": None}
 
 
-def delete_image(public_id: Optional[str]) -> bool:
+def delete_image(public_id: Optional[str], timeout: Optional[float] = None) -> bool:
     """Delete an image from Cloudinary by its public ID. Returns True on success."""
     if not public_id:
         logger.debug("delete_image called with empty public_id")
@@ -97,7 +106,8 @@ def delete_image(public_id: Optional[str]) -> bool:
     try:
         if cloudinary_uploader is None:
             raise RuntimeError("cloudinary.uploader is not available; cannot delete image")
-        result = cloudinary_uploader.destroy(public_id)
+        options = {"timeout": timeout} if timeout else {}
+        result = cloudinary_uploader.destroy(public_id, **options)
         return result.get("result") == "ok"
     except Exception:
         logger.exception("Error deleting image from Cloudinary")
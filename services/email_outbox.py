@@ -0,0 +1,289 @@
+"""Persistent email outbox drained by a background worker.
+
+Services add an `email_outbox` row in the same transaction as the change
+that triggers the email and call `worker.wake()` after committing, so
+requests such as registration return without waiting on SMTP. The worker
+keeps one SMTP session open per thread (EMAIL_OUTBOX_WORKERS) and sends
+messages back to back over it, instead of probing, connecting, negotiating
+TLS and logging in for every message.
+
+Emails that carry expiring links (welcome/activation) are queued as a
+template name plus parameters with `enqueue_template` and rendered when they
+are sent, so retries and a backlog never deliver an expired token.
+
+Failed messages are retried with exponential backoff (EMAIL_RETRY_BASE_SECONDS,
+doubling up to an hour) and marked `failed` after EMAIL_MAX_ATTEMPTS. When
+SMTP fails and SENDGRID_API_KEY is set, the SendGrid API is tried before
+scheduling a retry. Claimed rows are leased for EMAIL_OUTBOX_LEASE_SECONDS,
+so messages held by a crashed process are picked up again after a restart.
+
+For local development and tests point SMTP_HOST/SMTP_PORT at
+`python scripts/smtp_sink.py` with SMTP_STARTTLS=false.
+"""
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import traceback
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from entities.email_outbox import EmailOutbox
+from services import mailer_service
+
+WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "1"))
+POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH", "50"))
+LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = 3600
+
+_DUE_IDS = (
+    select(EmailOutbox.id)
+    .where(EmailOutbox.status == "pending", EmailOutbox.available_at <= bindparam("now"))
+    .order_by(EmailOutbox.available_at, EmailOutbox.id)
+    .limit(bindparam("batch"))
+    .scalar_subquery()
+)
+# take the lease on a batch of due messages; the repeated availability check
+# makes concurrent workers skip rows another one claimed first
+_CLAIM = (
+    update(EmailOutbox)
+    .where(
+        EmailOutbox.id.in_(_DUE_IDS),
+        EmailOutbox.status == "pending",
+        EmailOutbox.available_at <= bindparam("now"),
+    )
+    .values(available_at=bindparam("lease_until"), attempts=EmailOutbox.attempts + 1)
+    .returning(
+        EmailOutbox.id,
+        EmailOutbox.recipient,
+        EmailOutbox.subject,
+        EmailOutbox.body,
+        EmailOutbox.html,
+        EmailOutbox.template,
+        EmailOutbox.params,
+        EmailOutbox.attempts,
+    )
+    .execution_options(synchronize_session=False)
+)
+_MARK_SENT = (
+    update(EmailOutbox)
+    .where(EmailOutbox.id.in_(bindparam("ids", expanding=True)))
+    .values(status="sent", sent_at=func.now(), last_error=None)
+    .execution_options(synchronize_session=False)
+)
+_MARK_FAILED = (
+    update(EmailOutbox)
+    .where(EmailOutbox.id == bindparam("message_id"))
+    .values(
+        status=bindparam("new_status"),
+        available_at=bindparam("retry_at"),
+        last_error=bindparam("error"),
+    )
+    .execution_options(synchronize_session=False)
+)
+_STATUS_COUNTS = select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+
+
+def enqueue(
+    db: Session, subject: str, recipient: str, body: str, html: Optional[str] = None
+) -> None:
+    """Add an email to the outbox in `db`'s transaction (the caller commits)."""
+    db.add(EmailOutbox(recipient=recipient, subject=subject, body=body, html=html))
+
+
+def enqueue_template(db: Session, template: str, recipient: str, **params) -> None:
+    """Add a templated email (a mailer_service.EMAIL_TEMPLATES key) to the
+    outbox in `db`'s transaction; it is rendered when it is sent."""
+    db.add(EmailOutbox(**template_message(template, recipient, **params)))
+
+
+def template_message(template: str, recipient: str, **params) -> dict:
+    """A templated message for `enqueue_many`."""
+    if template not in mailer_service.EMAIL_TEMPLATES:
+        raise ValueError(f"Unknown email template: {template!r}")
+    return {"recipient": recipient, "template": template, "params": json.dumps(params)}
+
+
+def enqueue_many(db: Session, messages: Iterable[dict]) -> int:
+    """Insert many emails with one batched INSERT; each message has the
+    `enqueue` keyword arguments or comes from `template_message`. The caller
+    commits."""
+    now = time.time()
+    rows = [
+        {
+            "subject": None,
+            "body": None,
+            "html": None,
+            "template": None,
+            "params": None,
+            **message,
+            "status": "pending",
+            "attempts": 0,
+            "available_at": now,
+        }
+        for message in messages
+    ]
+    if rows:
+        db.execute(insert(EmailOutbox), rows)
+    return len(rows)
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # spread retries of a failed burst so they do not all land together
+    return delay * random.uniform(0.8, 1.2)
+
+
+class EmailOutboxWorker:
+    def __init__(self, workers: int, poll_seconds: float, batch_size: int):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.sent = 0
+        self.sent_via_fallback = 0
+        self.retried = 0
+        self.failed = 0
+        self.smtp_connects = 0
+
+    def start(self):
+        """Start the worker threads (idempotent); they drain leftovers right away."""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"email-outbox-{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        """Signal that new messages were committed."""
+        self.start()
+        self._wakeup.set()
+
+    def drain_once(self, connection: mailer_service.SmtpConnection) -> int:
+        """Claim and deliver one batch; returns the number of messages claimed."""
+        now = time.time()
+        with SessionLocal() as db:
+            claimed = db.execute(
+                _CLAIM,
+                {"now": now, "batch": self.batch_size, "lease_until": now + LEASE_SECONDS},
+            ).all()
+            db.commit()
+        if not claimed:
+            return 0
+
+        sent_ids, failures = [], []
+        for message in claimed:
+            error, permanent = self._deliver(connection, message)
+            if error is None:
+                sent_ids.append(message.id)
+            else:
+                failures.append((message, error, permanent))
+
+        with SessionLocal() as db:
+            if sent_ids:
+                db.execute(_MARK_SENT, {"ids": sent_ids})
+            for message, error, permanent in failures:
+                final = permanent or message.attempts >= MAX_ATTEMPTS
+                db.execute(
+                    _MARK_FAILED,
+                    {
+                        "message_id": message.id,
+                        "new_status": "failed" if final else "pending",
+                        "retry_at": time.time() + retry_delay(message.attempts),
+                        "error": error[:500],
+                    },
+                )
+                with self._lock:
+                    if final:
+                        self.failed += 1
+                    else:
+                        self.retried += 1
+            db.commit()
+        return len(claimed)
+
+    def stats(self) -> dict:
+        with SessionLocal() as db:
+            counts = dict(db.execute(_STATUS_COUNTS).all())
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": sum(t.is_alive() for t in self._threads),
+                "pending": counts.get("pending", 0),
+                "sent_total": counts.get("sent", 0),
+                "failed_total": counts.get("failed", 0),
+                "sent": self.sent,
+                "sent_via_fallback": self.sent_via_fallback,
+                "retried": self.retried,
+                "failed": self.failed,
+                "smtp_connects": self.smtp_connects,
+            }
+
+    # -- internals ---------------------------------------------------------
+    def _deliver(self, connection, message) -> Tuple[Optional[str], bool]:
+        """Send one message; returns (error text or None, whether retrying is pointless)."""
+        if "@" not in (message.recipient or ""):
+            return f"invalid recipient address: {message.recipient!r}", True
+        subject, body, html = message.subject, message.body, message.html
+        if message.template:
+            try:
+                rendered = mailer_service.render_email(
+                    message.template, message.recipient, json.loads(message.params or "{}")
+                )
+            except Exception as e:
+                return f"cannot render template {message.template!r}: {type(e).__name__}: {e}", True
+            subject, body, html = rendered["subject"], rendered["body"], rendered["html"]
+        connects = connection.connects
+        try:
+            connection.send(subject, message.recipient, body, html)
+            with self._lock:
+                self.sent += 1
+            return None, False
+        except smtplib.SMTPRecipientsRefused as e:
+            # the server rejected the address; the session itself is fine
+            return f"recipient refused: {e.recipients}", True
+        except Exception as e:
+            connection.close()
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self.smtp_connects += connection.connects - connects
+        try:
+            if mailer_service.send_via_sendgrid_fallback(subject, message.recipient, body, html):
+                with self._lock:
+                    self.sent_via_fallback += 1
+                return None, False
+        except Exception as e:
+            error = f"{error}; sendgrid: {type(e).__name__}: {e}"
+        print(f"[email_outbox] delivery of message {message.id} failed: {error}")
+        return error, False
+
+    def _run(self):
+        connection = mailer_service.SmtpConnection()
+        while True:
+            try:
+                if self.drain_once(connection):
+                    continue
+            except Exception:
+                traceback.print_exc()
+            # the SMTP session stays open for the next burst; SmtpConnection
+            # replaces it once it has been idle for SMTP_IDLE_SECONDS
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+
+worker = EmailOutboxWorker(workers=WORKERS, poll_seconds=POLL_SECONDS, batch_size=BATCH_SIZE)
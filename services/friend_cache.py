@@ -0,0 +1,178 @@
+"""Process-level friendship adjacency cache.
+
+Maps user id -> sorted `array('q')` of accepted friend ids. Entries are filled
+lazily by `friend_service`, patched when a friendship is accepted and
+dropped when one is removed, so friend lookups skip the `friends` table scan. Total size is
+capped (FRIEND_CACHE_MAX_BYTES) with least-recently-used eviction.
+
+The cache is per process; with several workers each keeps its own copy, and
+entries are also dropped after FRIEND_CACHE_TTL seconds to bound staleness.
+"""
+import bisect
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+# rough per-entry overhead (dict slot, array header, tuple) on top of the ids
+_ENTRY_OVERHEAD_BYTES = 128
+
+
+def intersect_sorted(a, b) -> array:
+    """Intersection of two ascending, duplicate-free id sequences.
+
+    Linear merge when the sizes are comparable; when one side is much
+    smaller, binary-search its ids in the larger one instead.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    out = array("q")
+    if not a:
+        return out
+    if len(a) * max(1, len(b).bit_length()) < len(a) + len(b):
+        lo = 0
+        for x in a:
+            lo = bisect.bisect_left(b, x, lo)
+            if lo == len(b):
+                break
+            if b[lo] == x:
+                out.append(x)
+        return out
+    i = j = 0
+    na, nb = len(a), len(b)
+    while i < na and j < nb:
+        x, y = a[i], b[j]
+        if x == y:
+            out.append(x)
+            i += 1
+            j += 1
+        elif x < y:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+class FriendAdjacencyCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float = 0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user_id -> (loaded_at, sorted array of friend ids)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped on every edge change; a load that raced a change is not cached
+        self._mutations = 0
+
+    @staticmethod
+    def _size(ids: array) -> int:
+        return _ENTRY_OVERHEAD_BYTES + ids.itemsize * len(ids)
+
+    def get(self, user_id: int) -> Optional[array]:
+        """Return the cached sorted friend ids for `user_id`, or None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self._drop(user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def get_or_load(self, user_id: int, loader: Callable[[], Iterable[int]]) -> array:
+        """Return cached friend ids, calling `loader()` to fill the entry on a miss."""
+        ids = self.get(user_id)
+        if ids is None:
+            mutations = self._mutations
+            ids = array("q", sorted(set(loader())))
+            self.put(user_id, ids, if_unchanged_since=mutations)
+        return ids
+
+    @property
+    def mutations(self) -> int:
+        """Edge-change counter; pass to put(if_unchanged_since=...) around a load."""
+        return self._mutations
+
+    def put(self, user_id: int, ids: array, if_unchanged_since: Optional[int] = None):
+        with self._lock:
+            if if_unchanged_since is not None and self._mutations != if_unchanged_since:
+                return
+            if user_id in self._entries:
+                self._drop(user_id)
+            self._entries[user_id] = (time.monotonic(), ids)
+            self._bytes += self._size(ids)
+            self._evict()
+
+    def add_edge(self, a: int, b: int):
+        """Record an accepted friendship; only already-cached users are patched."""
+        with self._lock:
+            self._mutations += 1
+            self._patch(a, b)
+            self._patch(b, a)
+            self._evict()
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            self._mutations += 1
+            for uid in user_ids:
+                self._drop(uid)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    # -- internals (caller holds the lock) --------------------------------
+    def _expired(self, entry: tuple) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() - entry[0] > self.ttl_seconds
+
+    def _patch(self, user_id: int, friend_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        loaded_at, ids = entry
+        i = bisect.bisect_left(ids, friend_id)
+        if i < len(ids) and ids[i] == friend_id:
+            return
+        # copy-on-write: arrays handed out by get() are never mutated under a reader
+        ids = array("q", ids)
+        ids.insert(i, friend_id)
+        self._bytes += ids.itemsize
+        self._entries[user_id] = (loaded_at, ids)
+
+    def _drop(self, user_id: int):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[1])
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, ids) = self._entries.popitem(last=False)
+            self._bytes -= self._size(ids)
+            self.evictions += 1
+
+
+adjacency = FriendAdjacencyCache(
+    max_bytes=int(os.getenv("FRIEND_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("FRIEND_CACHE_TTL", "300")),
+)
@@ -0,0 +1,110 @@
+"""Coalesced real-time friend-request events.
+
+friend_service records an event for both users of a friendship change
+(request sent, accepted, declined, cancelled, friend removed). Events for
+online users are buffered and flushed every FRIEND_EVENTS_COALESCE_MS by a
+background thread, so a burst of requests to one user arrives as a single
+websocket frame:
+
+    {"type": "friend_events",
+     "events": [{"event": "request_sent", "user_id": 7, "by": 7}, ...],
+     "pending_requests": 3}
+
+`user_id` is the other user of the friendship and `by` the user who acted.
+`pending_requests` is the recipient's current number of incoming requests,
+counted for all flushed users in one grouped query.
+"""
+import os
+import threading
+import time
+import traceback
+from typing import Dict, Iterable, List
+
+from sqlalchemy import bindparam, false, func, select
+
+from database import SessionLocal
+from entities.friend import Friend
+from services import ws_service
+
+COALESCE_SECONDS = float(os.getenv("FRIEND_EVENTS_COALESCE_MS", "200")) / 1000
+
+# incoming pending requests per recipient (ix_friends_pending_recipient)
+_PENDING_COUNTS = (
+    select(Friend.friend_id, func.count())
+    .where(
+        Friend.friend_id.in_(bindparam("user_ids", expanding=True)),
+        Friend.is_active == false(),
+        Friend.is_accepted == false(),
+    )
+    .group_by(Friend.friend_id)
+)
+
+
+class FriendEventNotifier:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # user_id -> buffered events, in order
+        self._buffer: Dict[int, List[dict]] = {}
+        self._thread = None
+
+    def publish(self, event: str, actor_id: int, other_ids: Iterable[int]):
+        """Queue `event` for the actor and each counterpart in `other_ids`."""
+        manager = ws_service.manager
+        with self._lock:
+            for other_id in other_ids:
+                for user_id, counterpart in ((other_id, actor_id), (actor_id, other_id)):
+                    # offline users poll on reconnect; nothing to buffer for them
+                    if user_id not in manager.connections:
+                        continue
+                    self._buffer.setdefault(user_id, []).append(
+                        {"event": event, "user_id": counterpart, "by": actor_id}
+                    )
+            if self._buffer:
+                self._ensure_thread()
+
+    def flush(self) -> int:
+        """Send one frame per buffered user; returns the number of frames sent."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+        if not buffer:
+            return 0
+        user_ids = list(buffer)
+        with SessionLocal() as db:
+            counts = dict(db.execute(_PENDING_COUNTS, {"user_ids": user_ids}).all())
+        manager = ws_service.manager
+        for user_id, events in buffer.items():
+            manager.send_personal_sync(
+                user_id,
+                {
+                    "type": "friend_events",
+                    "events": events,
+                    "pending_requests": counts.get(user_id, 0),
+                },
+            )
+        return len(buffer)
+
+    # -- internals ---------------------------------------------------------
+    def _ensure_thread(self):
+        # caller holds the lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="friend-events", daemon=True
+            )
+            self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # collect the rest of the burst before sending
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+
+notifier = FriendEventNotifier(interval=COALESCE_SECONDS)
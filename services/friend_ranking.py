@@ -0,0 +1,243 @@
+"""Personalized friend-suggestion ranking.
+
+Scores candidates by spreading one unit of mass from the user over the
+friendship graph for up to FRIEND_RANK_DEPTH hops. Every node splits its mass
+evenly between its friends, so a mutual friend with thousands of friends
+contributes far less than a close one (at two hops this is the
+resource-allocation index). Each hop keeps only 1 - FRIEND_RANK_RESTART of
+the mass, the restart probability of a random walk with restart, so closer
+candidates outweigh distant ones.
+
+Nodes with more than FRIEND_RANK_FANOUT friends pass their mass to a random
+sample of them, the frontier is pruned to the heaviest FRIEND_RANK_FRONTIER
+nodes, and the walk stops early once FRIEND_RANK_BUDGET_MS is spent, so hub
+users cost a bounded amount of work.
+
+Rankings are computed by a background worker and cached per user. A
+friendship change marks the cached rankings of both users and their friends
+stale; stale rankings are still served while a refresh is queued.
+"""
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.friend_cache import adjacency, intersect_sorted
+
+RANK_DEPTH = int(os.getenv("FRIEND_RANK_DEPTH", "3"))
+RANK_RESTART = float(os.getenv("FRIEND_RANK_RESTART", "0.3"))
+RANK_FANOUT = int(os.getenv("FRIEND_RANK_FANOUT", "200"))
+RANK_FRONTIER = int(os.getenv("FRIEND_RANK_FRONTIER", "2000"))
+RANK_BUDGET_SECONDS = float(os.getenv("FRIEND_RANK_BUDGET_MS", "50")) / 1000
+RANK_LIMIT = int(os.getenv("FRIEND_RANK_LIMIT", "200"))
+# frontier nodes whose friend lists are loaded per query
+LOAD_CHUNK = 256
+
+# (candidate_id, score, mutual_count), best first
+Ranking = List[Tuple[int, float, int]]
+
+
+def rank_candidates(
+    user_id: int,
+    neighbors: Callable[[List[int]], Dict[int, Iterable[int]]],
+    depth: int = RANK_DEPTH,
+    restart: float = RANK_RESTART,
+    fanout: int = RANK_FANOUT,
+    frontier_max: int = RANK_FRONTIER,
+    budget_seconds: float = RANK_BUDGET_SECONDS,
+    limit: int = RANK_LIMIT,
+) -> Ranking:
+    """Rank non-friends of `user_id` by degree-normalized multi-hop proximity.
+
+    `neighbors(ids)` returns {id: friend ids} for a batch of users. Mutual
+    friend counts are exact; only the scores come from the sampled walk.
+    """
+    deadline = time.monotonic() + budget_seconds
+    friends = set(neighbors([user_id])[user_id])
+    excluded = friends | {user_id}
+    scores: Dict[int, float] = defaultdict(float)
+
+    frontier = {user_id: 1.0}
+    for hop in range(1, depth + 1):
+        spread: Dict[int, float] = defaultdict(float)
+        out_of_time = False
+        # heaviest nodes first, loaded in chunks so the budget is checked
+        # between neighbour loads and a cut-off walk keeps the strongest paths
+        nodes = sorted(frontier, key=frontier.get, reverse=True)
+        for start in range(0, len(nodes), LOAD_CHUNK):
+            chunk = nodes[start : start + LOAD_CHUNK]
+            adjacent = {user_id: friends} if hop == 1 else neighbors(chunk)
+            for node in chunk:
+                ids = adjacent.get(node) or ()
+                if not ids:
+                    continue
+                if len(ids) > fanout:
+                    ids = random.sample(list(ids), fanout)
+                share = frontier[node] * (1 - restart) / len(ids)
+                for other in ids:
+                    spread[other] += share
+            if time.monotonic() > deadline:
+                out_of_time = True
+                break
+        if hop > 1:
+            for node, mass in spread.items():
+                if node not in excluded:
+                    scores[node] += mass
+        if out_of_time or hop == depth:
+            break
+        # keep only the heaviest nodes for the next hop
+        if len(spread) > frontier_max:
+            heaviest = sorted(spread.items(), key=lambda kv: kv[1], reverse=True)
+            spread = dict(heaviest[:frontier_max])
+        frontier = {node: mass for node, mass in spread.items() if node != user_id}
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+    # exact mutual-friend counts for the returned candidates only: the walk
+    # samples hubs' friends, so counting along it would undercount
+    sorted_friends = sorted(friends)
+    mutual: Dict[int, int] = {}
+    for start in range(0, len(ranked), LOAD_CHUNK):
+        chunk = [node for node, _ in ranked[start : start + LOAD_CHUNK]]
+        adjacent = neighbors(chunk)
+        for node in chunk:
+            ids = sorted(adjacent.get(node) or ())
+            mutual[node] = len(intersect_sorted(sorted_friends, ids))
+    return [(node, score, mutual[node]) for node, score in ranked]
+
+
+class FriendRankingEngine:
+    """Per-user ranking cache with a background refresh worker."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user_id -> (computed_at, stale, ranking)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._queued = set()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.compute_seconds = 0.0
+        # bumped on every invalidation; a compute that raced one is stored stale
+        self._generation = 0
+
+    def get(self, user_id: int) -> Optional[Ranking]:
+        """Return the cached ranking (possibly stale), queueing a refresh when needed.
+
+        Returns None when nothing is cached yet; callers fall back to the
+        materialized mutual-count suggestions meanwhile.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(user_id)
+            refresh = entry is None or entry[1] or self._expired(entry)
+        if refresh:
+            self.request(user_id)
+        return None if entry is None else entry[2]
+
+    def request(self, user_id: int):
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+            self._ensure_thread()
+        self._queue.put(user_id)
+
+    def invalidate_edge(self, a: int, b: int):
+        """Mark rankings that depend on the a--b friendship stale."""
+        affected = {a, b}
+        for uid in (a, b):
+            # only friends already in the adjacency cache; no DB work here
+            affected.update(adjacency.get(uid) or ())
+        refresh = []
+        with self._lock:
+            self._generation += 1
+            for uid in affected:
+                entry = self._entries.get(uid)
+                if entry is not None:
+                    self._entries[uid] = (entry[0], True, entry[2])
+                    if uid in (a, b):
+                        refresh.append(uid)
+        for uid in refresh:
+            self.request(uid)
+
+    def compute(self, user_id: int) -> Ranking:
+        """Compute and cache the ranking for `user_id` on the calling thread."""
+        # imported here: friend_service imports this module
+        from database import SessionLocal
+        from services import friend_service
+
+        started = time.monotonic()
+        generation = self._generation
+        with SessionLocal() as db:
+            result = rank_candidates(
+                user_id, lambda ids: friend_service._friend_ids_many(db, ids)
+            )
+        with self._lock:
+            stale = generation != self._generation
+            self._entries[user_id] = (time.monotonic(), stale, result)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.computed += 1
+            self.compute_seconds += time.monotonic() - started
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "queued": len(self._queued),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "computed": self.computed,
+                "avg_compute_ms": round(self.compute_seconds * 1000 / self.computed, 2)
+                if self.computed
+                else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+    def _expired(self, entry: tuple) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() - entry[0] > self.ttl_seconds
+
+    def _ensure_thread(self):
+        # caller holds the lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="friend-ranking", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            user_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(user_id)
+            try:
+                self.compute(user_id)
+            except Exception:
+                traceback.print_exc()
+
+
+ranking = FriendRankingEngine(
+    max_entries=int(os.getenv("FRIEND_RANK_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("FRIEND_RANK_TTL", "600")),
+)
@@ -1,10 +1,470 @@
+import bisect
 import os
+import random
+from array import array
+from collections import Counter
 from typing import List, Dict, Optional
-from sqlalchemy import or_, func
+from sqlalchemy import and_, bindparam, delete, false, or_, func, select, text, true, union, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 
 from sqlalchemy.orm import Session
-from entities.friend import Friend
+from entities.friend import Friend, FriendSuggestion
 from entities.user import User
+from services.friend_cache import adjacency, intersect_sorted
+from services import search_service
+from services.friend_events import notifier
+from services.friend_ranking import ranking
+
+# max requests handled by one bulk_friend_requests call
+FRIEND_BULK_MAX = int(os.getenv("FRIEND_BULK_MAX", "100"))
+# max profiles per mutual_counts call
+MUTUAL_BATCH_MAX = int(os.getenv("FRIEND_MUTUAL_BATCH_MAX", "200"))
+
+
+# Hot-path statements are built once at import time with bound parameters, so
+# each call only supplies values and SQLAlchemy reuses the cached compiled SQL.
+# friends.(low_id, high_id) stores each pair in canonical order, so a lookup
+# between two users is one probe on ix_friends_pair / uq_friends_live_pair
+_PAIR_WHERE = and_(Friend.low_id == bindparam("low"), Friend.high_id == bindparam("high"))
+# any friendship row between the pair, newest first
+_FRIENDSHIP_BETWEEN = select(Friend).where(_PAIR_WHERE).order_by(Friend.id.desc()).limit(1)
+# the not-removed friendship row between the pair (unique per pair)
+_LIVE_FRIENDSHIP_BETWEEN = (
+    select(Friend).where(_PAIR_WHERE, Friend.is_active == false()).limit(1)
+)
+# pending request sent by `requester` to the other user of the pair
+_PENDING_REQUEST = (
+    select(Friend)
+    .where(
+        _PAIR_WHERE,
+        Friend.is_active == false(),
+        Friend.is_accepted == false(),
+        Friend.user_id == bindparam("requester"),
+    )
+    .limit(1)
+)
+
+
+# bulk request updates: one UPDATE per action over pending, live rows.
+# accept/decline act on requests sent *to* user_id, cancel on requests sent *by* it;
+# each returns the counterpart ids that were actually updated ("user_id" is
+# reserved for the SET clause in UPDATE statements, hence "actor_id")
+_BULK_PENDING = (Friend.is_active == false(), Friend.is_accepted == false())
+_BULK_REQUEST_UPDATES = {
+    "accept": (
+        update(Friend)
+        .where(
+            Friend.friend_id == bindparam("actor_id"),
+            Friend.user_id.in_(bindparam("ids", expanding=True)),
+            *_BULK_PENDING,
+        )
+        .values(is_accepted=True)
+        .returning(Friend.user_id)
+    ),
+    "decline": (
+        update(Friend)
+        .where(
+            Friend.friend_id == bindparam("actor_id"),
+            Friend.user_id.in_(bindparam("ids", expanding=True)),
+            *_BULK_PENDING,
+        )
+        .values(is_active=True)
+        .returning(Friend.user_id)
+    ),
+    "cancel": (
+        update(Friend)
+        .where(
+            Friend.user_id == bindparam("actor_id"),
+            Friend.friend_id.in_(bindparam("ids", expanding=True)),
+            *_BULK_PENDING,
+        )
+        .values(is_active=True)
+        .returning(Friend.friend_id)
+    ),
+}
+_BULK_STATUS = {"accept": "accepted", "decline": "declined", "cancel": "cancelled"}
+
+
+def _pair(a: int, b: int) -> dict:
+    return {"low": min(a, b), "high": max(a, b)}
+
+
+# both endpoints of every accepted friendship touching `user_id`
+_ACCEPTED_EDGES = select(Friend.user_id, Friend.friend_id).where(
+    or_(Friend.user_id == bindparam("user_id"), Friend.friend_id == bindparam("user_id")),
+    Friend.is_accepted == true(),
+    Friend.is_active == false(),
+)
+
+
+# friend ids of `user_id` from both friendship directions, resolved in SQL so
+# the listing never materializes the id set in Python
+_FRIEND_IDS_UNION = union(
+    select(Friend.friend_id.label("friend_id")).where(
+        Friend.user_id == bindparam("user_id"),
+        Friend.is_accepted == true(),
+        Friend.is_active == false(),
+    ),
+    select(Friend.user_id.label("friend_id")).where(
+        Friend.friend_id == bindparam("user_id"),
+        Friend.is_accepted == true(),
+        Friend.is_active == false(),
+    ),
+).subquery("friend_ids")
+_FRIEND_COLUMNS = (
+    User.id,
+    User.username,
+    User.full_name,
+    User.avatar_url,
+    User.email,
+    User.phone_number,
+    User.date_of_birth,
+    User.gender,
+    User.created_at,
+)
+
+
+def _friends_page_stmt(match: Optional[str], with_total: bool):
+    columns = _FRIEND_COLUMNS + ((func.count().over().label("total"),) if with_total else ())
+    stmt = select(*columns).join(_FRIEND_IDS_UNION, _FRIEND_IDS_UNION.c.friend_id == User.id)
+    if match:
+        stmt = stmt.where(search_service.USER_MATCH[match])
+    return (
+        stmt.order_by(User.created_at.desc(), User.id.desc())
+        .offset(bindparam("offset"))
+        .limit(bindparam("limit"))
+    )
+
+
+# (search match kind or None, with_total) -> page statement
+_FRIENDS_PAGE = {
+    (match, with_total): _friends_page_stmt(match, with_total)
+    for match in (None, *search_service.USER_MATCH)
+    for with_total in (False, True)
+}
+# only used when a page past the end returns no row to carry the window total
+_FRIENDS_COUNT = {
+    None: select(func.count()).select_from(_FRIEND_IDS_UNION),
+    **{
+        match: select(func.count())
+        .select_from(User)
+        .join(_FRIEND_IDS_UNION, _FRIEND_IDS_UNION.c.friend_id == User.id)
+        .where(clause)
+        for match, clause in search_service.USER_MATCH.items()
+    },
+}
+
+
+# users that are neither `user_id` nor an accepted friend of it; each NOT
+# EXISTS is one probe on the accepted-friendship partial index for its direction
+_NOT_FRIEND = and_(
+    User.id != bindparam("user_id"),
+    ~select(Friend.id)
+    .where(
+        Friend.user_id == bindparam("user_id"),
+        Friend.friend_id == User.id,
+        Friend.is_accepted == true(),
+        Friend.is_active == false(),
+    )
+    .exists(),
+    ~select(Friend.id)
+    .where(
+        Friend.user_id == User.id,
+        Friend.friend_id == bindparam("user_id"),
+        Friend.is_accepted == true(),
+        Friend.is_active == false(),
+    )
+    .exists(),
+)
+# keyset pages, newest first; keyed by whether a `before_id` cursor is given
+_UNFRIENDED_PAGE = {
+    False: select(User).where(_NOT_FRIEND).order_by(User.id.desc()).limit(bindparam("limit")),
+    True: select(User)
+    .where(_NOT_FRIEND, User.id < bindparam("before_id"))
+    .order_by(User.id.desc())
+    .limit(bindparam("limit")),
+}
+# random sample: range scan on ix_users_random_key from a random start;
+# keyed by whether this is the wrap-around part below the start
+_UNFRIENDED_SAMPLE = {
+    False: select(User)
+    .where(_NOT_FRIEND, User.random_key >= bindparam("start"))
+    .order_by(User.random_key)
+    .limit(bindparam("limit")),
+    True: select(User)
+    .where(_NOT_FRIEND, User.random_key < bindparam("start"))
+    .order_by(User.random_key)
+    .limit(bindparam("limit")),
+}
+
+
+def _load_friend_ids(db: Session, user_id: int) -> set:
+    return {
+        b if a == user_id else a
+        for a, b in db.execute(_ACCEPTED_EDGES, {"user_id": user_id}).all()
+    }
+
+
+def _friend_ids(db: Session, user_id: int):
+    """Return the sorted ids of everyone `user_id` has an accepted friendship with.
+
+    Served from the process-level adjacency cache; the returned array is
+    shared and must not be modified.
+    """
+    return adjacency.get_or_load(user_id, lambda: _load_friend_ids(db, user_id))
+
+
+def _contains(sorted_ids, value: int) -> bool:
+    i = bisect.bisect_left(sorted_ids, value)
+    return i < len(sorted_ids) and sorted_ids[i] == value
+
+
+# accepted friendships touching any of :user_ids (batch cache fill)
+_ACCEPTED_EDGES_MANY = select(Friend.user_id, Friend.friend_id).where(
+    or_(
+        Friend.user_id.in_(bindparam("user_ids", expanding=True)),
+        Friend.friend_id.in_(bindparam("user_ids", expanding=True)),
+    ),
+    Friend.is_accepted == true(),
+    Friend.is_active == false(),
+)
+
+
+def _load_friend_ids_many(db: Session, user_ids) -> Dict[int, set]:
+    loaded = {uid: set() for uid in user_ids}
+    for a, b in db.execute(_ACCEPTED_EDGES_MANY, {"user_ids": list(loaded)}).all():
+        if a in loaded:
+            loaded[a].add(b)
+        if b in loaded:
+            loaded[b].add(a)
+    return loaded
+
+
+def _friend_ids_many(db: Session, user_ids) -> Dict[int, array]:
+    """Sorted friend ids for several users; cache misses are loaded in one query."""
+    result = {}
+    missing = []
+    for uid in user_ids:
+        ids = adjacency.get(uid)
+        if ids is None:
+            missing.append(uid)
+        else:
+            result[uid] = ids
+    if missing:
+        mutations = adjacency.mutations
+        for uid, friends in _load_friend_ids_many(db, missing).items():
+            ids = array("q", sorted(friends))
+            adjacency.put(uid, ids, if_unchanged_since=mutations)
+            result[uid] = ids
+    return result
+
+
+# -- materialized friend suggestions ------------------------------------------
+_SUGGESTIONS = FriendSuggestion.__table__
+_SUGGESTIONS_PAGE = (
+    select(
+        User.id,
+        User.username,
+        User.full_name,
+        User.phone_number,
+        User.date_of_birth,
+        User.gender,
+        User.avatar_url,
+        FriendSuggestion.mutual_count,
+        func.count().over().label("total"),
+    )
+    .join(User, User.id == FriendSuggestion.candidate_id)
+    .where(FriendSuggestion.user_id == bindparam("user_id"))
+    .order_by(FriendSuggestion.mutual_count.desc(), FriendSuggestion.candidate_id)
+    .offset(bindparam("offset"))
+    .limit(bindparam("limit"))
+)
+_DECREMENT_SUGGESTION = (
+    update(_SUGGESTIONS)
+    .where(
+        _SUGGESTIONS.c.user_id == bindparam("b_user"),
+        _SUGGESTIONS.c.candidate_id == bindparam("b_candidate"),
+    )
+    .values(mutual_count=_SUGGESTIONS.c.mutual_count - 1, updated_at=func.now())
+)
+_INCREMENT_SUGGESTION = (
+    update(_SUGGESTIONS)
+    .where(
+        _SUGGESTIONS.c.user_id == bindparam("b_user"),
+        _SUGGESTIONS.c.candidate_id == bindparam("b_candidate"),
+    )
+    .values(
+        mutual_count=_SUGGESTIONS.c.mutual_count + bindparam("b_count"),
+        updated_at=func.now(),
+    )
+)
+
+# Full rebuild: (user, candidate, mutual_count) for every friend-of-friend pair
+# that is not already a friendship. The backfill migration carries a copy.
+REBUILD_SUGGESTIONS_SQL = """
+INSERT INTO friend_suggestions (user_id, candidate_id, mutual_count)
+WITH edges AS (
+    SELECT user_id AS u, friend_id AS v FROM friends
+    WHERE is_accepted = true AND is_active = false
+    UNION
+    SELECT friend_id AS u, user_id AS v FROM friends
+    WHERE is_accepted = true AND is_active = false
+)
+SELECT e1.u, e2.v, COUNT(DISTINCT e1.v)
+FROM edges e1
+JOIN edges e2 ON e2.u = e1.v
+WHERE e2.v <> e1.u
+  AND NOT EXISTS (SELECT 1 FROM edges e3 WHERE e3.u = e1.u AND e3.v = e2.v)
+GROUP BY e1.u, e2.v
+"""
+
+
+def rebuild_friend_suggestions(db: Session) -> None:
+    """Recompute the whole suggestions table from the friends table."""
+    db.execute(delete(_SUGGESTIONS))
+    db.execute(text(REBUILD_SUGGESTIONS_SQL))
+    db.commit()
+
+
+def _increment_suggestions(db: Session, pairs: list) -> None:
+    """Add one mutual friend per (user, candidate) occurrence in `pairs`."""
+    if not pairs:
+        return
+    # one row per pair: an upsert cannot touch the same row twice
+    rows = [
+        {"user_id": u, "candidate_id": c, "mutual_count": n}
+        for (u, c), n in Counter(pairs).items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(_SUGGESTIONS)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_SUGGESTIONS.c.user_id, _SUGGESTIONS.c.candidate_id],
+            set_={
+                "mutual_count": _SUGGESTIONS.c.mutual_count + stmt.excluded.mutual_count,
+                "updated_at": func.now(),
+            },
+        )
+        db.execute(stmt, rows)
+        return
+    # portable fallback: bump existing rows, insert the rest
+    for row in rows:
+        result = db.execute(
+            _INCREMENT_SUGGESTION,
+            {
+                "b_user": row["user_id"],
+                "b_candidate": row["candidate_id"],
+                "b_count": row["mutual_count"],
+            },
+        )
+        if not result.rowcount:
+            db.execute(_SUGGESTIONS.insert(), row)
+
+
+def _decrement_suggestions(db: Session, pairs: list) -> None:
+    if not pairs:
+        return
+    db.execute(
+        _DECREMENT_SUGGESTION, [{"b_user": u, "b_candidate": c} for u, c in pairs]
+    )
+    db.execute(
+        delete(_SUGGESTIONS).where(
+            _SUGGESTIONS.c.user_id.in_({u for u, _ in pairs}),
+            _SUGGESTIONS.c.mutual_count <= 0,
+        )
+    )
+
+
+def _refresh_suggestions_for_edge(db: Session, a: int, b: int, accepted: bool) -> None:
+    """Patch suggestions after the a--b friendship was accepted or removed.
+
+    Only the two-hop neighbourhood changes: each friend of b gains/loses b as a
+    mutual friend with a (and vice versa), and a/b themselves stop/start being
+    suggestions for each other. Runs after the friendship change is committed.
+
+    Neighbour sets are read from the database, not the per-process adjacency
+    cache: the counts are persistent, and the cache can miss edges changed
+    by other server processes.
+    """
+    friends_a = _load_friend_ids(db, a)
+    friends_b = _load_friend_ids(db, b)
+
+    pairs = []
+    for x in friends_b - friends_a - {a}:
+        pairs += [(a, x), (x, a)]
+    for y in friends_a - friends_b - {b}:
+        pairs += [(b, y), (y, b)]
+
+    db.execute(
+        delete(_SUGGESTIONS).where(
+            or_(
+                and_(_SUGGESTIONS.c.user_id == a, _SUGGESTIONS.c.candidate_id == b),
+                and_(_SUGGESTIONS.c.user_id == b, _SUGGESTIONS.c.candidate_id == a),
+            )
+        )
+    )
+    if accepted:
+        _increment_suggestions(db, pairs)
+    else:
+        _decrement_suggestions(db, pairs)
+        if mutual := len(friends_a & friends_b):
+            db.execute(
+                _SUGGESTIONS.insert(),
+                [
+                    {"user_id": a, "candidate_id": b, "mutual_count": mutual},
+                    {"user_id": b, "candidate_id": a, "mutual_count": mutual},
+                ],
+            )
+    db.commit()
+
+
+def _refresh_suggestions_for_accepted(db: Session, user_id: int, friend_ids) -> None:
+    """Patch suggestions after `user_id` accepted several friendships at once.
+
+    Same patch as _refresh_suggestions_for_edge for each new edge, in one
+    pass and one commit. Every two-hop path u-v-w through a new edge adds
+    one mutual friend to (u, w); a path whose two edges are both new (two
+    new friends of `user_id`) is counted once.
+    """
+    friends = _load_friend_ids_many(db, {user_id, *friend_ids})
+
+    paths = set()
+    for p in friend_ids:
+        for u, v in ((user_id, p), (p, user_id)):
+            for w in friends[v]:
+                if w != u and w not in friends[u]:
+                    paths.update(((u, v, w), (w, v, u)))
+
+    db.execute(
+        delete(_SUGGESTIONS).where(
+            or_(
+                and_(
+                    _SUGGESTIONS.c.user_id == user_id,
+                    _SUGGESTIONS.c.candidate_id.in_(friend_ids),
+                ),
+                and_(
+                    _SUGGESTIONS.c.user_id.in_(friend_ids),
+                    _SUGGESTIONS.c.candidate_id == user_id,
+                ),
+            )
+        )
+    )
+    _increment_suggestions(db, [(u, w) for u, _, w in paths])
+    db.commit()
+
+
+def _safe_refresh_suggestions(db: Session, a: int, b: int, accepted: bool) -> None:
+    ranking.invalidate_edge(a, b)
+    # the friendship change is already committed; a failure here only leaves
+    # suggestions stale until the next rebuild, so do not fail the request
+    try:
+        _refresh_suggestions_for_edge(db, a, b, accepted)
+    except Exception as e:
+        db.rollback()
+        print(f"[friend_service] failed to refresh suggestions for {a}-{b}: {e}")
 
 
 def add_friend(db: Session, user_id: int, friend_id: int) -> Friend:
@@ -12,43 +472,48 @@ def add_friend(db: Session, user_id: int, friend_id: int) -> Friend:
     if user_id == friend_id:
         raise ValueError("Cannot add yourself as a friend")
 
-    if existing := (
-        db.query(Friend)
-        .filter(
-            (
-                ((Friend.user_id == user_id) & (Friend.friend_id == friend_id))
-                | ((Friend.user_id == friend_id) & (Friend.friend_id == user_id))
-            )
-            & (Friend.is_active == False)
-        )
-        .first()
-    ):
+    if existing := db.scalars(_LIVE_FRIENDSHIP_BETWEEN, _pair(user_id, friend_id)).first():
         raise ValueError("Friendship already exists")
 
     # Create pending friendship (user_id -> friend_id)
     friendship = Friend(user_id=user_id, friend_id=friend_id, is_active=False)
     db.add(friendship)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent request created the live row first (uq_friends_live_pair)
+        db.rollback()
+        raise ValueError("Friendship already exists")
     db.refresh(friendship)
+    notifier.publish("request_sent", user_id, [friend_id])
     return friendship
 
 
 def remove_friend(db: Session, user_id: int, friend_id: int) -> None:
     """Remove an existing friendship between user_id and friend_id."""
-    friendship = (
-        db.query(Friend)
-        .filter(
-            ((Friend.user_id == user_id) & (Friend.friend_id == friend_id))
-            | ((Friend.user_id == friend_id) & (Friend.friend_id == user_id))
-        )
-        .first()
-    )
+    params = _pair(user_id, friend_id)
+    # prefer the live row; older removed rows may exist for the same pair
+    friendship = db.scalars(_LIVE_FRIENDSHIP_BETWEEN, params).first() or db.scalars(
+        _FRIENDSHIP_BETWEEN, params
+    ).first()
     if not friendship:
         raise ValueError("No friendship exists to remove")
 
+    was_live = not friendship.is_active
+    was_friend = bool(friendship.is_accepted and was_live)
+    requested_by_user = friendship.user_id == user_id
     # db.delete(friendship)
     friendship.is_active = True  # mark as inactive instead of deleting
     db.commit()
+    adjacency.invalidate(user_id, friend_id)
+    if was_friend:
+        _safe_refresh_suggestions(db, user_id, friend_id, accepted=False)
+    if was_live:
+        if was_friend:
+            event = "friend_removed"
+        else:
+            event = "request_cancelled" if requested_by_user else "request_declined"
+        notifier.publish(event, user_id, [friend_id])
 
 
 def list_unaccepted_friend_requests(
@@ -85,13 +550,8 @@ def list_unaccepted_friend_requests(
     )
 
     if q:
-        like = f"%{q}%"
-        base_q = base_q.filter(
-            or_(
-                User.username.ilike(like),
-                User.full_name.ilike(like),
-                User.email.ilike(like),
-            )
+        base_q = base_q.filter(search_service.USER_MATCH[search_service.match_kind(q)]).params(
+            **search_service.match_params(q)
         )
 
     total = base_q.count()
@@ -137,91 +597,119 @@ def list_unaccepted_friend_requests(
 
 def accept_friend(db: Session, user_id: int, friend_id: int) -> Friend:
     """Accept a pending friend request where friend_id is the requester and user_id is the recipient."""
-    friendship = (
-        db.query(Friend)
-        .filter(
-            (Friend.user_id == friend_id)
-            & (Friend.friend_id == user_id)
-            & (Friend.is_active == False)
-            & (Friend.is_accepted == False)
-        )
-        .first()
-    )
+    friendship = db.scalars(
+        _PENDING_REQUEST, {**_pair(user_id, friend_id), "requester": friend_id}
+    ).first()
     if not friendship:
         raise ValueError("No pending friend request found")
 
     friendship.is_accepted = True
     db.commit()
     db.refresh(friendship)
+    adjacency.add_edge(user_id, friend_id)
+    _safe_refresh_suggestions(db, user_id, friend_id, accepted=True)
+    notifier.publish("request_accepted", user_id, [friend_id])
     return friendship
 
 
+def bulk_friend_requests(db: Session, user_id: int, action: str, user_ids: List[int]) -> Dict:
+    """Accept, decline or cancel several pending friend requests at once.
+
+    For "accept"/"decline" `user_ids` are the requesters of requests sent to
+    `user_id`; for "cancel" they are the recipients of requests `user_id` sent.
+    Runs a single UPDATE and commit; the resulting friend events are coalesced
+    into one websocket frame per affected user (the counterparts and the actor).
+
+    Returns dict: { action, updated, results: [{user_id, status}] } where status
+    is "accepted"/"declined"/"cancelled" or "not_found" for ids without a pending request.
+    """
+    if action not in _BULK_REQUEST_UPDATES:
+        raise ValueError(f"Unknown action: {action}")
+    ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+    if not ids:
+        raise ValueError("user_ids must not be empty")
+    if len(ids) > FRIEND_BULK_MAX:
+        raise ValueError(f"At most {FRIEND_BULK_MAX} requests per call")
+
+    stmt = _BULK_REQUEST_UPDATES[action].execution_options(synchronize_session=False)
+    updated = set(db.scalars(stmt, {"actor_id": user_id, "ids": ids}).all())
+    db.commit()
+
+    status = _BULK_STATUS[action]
+    if action == "accept" and updated:
+        for other_id in updated:
+            adjacency.add_edge(user_id, other_id)
+            ranking.invalidate_edge(user_id, other_id)
+        # as in _safe_refresh_suggestions: the accepts are committed, so a
+        # failure only leaves suggestions stale until the next rebuild
+        try:
+            _refresh_suggestions_for_accepted(db, user_id, sorted(updated))
+        except Exception as e:
+            db.rollback()
+            print(f"[friend_service] failed to refresh suggestions for {user_id}: {e}")
+
+    notifier.publish("request_" + status, user_id, sorted(updated))
+
+    return {
+        "action": action,
+        "updated": len(updated),
+        "results": [
+            {"user_id": uid, "status": status if uid in updated else "not_found"}
+            for uid in ids
+        ],
+    }
+
+
 def list_friends(
     db: Session,
     user_id: int,
     page: int = 1,
     per_page: int = 20,
     q: Optional[str] = None,
+    with_total: bool = True,
 ) -> Dict:
     """Return paginated list of accepted friends for `user_id`.
 
-    Supports optional search `q` which matches username, full_name or email (case-insensitive).
-    Returns a dict: { items: List[User], total: int, page: int, per_page: int }
+    Supports optional search `q` which matches username, full_name or email
+    (case-insensitive, served by the search_service index).
+    Runs as one statement: a UNION of both friendship directions joined to
+    `users`, with the total taken from a window count when `with_total` is set
+    (otherwise `total` is None).
+    Returns a dict: { friends: List[dict], total: int, page: int, per_page: int, next_page, prev_page }
     """
-    # Find accepted friendships involving the user
-    friendships = (
-        db.query(Friend)
-        .filter(
-            ((Friend.user_id == user_id) | (Friend.friend_id == user_id))
-            & (Friend.is_accepted == True)
-            & (Friend.is_active == False)
-        )
-        .all()
-    )
-
-    friend_ids = set()
-    for f in friendships:
-        if f.user_id == user_id:
-            friend_ids.add(f.friend_id)
+    match = search_service.match_kind(q) if q else None
+    params = {"user_id": user_id, "offset": (page - 1) * per_page, "limit": per_page}
+    if match:
+        params.update(search_service.match_params(q))
+
+    rows = db.execute(_FRIENDS_PAGE[(match, with_total)], params).all()
+
+    total = None
+    if with_total:
+        if rows:
+            total = rows[0].total
+        elif page > 1:
+            total = db.execute(_FRIENDS_COUNT[match], params).scalar_one()
         else:
-            friend_ids.add(f.user_id)
-
-    query = db.query(User).filter(User.id.in_(friend_ids))
-
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            or_(
-                User.username.ilike(like),
-                User.full_name.ilike(like),
-                User.email.ilike(like),
-            )
-        )
+            total = 0
 
-    total = query.count()
-    items = (
-        query.order_by(User.created_at.desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-        .all()
-    )
-    
-    # compute next/prev pages
-    next_page = page + 1 if page * per_page < total else False
+    # compute next/prev pages (without a total, a full page implies there may be more)
+    has_more = page * per_page < total if total is not None else len(rows) == per_page
+    next_page = page + 1 if has_more else False
     prev_page = page - 1 if page > 1 else False
 
     return {
         "friends": [{
-            "id": user.id,
-            "username": user.username,
-            "full_name": getattr(user, "full_name", None),
-            "avatar": getattr(user, "avatar_url", None),
-            "email": getattr(user, "email", None),
-            "phone_number": getattr(user, "phone_number", None),
-            "date_of_birth": getattr(user, "date_of_birth", None),
-            "gender": getattr(user, "gender", None),
-            "created_at": getattr(user, "created_at", None),
-        } for user in items],
+            "id": row.id,
+            "username": row.username,
+            "full_name": row.full_name,
+            "avatar": row.avatar_url,
+            "email": row.email,
+            "phone_number": row.phone_number,
+            "date_of_birth": row.date_of_birth,
+            "gender": row.gender,
+            "created_at": row.created_at,
+        } for row in rows],
         "total": total,
         "page": page,
         "per_page": per_page,
@@ -233,83 +721,59 @@ def list_friends(
 def list_friend_suggestions(
     db: Session, user_id: int, page: int = 1, per_page: int = 10
 ) -> Dict:
-    """Return a paginated list of friend suggestions for the user based on mutual friends.
+    """Return a paginated list of friend suggestions for the user.
 
-    Returns dict: { items: List[User], total: int, page: int, per_page: int, next_page, prev_page }
-    """
-    # Get current friends
-    friendships = (
-        db.query(Friend)
-        .filter(
-            ((Friend.user_id == user_id) | (Friend.friend_id == user_id))
-            & (Friend.is_accepted == True)
-            & (Friend.is_active == False)
-        )
-        .all()
-    )
-    print(f"User {user_id} friendships:", friendships)  # debug log
+    Uses the user's personalized multi-hop ranking (see friend_ranking) when
+    one is cached; otherwise queues its computation and answers from the
+    precomputed `friend_suggestions` rows ranked by mutual count, with one
+    indexed top-N query whose total comes from a window count.
 
-    friend_ids = set()
-    for f in friendships:
-        if f.user_id == user_id:
-            friend_ids.add(f.friend_id)
-        else:
-            friend_ids.add(f.user_id)
-
-    print(f"User {user_id} friend IDs:", friend_ids)  # debug log
-    if not friend_ids:
-        return {
-            "friends": [],
-            "total": 0,
-            "page": page,
-            "per_page": per_page,
-            "next_page": False,
-            "prev_page": False,
-        }
-
-    # Base query: users who are friends-of-friends but not already friends and not the user
-    base_q = (
-        db.query(User)
-        .join(Friend, or_(Friend.user_id == User.id, Friend.friend_id == User.id))
-        .filter(
-            (Friend.is_accepted == True)
-            & (Friend.is_active == False)
-            & ((Friend.user_id.in_(friend_ids)) | (Friend.friend_id.in_(friend_ids)))
-            & (User.id != user_id)
-            & (~User.id.in_(friend_ids))
-        )
-        .group_by(User.id)
-    )
-
-    # total distinct users matching
-    total = (
-        db.query(func.count(func.distinct(User.id)))
-        .select_from(User)
-        .join(Friend, or_(Friend.user_id == User.id, Friend.friend_id == User.id))
-        .filter(
-            (Friend.is_accepted == True)
-            & (Friend.is_active == False)
-            & ((Friend.user_id.in_(friend_ids)) | (Friend.friend_id.in_(friend_ids)))
-            & (User.id != user_id)
-            & (~User.id.in_(friend_ids))
-        )
-        .scalar()
-    )
-
-    # order by number of mutual friends (descending)
-    items = (
-        base_q.order_by(func.count(Friend.id).desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-        .all()
-    )
+    Returns dict: { friends: List[dict], total: int, page: int, per_page: int, next_page, prev_page }
+    """
+    ranked = ranking.get(user_id)
+    if ranked is not None:
+        # drop candidates that became friends since the ranking was computed
+        friends = _friend_ids(db, user_id)
+        ranked = [r for r in ranked if not _contains(friends, r[0])]
+        total = len(ranked)
+        window = ranked[(page - 1) * per_page : page * per_page]
+        mutual = {candidate: count for candidate, _, count in window}
+        profiles = {
+            row.id: row
+            for row in db.execute(_PROFILES_BY_IDS, {"ids": list(mutual)}).all()
+        } if window else {}
+        rows = [
+            {**profiles[candidate]._mapping, "mutual_count": mutual[candidate]}
+            for candidate, _, _ in window
+            if candidate in profiles
+        ]
+    else:
+        result = db.execute(
+            _SUGGESTIONS_PAGE,
+            {"user_id": user_id, "offset": (page - 1) * per_page, "limit": per_page},
+        ).all()
+        # past the last page no row carries the window total
+        total = result[0].total if result else 0
+        rows = [
+            {
+                "id": row.id,
+                "username": row.username,
+                "full_name": row.full_name,
+                "phone_number": row.phone_number,
+                "date_of_birth": row.date_of_birth,
+                "gender": row.gender,
+                "avatar_url": row.avatar_url,
+                "mutual_count": row.mutual_count,
+            }
+            for row in result
+        ]
 
-    next_page = page + 1 if page * per_page < (total or 0) else False
+    next_page = page + 1 if page * per_page < total else False
     prev_page = page - 1 if page > 1 else False
 
     return {
-        "friends": items,
-        "total": total or 0,
+        "friends": rows,
+        "total": total,
         "page": page,
         "per_page": per_page,
         "next_page": next_page,
@@ -318,49 +782,107 @@ def list_friend_suggestions(
 
 
 def list_unfriended_users(
-    db: Session, user_id: int, page: int = 1, per_page: int = 10
+    db: Session,
+    user_id: int,
+    page: int = 1,
+    per_page: int = 10,
+    before_id: Optional[int] = None,
+    sample: bool = False,
 ) -> Dict:
-    """Return a paginated list of users who are not friends with the given user.
+    """Return users who are not friends with the given user.
+
+    Friends are excluded with NOT EXISTS probes on the accepted-friendship
+    indexes, and pages are keyset-paginated on `users.id` (newest first): pass
+    the returned `next_before_id` as `before_id` for the next page; `page`
+    only numbers the pages, so `page > 1` without `before_id` is rejected
+    (ValueError). No COUNT is run, so `total` is None.
 
-    Returns dict: { items: List[User], total: int, page: int, per_page: int, next_page, prev_page }
+    With `sample=True` a random page is drawn instead, starting at a random
+    point of the indexed `users.random_key` and wrapping around once.
+
+    Returns dict: { friends: List[User], total: None, page, per_page, next_page, prev_page, next_before_id }
     """
-    # Get current friends
-    friendships = (
-        db.query(Friend)
-        .filter(
-            ((Friend.user_id == user_id) | (Friend.friend_id == user_id))
-            & (Friend.is_accepted == True)
-            & (Friend.is_active == False)
-        )
-        .all()
-    )
+    if sample:
+        params = {"user_id": user_id, "start": random.random(), "limit": per_page}
+        items = db.scalars(_UNFRIENDED_SAMPLE[False], params).all()
+        if len(items) < per_page:
+            params["limit"] = per_page - len(items)
+            items += db.scalars(_UNFRIENDED_SAMPLE[True], params).all()
+        return {
+            "friends": items,
+            "total": None,
+            "page": 1,
+            "per_page": per_page,
+            "next_page": False,
+            "prev_page": False,
+            "next_before_id": None,
+        }
 
-    friend_ids = set()
-    for f in friendships:
-        if f.user_id == user_id:
-            friend_ids.add(f.friend_id)
-        else:
-            friend_ids.add(f.user_id)
+    if before_id is None and page > 1:
+        raise ValueError("before_id is required for pages after the first")
+    params = {"user_id": user_id, "limit": per_page}
+    if before_id is not None:
+        params["before_id"] = before_id
+    items = db.scalars(_UNFRIENDED_PAGE[before_id is not None], params).all()
 
-    # base query for users who are not friends and not the user
-    base_q = db.query(User).filter((User.id != user_id) & (~User.id.in_(friend_ids)))
+    has_more = len(items) == per_page
+    return {
+        "friends": items,
+        "total": None,
+        "page": page,
+        "per_page": per_page,
+        "next_page": page + 1 if has_more else False,
+        "prev_page": page - 1 if page > 1 else False,
+        "next_before_id": items[-1].id if has_more else None,
+    }
 
-    total = base_q.count()
-    items = (
-        base_q.order_by(User.created_at.desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-        .all()
+
+# -- mutual friends -------------------------------------------------------------
+_PROFILES_BY_IDS = (
+    select(
+        User.id,
+        User.username,
+        User.full_name,
+        User.phone_number,
+        User.date_of_birth,
+        User.gender,
+        User.avatar_url,
     )
+    .where(User.id.in_(bindparam("ids", expanding=True)))
+    .order_by(User.id)
+)
 
-    next_page = page + 1 if page * per_page < total else False
-    prev_page = page - 1 if page > 1 else False
+
+def list_mutual_friends(
+    db: Session, user_id: int, other_id: int, page: int = 1, per_page: int = 20
+) -> Dict:
+    """Return the friends `user_id` and `other_id` have in common.
+
+    Intersects the two cached sorted friend-id arrays, then loads only the
+    requested page of profiles (ordered by id).
+    Returns dict: { friends: List[dict], total: int, page, per_page, next_page, prev_page }
+    """
+    friends = _friend_ids_many(db, (user_id, other_id))
+    mutual = intersect_sorted(friends[user_id], friends[other_id])
+    total = len(mutual)
+    page_ids = list(mutual[(page - 1) * per_page : page * per_page])
+    rows = db.execute(_PROFILES_BY_IDS, {"ids": page_ids}).all() if page_ids else []
 
     return {
-        "friends": items,
+        "friends": [dict(row._mapping) for row in rows],
         "total": total,
         "page": page,
         "per_page": per_page,
-        "next_page": next_page,
-        "prev_page": prev_page,
+        "next_page": page + 1 if page * per_page < total else False,
+        "prev_page": page - 1 if page > 1 else False,
     }
+
+
+def mutual_counts(db: Session, user_id: int, other_ids: List[int]) -> Dict[int, int]:
+    """Return {other_id: number of mutual friends with user_id} for a page of profiles."""
+    other_ids = list(dict.fromkeys(int(uid) for uid in other_ids))
+    if len(other_ids) > MUTUAL_BATCH_MAX:
+        raise ValueError(f"At most {MUTUAL_BATCH_MAX} ids per call")
+    friends = _friend_ids_many(db, [user_id, *other_ids])
+    mine = friends[user_id]
+    return {uid: len(intersect_sorted(mine, friends[uid])) for uid in other_ids}
@@ -3,11 +3,14 @@ import os
 import smtplib
 import ssl
 import socket
+import time
 from email.message import EmailMessage
 from typing import Optional
 import jwt
 from datetime import datetime, timedelta, timezone
 
+from settings import settings
+
 # Try to auto-load a .env file for convenience during local dev if python-dotenv
 # is available. This avoids situations where you run the script directly but the
 # environment variables in .env are not loaded into the process.
@@ -61,6 +64,84 @@ def _get_smtp_config():
     }
 
 
+def build_message(
+    cfg: dict, subject: str, recipient: str, body: str, html: Optional[str] = None
+) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = cfg["from"]
+    msg["To"] = recipient
+    msg.set_content(body)
+    if html:
+        msg.add_alternative(html, subtype="html")
+    return msg
+
+
+class SmtpConnection:
+    """A reusable SMTP session for sending many messages.
+
+    `send_email` connects, negotiates TLS and logs in for every message. The
+    email outbox worker keeps one of these open instead, reconnecting when
+    the server drops the session or it has been idle for SMTP_IDLE_SECONDS.
+    """
+
+    def __init__(self, cfg: Optional[dict] = None):
+        self.cfg = cfg or _get_smtp_config()
+        self.idle_seconds = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+        self.timeout = float(os.getenv("MAILER_CONNECT_TIMEOUT", "5"))
+        self._server = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def send(self, subject: str, recipient: str, body: str, html: Optional[str] = None):
+        """Send one message; raises on failure (the caller decides on retries)."""
+        msg = build_message(self.cfg, subject, recipient, body, html)
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # the server closed an idle session; reconnect once and retry
+            self.close()
+            self._connection().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            with contextlib.suppress(Exception):
+                self._server.quit()
+            self._server = None
+
+    def _connection(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_seconds:
+            self.close()
+        if self._server is None:
+            cfg = self.cfg
+            if cfg["use_ssl"]:
+                context = ssl.create_default_context()
+                server = smtplib.SMTP_SSL(
+                    cfg["host"], cfg["port"], context=context, timeout=self.timeout
+                )
+            else:
+                server = smtplib.SMTP(cfg["host"], cfg["port"], timeout=self.timeout)
+                if cfg["starttls"]:
+                    server.starttls()
+            if cfg["user"]:
+                server.login(cfg["user"], cfg["password"])
+            self._server = server
+            self._last_used = time.monotonic()
+            self.connects += 1
+        return self._server
+
+
+def send_via_sendgrid_fallback(
+    subject: str, recipient: str, body: str, html: Optional[str] = None
+) -> bool:
+    """Send through SendGrid when SENDGRID_API_KEY is set; False otherwise."""
+    if sendgrid_key := os.getenv("SENDGRID_API_KEY"):
+        cfg = _get_smtp_config()
+        return _send_via_sendgrid(sendgrid_key, cfg.get("from"), recipient, subject, body, html)
+    return False
+
+
 def send_email(
     subject: str, recipient: str, body: str, html: Optional[str] = None
 ) -> bool:
@@ -81,13 +162,7 @@ def send_email(
     if not recipient or not isinstance(recipient, str) or "@" not in recipient:
         print(f"[mailer] invalid recipient address: {recipient!r}")
         return False
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = cfg["from"]
-    msg["To"] = recipient
-    msg.set_content(body)
-    if html:
-        msg.add_alternative(html, subtype="html")
+    msg = build_message(cfg, subject, recipient, body, html)
 
     # quick network-level connect test to detect platform-level SMTP blocks
     try:
@@ -199,9 +274,8 @@ def send_activation_email(
     return send_email(subject, recipient, text, html)
 
 
-def send_reset_password_email(
-    recipient: str, token: str, username: Optional[str] = None
-) -> bool:
+def reset_password_email(recipient: str, token: str, username: Optional[str] = None) -> dict:
+    """Build the reset-password email as send_email keyword arguments."""
     link = _build_action_link(token, action="reset")
     subject = "Reset your password"
     text = f"Hi {username or ''}\n\nYou can reset your password by clicking the link below:\n{link}\n\nIf you didn't request this, ignore this email.\n"
@@ -211,17 +285,23 @@ def send_reset_password_email(
         f'<p><a href="{link}">Reset password</a></p>'
         f"<p>If you didn't request this, ignore this email.</p>"
     )
-    return send_email(subject, recipient, text, html)
+    return {"subject": subject, "recipient": recipient, "body": text, "html": html}
+
+
+def send_reset_password_email(
+    recipient: str, token: str, username: Optional[str] = None
+) -> bool:
+    return send_email(**reset_password_email(recipient, token, username))
 
 
 def send_simple_notification(recipient: str, subject: str, message: str) -> bool:
     return send_email(subject, recipient, message)
 
 
-def send_welcome_email(recipient: str, username: Optional[str] = None) -> bool:
-
+def welcome_email(recipient: str, username: Optional[str] = None) -> dict:
+    """Build the welcome/activation email as send_email keyword arguments."""
     # create token to activate account (in real implementation, this should be a real token linked to the user)
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
     exp = now + timedelta(seconds=300)  # token valid for 5 minutes
     payload = {"sub": recipient}
@@ -239,12 +319,16 @@ def send_welcome_email(recipient: str, username: Optional[str] = None) -> bool:
         f'<p><a href="{_build_action_link(token, action="activate")}">Activate account</a></p>'
         f"<p>Best regards,<br>The Team</p>"
     )
-    return send_email(subject, recipient, text, html)
+    return {"subject": subject, "recipient": recipient, "body": text, "html": html}
 
-def send_welcome_email_with_google(recipient: str, username: Optional[str] = None) -> bool:
 
+def send_welcome_email(recipient: str, username: Optional[str] = None) -> bool:
+    return send_email(**welcome_email(recipient, username))
+
+def welcome_email_with_google(recipient: str, username: Optional[str] = None) -> dict:
+    """Build the welcome email for accounts created through Google sign-in."""
     # create token to activate account (in real implementation, this should be a real token linked to the user)
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
     exp = now + timedelta(seconds=300)  # token valid for 5 minutes
     payload = {"sub": recipient}
@@ -262,7 +346,26 @@ def send_welcome_email_with_google(recipient: str, username: Optional[str] = Non
         f'<p><a href="{_build_action_link(token, action="activate")}">Activate account</a></p>'
         f"<p>Best regards,<br>The Team</p>"
     )
-    return send_email(subject, recipient, text, html)
+    return {"subject": subject, "recipient": recipient, "body": text, "html": html}
+
+
+def send_welcome_email_with_google(recipient: str, username: Optional[str] = None) -> bool:
+    return send_email(**welcome_email_with_google(recipient, username))
+
+
+# builders the email outbox can render at send time (see email_outbox.enqueue_template);
+# the activation token minted inside is only valid for 5 minutes, so it must
+# not be created when the message is queued
+EMAIL_TEMPLATES = {
+    "welcome": welcome_email,
+    "welcome_google": welcome_email_with_google,
+    "reset_password": reset_password_email,
+}
+
+
+def render_email(template: str, recipient: str, params: dict) -> dict:
+    """Build a templated email as send_email keyword arguments."""
+    return EMAIL_TEMPLATES[template](recipient, **params)
 
 
 if __name__ == "__main__":
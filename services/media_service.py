@@ -0,0 +1,224 @@
+"""Async access to media storage with bounded concurrency.
+
+Storage backends (see media_storage) are blocking and, for Cloudinary, remote.
+Called from request threads they had no timeout, retry or concurrency cap, so
+a slow provider tied up the server's thread pool for every endpoint. Calls now
+run on MEDIA_WORKERS threads with at most MEDIA_QUEUE more waiting; request
+handlers await them without holding a thread, and callers beyond that get an
+immediate 503 with Retry-After.
+
+Each attempt is bounded by MEDIA_TIMEOUT seconds and failed attempts are
+retried up to MEDIA_RETRIES times with backoff. After MEDIA_BREAKER_THRESHOLD
+consecutive failures the circuit opens: calls fail fast with 503 for
+MEDIA_BREAKER_RESET seconds, then a single trial call decides whether it
+closes again.
+
+A timed-out call that is still waiting is dropped. One that already started
+cannot be interrupted and keeps its worker until the backend returns; it
+still counts against the limit, so a hung provider fills the pool and
+further calls are rejected instead of piling up.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from services.media_storage import MEDIA_TIMEOUT, get_storage
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "8"))
+MEDIA_QUEUE = int(os.getenv("MEDIA_QUEUE", "32"))
+MEDIA_RETRIES = int(os.getenv("MEDIA_RETRIES", "2"))
+MEDIA_RETRY_BACKOFF = float(os.getenv("MEDIA_RETRY_BACKOFF", "0.2"))
+MEDIA_BREAKER_THRESHOLD = int(os.getenv("MEDIA_BREAKER_THRESHOLD", "5"))
+MEDIA_BREAKER_RESET = float(os.getenv("MEDIA_BREAKER_RESET", "30"))
+
+
+class MediaService:
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        timeout: float,
+        retries: int,
+        breaker_threshold: int,
+        breaker_reset: float,
+        storage=None,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        # None: the configured backend, resolved on first use
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media")
+        self._lock = threading.Lock()
+        # running + waiting calls, including timed-out ones still running
+        self._in_flight = 0
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.rejected = 0
+        self.short_circuited = 0
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        """Store `data` under `key`; returns its public URL."""
+        return await self._call(self.storage.put, key, data, content_type)
+
+    async def delete(self, key: str) -> bool:
+        return await self._call(self.storage.delete, key)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "storage": getattr(self._storage, "name", None),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "circuit": self._state(),
+                "consecutive_failures": self._consecutive_failures,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "retried": self.retried,
+                "rejected": self.rejected,
+                "short_circuited": self.short_circuited,
+            }
+
+    # -- internals ---------------------------------------------------------
+    async def _call(self, fn, *args):
+        for attempt in range(self.retries + 1):
+            self._admit()
+            future = self._submit(fn, *args)
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except (ValueError, asyncio.CancelledError):
+                # bad input (e.g. an invalid key) or a caller that went away,
+                # not a storage failure
+                self._release_probe()
+                raise
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                self._record_failure(timed_out)
+                print(
+                    f"[media_service] {fn.__qualname__} attempt {attempt + 1} failed: "
+                    f"{'timeout' if timed_out else repr(e)}"
+                )
+                if attempt == self.retries:
+                    raise HTTPException(
+                        status_code=504 if timed_out else 502,
+                        detail="Media storage is not responding"
+                        if timed_out
+                        else "Media storage request failed",
+                    ) from e
+                with self._lock:
+                    self.retried += 1
+                await asyncio.sleep(MEDIA_RETRY_BACKOFF * 2**attempt * random.uniform(0.5, 1.5))
+            else:
+                self._record_success()
+                return result
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.breaker_reset:
+            return "open"
+        return "half_open"
+
+    def _admit(self):
+        """Fail fast while the circuit is open; let one trial call through once
+        the reset period has passed."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.short_circuited += 1
+            retry_after = self.breaker_reset - (time.monotonic() - self._opened_at)
+        raise HTTPException(
+            status_code=503,
+            detail="Media storage is unavailable, please retry shortly",
+            headers={"Retry-After": str(max(1, int(retry_after) + 1))},
+        )
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                self._probing = False
+                raise HTTPException(
+                    status_code=503,
+                    detail="Media storage is busy, please retry shortly",
+                    headers={"Retry-After": "2"},
+                )
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._probing = False
+            raise
+        # also runs when a timed-out or abandoned call is cancelled before it
+        # started, which never reaches the executor's worker
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _record_success(self):
+        with self._lock:
+            self.completed += 1
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def _record_failure(self, timed_out: bool):
+        with self._lock:
+            self.failed += 1
+            if timed_out:
+                self.timeouts += 1
+            self._consecutive_failures += 1
+            if self._probing or self._consecutive_failures >= self.breaker_threshold:
+                if self._opened_at is None or self._probing:
+                    print("[media_service] circuit opened")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def _release_probe(self):
+        with self._lock:
+            self._probing = False
+
+
+media = MediaService(
+    workers=MEDIA_WORKERS,
+    max_queue=MEDIA_QUEUE,
+    timeout=MEDIA_TIMEOUT,
+    retries=MEDIA_RETRIES,
+    breaker_threshold=MEDIA_BREAKER_THRESHOLD,
+    breaker_reset=MEDIA_BREAKER_RESET,
+)
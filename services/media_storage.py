@@ -0,0 +1,137 @@
+"""Storage backends for uploaded media.
+
+MEDIA_STORAGE selects the backend:
+
+- "cloudinary" (default): uploads through cloudinary_service.
+- "local": writes files under MEDIA_ROOT (default ./media) and serves them
+  from MEDIA_URL_PREFIX (default /media, mounted by app.py). Use it for
+  offline deployments.
+- "memory": keeps objects in a dict in this process. Nothing is served or
+  persisted; use it for tests and local experiments.
+
+Backends are blocking; request handlers reach them through media_service,
+which runs them on a bounded pool with timeouts, retries and a circuit
+breaker.
+
+Keys are slash-separated paths such as "avatars/<sha256>/128.webp"; the
+same key always maps to the same object, so content-addressed keys make
+re-uploads idempotent.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "cloudinary").lower()
+MEDIA_ROOT = os.getenv(
+    "MEDIA_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "media")
+)
+MEDIA_URL_PREFIX = os.getenv("MEDIA_URL_PREFIX", "/media").rstrip("/")
+# seconds the Cloudinary SDK waits on one HTTP request
+MEDIA_TIMEOUT = float(os.getenv("MEDIA_TIMEOUT", "10"))
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str, url_prefix: str):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so readers never see a partial file
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        return self.url(key)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"invalid media key: {key!r}")
+        return path
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        # imported lazily: the cloudinary package is only needed for this backend
+        from services import cloudinary_service
+
+        result = cloudinary_service.upload_image(
+            data, public_id=os.path.splitext(key)[0], timeout=self.timeout
+        )
+        if not result.get("url"):
+            raise RuntimeError(f"cloudinary upload of {key} failed")
+        return result["url"]
+
+    def delete(self, key: str) -> bool:
+        from services import cloudinary_service
+
+        return cloudinary_service.delete_image(
+            os.path.splitext(key)[0], timeout=self.timeout
+        )
+
+
+class MemoryStorage:
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (data, content type)
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        with self._lock:
+            self.objects[key] = (bytes(data), content_type)
+        return self.url(key)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            return self.objects.get(key)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self.objects.pop(key, None) is not None
+
+    def url(self, key: str) -> str:
+        return f"memory://{key}"
+
+
+def _create_storage(kind: str):
+    if kind == "local":
+        return LocalStorage(MEDIA_ROOT, MEDIA_URL_PREFIX)
+    if kind == "cloudinary":
+        return CloudinaryStorage(timeout=MEDIA_TIMEOUT)
+    if kind == "memory":
+        return MemoryStorage()
+    raise ValueError(
+        f"Unknown MEDIA_STORAGE: {kind!r} (expected 'cloudinary', 'local' or 'memory')"
+    )
+
+
+_storage: Optional[object] = None
+
+
+def get_storage():
+    """The configured storage backend (created on first use)."""
+    global _storage
+    if _storage is None:
+        _storage = _create_storage(MEDIA_STORAGE)
+    return _storage
@@ -0,0 +1,212 @@
+"""Password hashing on a dedicated, size-limited executor.
+
+bcrypt takes hundreds of milliseconds per call, and running it inline let a
+login spike occupy every FastAPI worker thread (and, in the Google callback,
+the event loop) and starve unrelated endpoints. Hashes and checks now run on
+PASSWORD_HASH_WORKERS threads with at most PASSWORD_HASH_QUEUE more calls
+waiting; callers beyond that get an immediate 503 with Retry-After instead of
+queueing behind the backlog.
+
+Request handlers await hash_async/verify_async, so the request itself holds
+no thread while bcrypt runs.
+
+The bcrypt cost is BCRYPT_ROUNDS, or "auto" (the default) to use the highest
+cost whose hash time stays under BCRYPT_TARGET_MS on this machine, never
+below BCRYPT_MIN_ROUNDS (bcrypt's own default, 12). "auto" is measured once
+at startup (calibrate()); pin BCRYPT_ROUNDS in production so every process
+uses the same cost. Stored hashes with a lower cost are rehashed in the
+background after a successful login; hashes are never downgraded.
+"""
+import asyncio
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+from fastapi import HTTPException
+from sqlalchemy import update
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS", "auto")
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "12"))
+BCRYPT_MAX_ROUNDS = 16
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """Highest bcrypt cost whose hash time stays under `target_ms` here."""
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(BCRYPT_MIN_ROUNDS))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rounds = BCRYPT_MIN_ROUNDS
+    # every extra round doubles the work
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+def hash_cost(stored) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), None if unparseable."""
+    if isinstance(stored, bytes):
+        stored = stored.decode("utf-8", "replace")
+    try:
+        return int(stored.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """bcrypt-hash `password` with cost `rounds` in the calling thread.
+
+    Module-level so process pools (see user_import) can run it.
+    """
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int, rounds: str):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._configured_rounds = rounds
+        self._rounds: Optional[int] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self._rounds_lock = threading.Lock()
+        # running + waiting calls
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def rounds(self) -> int:
+        if self._rounds is None:
+            with self._rounds_lock:
+                if self._rounds is None:
+                    if self._configured_rounds == "auto":
+                        self._rounds = calibrate_rounds()
+                    else:
+                        self._rounds = int(self._configured_rounds)
+                    print(f"[password_service] bcrypt cost {self._rounds}")
+        return self._rounds
+
+    def calibrate(self) -> int:
+        """Settle the bcrypt cost now (timing it if "auto"), so the
+        measurement runs once at startup rather than under login load."""
+        return self.rounds
+
+    async def hash_async(self, password: str) -> str:
+        """bcrypt-hash `password` on the hashing executor."""
+        return await asyncio.wrap_future(self._submit(self._hash, password))
+
+    async def verify_async(self, password: str, stored) -> bool:
+        """Check `password` against a stored bcrypt hash on the hashing executor."""
+        return await asyncio.wrap_future(self._submit(self._check, password, stored))
+
+    def needs_rehash(self, stored) -> bool:
+        # upgrade only: a lower (or differently calibrated) current cost must
+        # not rewrite stronger hashes
+        cost = hash_cost(stored)
+        return cost is not None and cost < self.rounds
+
+    def rehash_if_needed(self, model, row_id: int, password: str, stored):
+        """Rehash a just-verified password with the current cost in the background.
+
+        The row is only updated while it still holds `stored`, so a concurrent
+        password change is never overwritten. Skipped when the executor is
+        full; the next login tries again.
+        """
+        if not self.needs_rehash(stored):
+            return
+        old = stored.decode("utf-8") if isinstance(stored, bytes) else stored
+        try:
+            self._submit(self._rehash, model, row_id, password, old)
+        except HTTPException:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "rounds": self._rounds,
+                "avg_ms": round(self.busy_seconds * 1000 / self.completed, 2)
+                if self.completed
+                else 0.0,
+            }
+
+    # -- internals ---------------------------------------------------------
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        # also runs when a queued call is cancelled (e.g. the client went
+        # away) before it started, which never reaches _timed
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.completed += 1
+                self.busy_seconds += time.perf_counter() - started
+
+    def _hash(self, password: str) -> str:
+        return hash_password(password, self.rounds)
+
+    def _check(self, password: str, stored) -> bool:
+        if isinstance(stored, str):
+            stored = stored.encode("utf-8")
+        return bcrypt.checkpw(password.encode("utf-8"), stored)
+
+    def _rehash(self, model, row_id: int, password: str, old: str):
+        # imported here to keep the import graph free of cycles
+        from database import SessionLocal
+
+        try:
+            new_hash = self._hash(password)
+            with SessionLocal() as db:
+                db.execute(
+                    update(model)
+                    .where(model.id == row_id, model.password == old)
+                    .values(password=new_hash)
+                )
+                db.commit()
+            with self._lock:
+                self.rehashed += 1
+        except Exception:
+            traceback.print_exc()
+
+
+hasher = PasswordHasher(workers=HASH_WORKERS, max_queue=HASH_QUEUE, rounds=BCRYPT_ROUNDS)
@@ -0,0 +1,113 @@
+"""Process-level cache of public user profiles.
+
+`GET /users/{id}` and `/users/me` are called constantly by chat clients to
+render sender names and avatars. Profiles are cached for PROFILE_CACHE_TTL
+seconds, holding at most PROFILE_CACHE_SIZE users with least-recently-used
+eviction. user_service invalidates an entry after every write that changes
+what the profile shows; the TTL bounds staleness for writes made by other
+processes.
+
+Each entry carries an ETag derived from the profile content, so clients can
+revalidate with If-None-Match and get a 304 while the profile is unchanged,
+across cache refills and server restarts alike.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from settings import settings
+
+
+def profile_etag(profile: dict) -> str:
+    digest = hashlib.sha1(
+        json.dumps(profile, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+class ProfileCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user_id -> (stored_at, profile, etag)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # bumped on every invalidation; a read that raced one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[Tuple[dict, str]]:
+        """Return (profile, etag) for a cached, fresh entry, else None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[user_id]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, user_id: int, profile: dict, generation: int) -> str:
+        """Cache `profile` read at `generation`; returns its ETag.
+
+        Skipped when an invalidation happened since `generation` was taken,
+        so a read that raced a write never caches the old row.
+        """
+        etag = profile_etag(profile)
+        with self._lock:
+            if generation != self._generation:
+                return etag
+            self._entries[user_id] = (time.monotonic(), profile, etag)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return etag
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+profiles = ProfileCache(
+    max_entries=settings.profile_cache_size,
+    ttl_seconds=settings.profile_cache_ttl_seconds,
+)
@@ -0,0 +1,77 @@
+"""Process-level cache of admin roles.
+
+`utils.roles.require_role` runs on every admin request and only needs the
+caller's `role`. Roles are cached per admin id for ADMIN_ROLE_CACHE_TTL
+seconds (ids with no admin account are cached as None, so regular users
+probing admin routes do not hit the database either). admin_service
+invalidates an entry when an admin account is created or updated; the short
+TTL bounds staleness for changes made by other processes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from settings import settings
+
+_MISSING = object()
+
+
+class AdminRoleCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # admin_id -> (stored_at, role or None)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # bumped on every invalidation; a load that raced one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, admin_id: int, load: Callable[[int], Optional[str]]) -> Optional[str]:
+        """Return the cached role of `admin_id`, calling `load(admin_id)` on a miss."""
+        with self._lock:
+            entry = self._entries.get(admin_id, _MISSING)
+            if entry is not _MISSING and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(admin_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        role = load(admin_id)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[admin_id] = (time.monotonic(), role)
+                self._entries.move_to_end(admin_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return role
+
+    def invalidate(self, admin_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(admin_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+admin_roles = AdminRoleCache(max_entries=10000, ttl_seconds=settings.admin_role_cache_ttl_seconds)
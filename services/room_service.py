@@ -0,0 +1,219 @@
+# room (group conversation) service
+import os, sys
+from typing import Iterable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project root
+
+from database import after_commit, commit, retry_on_busy, session_scope
+from entities.room import Room, RoomMember, RoomMessage
+from entities.user import User
+from services import ws_service
+from sqlalchemy import bindparam, false, select
+
+# cap on members added in one create_room call; larger rooms grow via add_member
+MAX_INITIAL_MEMBERS = int(os.getenv("ROOM_MAX_INITIAL_MEMBERS", "5000"))
+
+_MEMBER_IDS = select(RoomMember.user_id).where(RoomMember.room_id == bindparam("room_id"))
+_MEMBERSHIP = (
+    select(RoomMember)
+    .where(RoomMember.room_id == bindparam("room_id"), RoomMember.user_id == bindparam("user_id"))
+    .limit(1)
+)
+_IS_MEMBER = (
+    select(RoomMember.id)
+    .where(RoomMember.room_id == bindparam("room_id"), RoomMember.user_id == bindparam("user_id"))
+    .limit(1)
+)
+_ROOMS_FOR_USER = (
+    select(Room)
+    .join(RoomMember, RoomMember.room_id == Room.id)
+    .where(RoomMember.user_id == bindparam("user_id"), Room.is_active == false())
+    .order_by(Room.created_at.desc())
+)
+
+
+def _room_to_dict(room: Room, member_count: Optional[int] = None) -> dict:
+    return {
+        "id": room.id,
+        "name": room.name,
+        "owner_id": room.owner_id,
+        "created_at": room.created_at,
+        "member_count": member_count,
+    }
+
+
+def _message_to_dict(message: RoomMessage) -> dict:
+    return {
+        "id": message.id,
+        "room_id": message.room_id,
+        "user_from_id": message.user_from_id,
+        "text": message.text,
+        "image_url": message.image_url,
+        "created_at": message.created_at,
+    }
+
+
+def _get_room(db, room_id: int) -> Room:
+    room = db.get(Room, room_id)
+    if not room or room.is_active:
+        raise LookupError("Room not found")
+    return room
+
+
+def _is_member(db, room_id: int, user_id: int) -> bool:
+    # always read from the DB: the in-memory index only sees membership
+    # changes made through this process
+    return db.scalar(_IS_MEMBER, {"room_id": room_id, "user_id": user_id}) is not None
+
+
+def _load_room_index(db, room_id: int):
+    """(Re)load the in-memory member set used for fan-out once it is older
+    than ws_service.ROOM_INDEX_TTL."""
+    manager = ws_service.manager
+    if not manager.has_room(room_id):
+        manager.set_room_members(room_id, db.scalars(_MEMBER_IDS, {"room_id": room_id}).all())
+
+
+@retry_on_busy
+def create_room(owner_id: int, name: str, member_ids: Iterable[int] = ()) -> dict:
+    """Create a room owned by `owner_id` with the given initial members."""
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("Room name is required")
+    members = {int(uid) for uid in member_ids} | {owner_id}
+    if len(members) > MAX_INITIAL_MEMBERS:
+        raise ValueError(f"At most {MAX_INITIAL_MEMBERS} initial members allowed")
+
+    with session_scope() as db:
+        existing = set(db.scalars(select(User.id).where(User.id.in_(members))).all())
+        if missing := members - existing:
+            raise ValueError(f"Unknown user ids: {sorted(missing)}")
+
+        room = Room(name=name, owner_id=owner_id)
+        db.add(room)
+        db.flush()
+        db.add_all(
+            [
+                RoomMember(
+                    room_id=room.id,
+                    user_id=uid,
+                    role="owner" if uid == owner_id else "member",
+                )
+                for uid in members
+            ]
+        )
+        commit(db)
+        db.refresh(room)
+        after_commit(ws_service.manager.set_room_members, room.id, members)
+        return _room_to_dict(room, member_count=len(members))
+
+
+@retry_on_busy
+def add_member(room_id: int, actor_id: int, user_id: int) -> dict:
+    """Add `user_id` to a room. Only the room owner may add members."""
+    with session_scope() as db:
+        room = _get_room(db, room_id)
+        if room.owner_id != actor_id:
+            raise PermissionError("Only the room owner can add members")
+        if not db.get(User, user_id):
+            raise LookupError("User not found")
+        if db.scalars(_MEMBERSHIP, {"room_id": room_id, "user_id": user_id}).first():
+            raise ValueError("User is already a member")
+
+        db.add(RoomMember(room_id=room_id, user_id=user_id))
+        commit(db)
+        after_commit(ws_service.manager.add_room_member, room_id, user_id)
+        after_commit(
+            ws_service.manager.send_room_sync,
+            room_id,
+            {"type": "room_member_added", "room_id": room_id, "user_id": user_id},
+        )
+        return {"message": "Member added"}
+
+
+@retry_on_busy
+def remove_member(room_id: int, actor_id: int, user_id: int) -> dict:
+    """Remove `user_id` from a room. Owners may remove anyone; members may leave."""
+    with session_scope() as db:
+        room = _get_room(db, room_id)
+        if actor_id not in (room.owner_id, user_id):
+            raise PermissionError("Only the room owner can remove other members")
+        if user_id == room.owner_id:
+            raise ValueError("The room owner cannot leave the room")
+        membership = db.scalars(
+            _MEMBERSHIP, {"room_id": room_id, "user_id": user_id}
+        ).first()
+        if not membership:
+            raise LookupError("User is not a member of this room")
+
+        db.delete(membership)
+        commit(db)
+        # notify remaining members (and the removed user) before dropping from the index
+        after_commit(
+            ws_service.manager.send_room_sync,
+            room_id,
+            {"type": "room_member_removed", "room_id": room_id, "user_id": user_id},
+        )
+        after_commit(ws_service.manager.remove_room_member, room_id, user_id)
+        return {"message": "Member removed"}
+
+
+def list_rooms_for_user(user_id: int) -> list:
+    """Return the rooms `user_id` belongs to, newest first."""
+    with session_scope() as db:
+        rooms = db.scalars(_ROOMS_FOR_USER, {"user_id": user_id}).all()
+        return [_room_to_dict(room) for room in rooms]
+
+
+@retry_on_busy
+def post_message(
+    room_id: int, user_from_id: int, text: str, image_url: Optional[str] = None
+) -> dict:
+    """Store a message once for the room and fan it out to online members.
+
+    Membership is checked with a unique-index lookup; recipients come from
+    the in-memory index, reloaded at most every WS_ROOM_INDEX_TTL seconds, so
+    fan-out needs no member query per message.
+    """
+    with session_scope() as db:
+        if not _is_member(db, room_id, user_from_id):
+            raise PermissionError("Not a member of this room")
+        _load_room_index(db, room_id)
+
+        message = RoomMessage(
+            room_id=room_id, user_from_id=user_from_id, text=text, image_url=image_url
+        )
+        db.add(message)
+        commit(db)
+        db.refresh(message)
+        payload = _message_to_dict(message)
+        after_commit(
+            ws_service.manager.send_room_sync,
+            room_id,
+            {"type": "room_message", **payload},
+        )
+        return payload
+
+
+def get_room_messages(
+    room_id: int, user_id: int, before_id: Optional[int] = None, limit: int = 50
+) -> dict:
+    """Return up to `limit` messages older than `before_id` (newest first).
+
+    Uses keyset pagination on the (room_id, id) index; pass the returned
+    `next_before_id` to fetch the next (older) page.
+    """
+    limit = max(1, min(limit, 200))
+    with session_scope() as db:
+        if not _is_member(db, room_id, user_id):
+            raise PermissionError("Not a member of this room")
+
+        stmt = select(RoomMessage).where(RoomMessage.room_id == room_id)
+        if before_id is not None:
+            stmt = stmt.where(RoomMessage.id < before_id)
+        messages = db.scalars(stmt.order_by(RoomMessage.id.desc()).limit(limit)).all()
+        items = [_message_to_dict(m) for m in messages]
+        return {
+            "items": items,
+            "next_before_id": items[-1]["id"] if len(items) == limit else None,
+        }
@@ -0,0 +1,184 @@
+"""People search over users.username / full_name / email.
+
+SQLite: an FTS5 table (`users_fts`, trigram tokenizer) mirrors the three
+columns and is kept in sync by triggers on `users`, so every writer (register,
+profile update, Google sign-in, admin edits) updates it. Matches are ranked
+with bm25, username weighted highest.
+
+Postgres: pg_trgm GIN indexes on the three columns serve the `ILIKE '%q%'`
+filter; matches are ranked by trigram similarity.
+
+Trigrams need at least 3 characters, so shorter queries fall back to a plain
+ILIKE (prefix match for autocomplete).
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, bindparam, column, func, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from database import engine
+from entities.user import User
+
+DIALECT = engine.dialect.name
+MIN_TRIGRAM_LENGTH = 3
+MAX_SEARCH_LIMIT = 50
+
+SQLITE_FTS_DDL = [
+    # external-content table: stores only the index, rows live in `users`
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, full_name, email,
+        content='users', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_au
+    AFTER UPDATE OF username, full_name, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+        INSERT INTO users_fts(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+]
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+]
+
+
+def ensure_search_index(bind=None) -> None:
+    """Create the search index for the current dialect if it is missing.
+
+    Safe to call on every startup. On SQLite the FTS table is rebuilt from
+    `users` whenever the sync triggers were missing (new database, or the
+    users table was dropped and recreated), since it may be out of date.
+    """
+    bind = bind or engine
+    with bind.begin() as conn:
+        if DIALECT == "sqlite":
+            in_sync = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'users_fts_ai'")
+            ).first()
+            for ddl in SQLITE_FTS_DDL:
+                conn.execute(text(ddl))
+            if not in_sync:
+                conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+        elif DIALECT == "postgresql":
+            for ddl in POSTGRES_TRGM_DDL:
+                conn.execute(text(ddl))
+
+
+_users_fts = table("users_fts", column("rowid", Integer))
+_FTS_MATCH = text("users_fts MATCH :search_q")
+# user ids whose username/full_name/email contain :search_q (SQLite FTS)
+_FTS_IDS = select(_users_fts.c.rowid).where(_FTS_MATCH)
+_LIKE_MATCH = or_(
+    User.username.ilike(bindparam("search_like")),
+    User.full_name.ilike(bindparam("search_like")),
+    User.email.ilike(bindparam("search_like")),
+)
+# match kind -> filter clause on User
+USER_MATCH = {
+    "fts": User.id.in_(_FTS_IDS),
+    "like": _LIKE_MATCH,
+}
+
+
+def _fts_phrase(q: str) -> str:
+    # quote as one FTS5 string so operators/punctuation in q are literal
+    return '"' + q.replace('"', '""') + '"'
+
+
+def match_kind(q: str) -> str:
+    """Which USER_MATCH clause serves `q` on this database."""
+    if DIALECT == "sqlite" and len(q) >= MIN_TRIGRAM_LENGTH:
+        return "fts"
+    return "like"
+
+
+def match_params(q: str) -> Dict[str, str]:
+    """Bind values for USER_MATCH[match_kind(q)]."""
+    if match_kind(q) == "fts":
+        return {"search_q": _fts_phrase(q)}
+    return {"search_like": f"%{q}%"}
+
+
+_HIT_COLUMNS = (User.id, User.username, User.full_name, User.avatar_url)
+_NOT_SELF = User.id != bindparam("exclude_id")
+
+# ranked autocomplete statements, keyed by match kind
+if DIALECT == "sqlite":
+    _SEARCH = {
+        "fts": select(*_HIT_COLUMNS)
+        .select_from(_users_fts.join(User, User.id == _users_fts.c.rowid))
+        .where(_FTS_MATCH, _NOT_SELF)
+        # bm25 is lower-is-better; weights: username, full_name, email
+        .order_by(text("bm25(users_fts, 10.0, 5.0, 1.0)"), User.id)
+        .limit(bindparam("limit")),
+    }
+elif DIALECT == "postgresql":
+    _SEARCH = {
+        "like": select(*_HIT_COLUMNS)
+        .where(_LIKE_MATCH, _NOT_SELF)
+        .order_by(
+            func.greatest(
+                func.similarity(User.username, bindparam("search_raw")),
+                func.similarity(func.coalesce(User.full_name, ""), bindparam("search_raw")),
+                func.similarity(User.email, bindparam("search_raw")),
+            ).desc(),
+            User.id,
+        )
+        .limit(bindparam("limit")),
+    }
+else:
+    _SEARCH = {}
+# short queries: prefix match on username / full name
+_SEARCH_PREFIX = (
+    select(*_HIT_COLUMNS)
+    .where(
+        or_(
+            User.username.ilike(bindparam("search_prefix")),
+            User.full_name.ilike(bindparam("search_prefix")),
+        ),
+        _NOT_SELF,
+    )
+    .order_by(User.username, User.id)
+    .limit(bindparam("limit"))
+)
+
+
+def search_users(
+    db: Session, q: str, limit: int = 10, exclude_id: Optional[int] = None
+) -> List[dict]:
+    """Return up to `limit` users matching `q`, best match first."""
+    q = (q or "").strip()
+    if not q:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    params = {"limit": limit, "exclude_id": exclude_id if exclude_id is not None else -1}
+
+    kind = match_kind(q)
+    if len(q) >= MIN_TRIGRAM_LENGTH and kind in _SEARCH:
+        params.update(match_params(q))
+        if DIALECT == "postgresql":
+            params["search_raw"] = q
+        stmt = _SEARCH[kind]
+    else:
+        params["search_prefix"] = f"{q}%"
+        stmt = _SEARCH_PREFIX
+    return [dict(row._mapping) for row in db.execute(stmt, params)]
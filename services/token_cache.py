@@ -0,0 +1,74 @@
+"""Process-level cache of verified JWTs.
+
+Maps token -> (user_id, exp) for tokens that passed signature verification,
+so repeat requests with the same cookie skip `jwt.decode`. Entries are only
+served before their `exp`, and the cache holds at most AUTH_TOKEN_CACHE_SIZE
+tokens with least-recently-used eviction. Nothing beyond what the token
+itself already proves is cached, so semantics match decoding every time.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from settings import settings
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # token -> (user_id, exp as unix seconds)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[int]:
+        """Return the user id for a cached, unexpired token, else None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= time.time():
+                del self._entries[token]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, user_id: int, exp: float):
+        with self._lock:
+            self._entries[token] = (user_id, exp)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+verified_tokens = VerifiedTokenCache(max_entries=settings.token_cache_size)
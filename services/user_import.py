@@ -0,0 +1,283 @@
+"""Bulk user import from CSV or NDJSON.
+
+Registering users one by one costs a bcrypt hash, a uniqueness query, an
+INSERT and a commit per user. An import instead streams the input and works
+in batches of IMPORT_BATCH records:
+
+- passwords are hashed on a pool of IMPORT_HASH_PROCESSES processes, and the
+  next batch is hashed while the current one is inserted;
+- usernames and emails are checked against the database with one IN query
+  per batch, and against earlier records of the same file;
+- users and their welcome emails (through the email outbox) are written with
+  one batched INSERT each and committed together.
+
+Every record needs `username`, `email` and `password`; `full_name`,
+`phone_number`, `address`, `date_of_birth` and `gender` are optional. CSV
+input has a header row; NDJSON has one JSON object per line. Records that are
+invalid or already taken are skipped and reported with their line number.
+
+Only `users.email` has a unique constraint. A username registered between a
+batch's check and its INSERT is not detected (registration has the same
+window), so an import that races sign-ups can create a duplicate username.
+A racing email makes the batch INSERT fail instead; the conflicting records
+are then skipped and the rest of the batch is written.
+"""
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from entities.user import User
+from services import email_outbox
+from services.password_service import hash_password, hasher
+
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "1000"))
+IMPORT_HASH_PROCESSES = int(os.getenv("IMPORT_HASH_PROCESSES", str(os.cpu_count() or 1)))
+# skipped records listed in the report; the rest are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+FORMATS = ("csv", "ndjson")
+REQUIRED_FIELDS = ("username", "email", "password")
+OPTIONAL_FIELDS = ("full_name", "phone_number", "address", "date_of_birth", "gender")
+
+_TAKEN = select(User.username, User.email).where(
+    or_(
+        User.username.in_(bindparam("usernames", expanding=True)),
+        User.email.in_(bindparam("emails", expanding=True)),
+    )
+)
+
+# one import at a time per process; each already uses every core for hashing
+_import_lock = threading.Lock()
+
+
+def detect_format(filename: Optional[str]) -> str:
+    """Input format from a file name (.csv, .ndjson/.jsonl); defaults to csv."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return "ndjson" if extension in (".ndjson", ".jsonl") else "csv"
+
+
+def read_records(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, record) pairs from a binary stream, one at a time.
+
+    A record is a dict of fields, or an error message for lines that cannot
+    be parsed.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, "invalid JSON"
+            continue
+        yield line_no, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def _clean(record) -> Tuple[Optional[dict], Optional[str]]:
+    """Validated user fields of a record, or an error message."""
+    if isinstance(record, str):
+        return None, record
+    row = {}
+    for field in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+        value = record.get(field)
+        row[field] = str(value).strip() if value not in (None, "") else None
+    missing = [field for field in REQUIRED_FIELDS if not row[field]]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    if "@" not in row["email"]:
+        return None, "invalid email"
+    # bcrypt only uses the first 72 bytes
+    if len(row["password"].encode("utf-8")) > 72:
+        return None, "password longer than 72 bytes"
+    return row, None
+
+
+class _Report:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def skip(self, line_no: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line_no, "error": reason})
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "seconds": round(time.perf_counter() - self.started, 2),
+        }
+
+
+def import_users(
+    db: Session,
+    records: Iterable[Tuple[int, object]],
+    send_welcome: bool = True,
+    batch_size: int = IMPORT_BATCH,
+    processes: int = IMPORT_HASH_PROCESSES,
+) -> dict:
+    """Create users from (line number, record) pairs; returns a report with
+    `created`, `skipped`, the first IMPORT_MAX_ERRORS `errors` and `seconds`.
+
+    Each batch is committed on its own, so an interrupted import keeps the
+    batches already written and can be re-run: existing users are skipped.
+    Returns 409 while another import is running in this process. Welcome
+    emails are only queued; the caller wakes the outbox worker if this
+    process runs one.
+    """
+    if not _import_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Another user import is running")
+    try:
+        report = _Report()
+        rounds = hasher.rounds
+        # usernames and emails accepted earlier in this file
+        seen_usernames, seen_emails = set(), set()
+        # spawned rather than forked: forking a process that runs server
+        # threads can copy locks held by those threads into the children
+        with ProcessPoolExecutor(
+            max_workers=max(1, processes), mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            pending = None
+            for batch in _batches(records, batch_size):
+                rows = _unique_rows(db, batch, seen_usernames, seen_emails, report)
+                # start hashing this batch before writing the previous one
+                hashes = pool.map(
+                    hash_password,
+                    [row["password"] for _, row in rows],
+                    itertools.repeat(rounds),
+                    chunksize=max(1, len(rows) // (processes * 4)),
+                )
+                if pending:
+                    _write_batch(db, *pending, send_welcome, report)
+                pending = (rows, hashes)
+            if pending:
+                _write_batch(db, *pending, send_welcome, report)
+        result = report.as_dict()
+        print(
+            f"[user_import] created {result['created']}, skipped {result['skipped']} "
+            f"in {result['seconds']}s"
+        )
+        return result
+    finally:
+        _import_lock.release()
+
+
+def _batches(records, batch_size: int):
+    records = iter(records)
+    while batch := list(itertools.islice(records, batch_size)):
+        yield batch
+
+
+def _unique_rows(db: Session, batch, seen_usernames: set, seen_emails: set, report: _Report):
+    """Valid rows of a batch whose username and email are not taken."""
+    rows = []
+    for line_no, record in batch:
+        row, error = _clean(record)
+        if error:
+            report.skip(line_no, error)
+        else:
+            rows.append((line_no, row))
+    if not rows:
+        return rows
+    taken = db.execute(
+        _TAKEN,
+        {
+            "usernames": [row["username"] for _, row in rows],
+            "emails": [row["email"] for _, row in rows],
+        },
+    ).all()
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken if email}
+    unique = []
+    for line_no, row in rows:
+        username, email = row["username"], row["email"]
+        if username in taken_usernames or username in seen_usernames:
+            report.skip(line_no, "username already exists")
+        elif email in taken_emails or email in seen_emails:
+            report.skip(line_no, "email already exists")
+        else:
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            unique.append((line_no, row))
+    return unique
+
+
+def _write_batch(db: Session, rows, hashes, send_welcome: bool, report: _Report):
+    users = [
+        (line_no, {**row, "password": hashed}) for (line_no, row), hashed in zip(rows, hashes)
+    ]
+    # an email registered concurrently since the uniqueness check makes the
+    # INSERT fail (usernames are not constrained, see the module docstring);
+    # drop the conflicting users and write the rest. Each retry removes at least
+    # the rows that conflicted, and a batch that still fails after a few
+    # rounds is reported as skipped instead of aborting the import.
+    for _ in range(3):
+        if not users:
+            return
+        try:
+            _insert(db, [user for _, user in users], send_welcome)
+            report.created += len(users)
+            return
+        except IntegrityError:
+            db.rollback()
+            users = _drop_taken(db, users, report)
+    for line_no, _ in users:
+        report.skip(line_no, "could not be inserted (concurrent changes)")
+
+
+def _drop_taken(db: Session, users, report: _Report):
+    taken = db.execute(
+        _TAKEN,
+        {
+            "usernames": [user["username"] for _, user in users],
+            "emails": [user["email"] for _, user in users],
+        },
+    ).all()
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+    remaining = []
+    for line_no, user in users:
+        if user["username"] in taken_usernames or user["email"] in taken_emails:
+            report.skip(line_no, "username or email already exists")
+        else:
+            remaining.append((line_no, user))
+    return remaining
+
+
+def _insert(db: Session, users: List[dict], send_welcome: bool):
+    db.execute(insert(User), users)
+    if send_welcome:
+        # rendered by the outbox worker at send time, so the activation link
+        # is still valid however long the import's emails wait in the queue
+        email_outbox.enqueue_many(
+            db,
+            (
+                email_outbox.template_message("welcome", user["email"], username=user["username"])
+                for user in users
+            ),
+        )
+    db.commit()
@@ -7,58 +7,92 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # add project ro
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, Response
 from fastapi import Request
-from typing import Optional
+from typing import Optional, Tuple
 
 from entities.user import User
 from entities import schemas as s
-import os, bcrypt
+import os
 import jwt
 from datetime import datetime, timedelta
-from services.mailer_service import send_welcome_email, send_reset_password_email
-
-
-def create_user(db: Session, user: s.UserCreate) -> dict:
+from services import email_outbox
+from sqlalchemy import bindparam, select
+from starlette.concurrency import run_in_threadpool
+from typing import Iterable, List
+from settings import settings
+from services.token_cache import verified_tokens
+from services.password_service import hasher
+from services.profile_cache import profiles
+
+
+# Hot-path statements are built once at import time with bound parameters, so
+# each call only supplies values and SQLAlchemy reuses the cached compiled SQL.
+_PROFILE_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.full_name,
+    User.address,
+    User.phone_number,
+    User.date_of_birth,
+    User.gender,
+    User.avatar_url.label("avatar"),
+)
+PROFILE_FIELDS = frozenset(column.key for column in _PROFILE_COLUMNS)
+_PROFILE_BY_ID = select(*_PROFILE_COLUMNS).where(User.id == bindparam("user_id"))
+_PROFILES_BY_IDS = select(*_PROFILE_COLUMNS).where(
+    User.id.in_(bindparam("ids", expanding=True))
+)
+USER_BATCH_MAX = int(os.getenv("USER_BATCH_MAX", "200"))
+_USER_BY_USERNAME = select(User).where(User.username == bindparam("username")).limit(1)
+
+
+async def create_user(db: Session, user: s.UserCreate) -> dict:
     # Create a User instance and let the database assign the primary key
     try:
-        return _extracted_from_create_user(db, user)
+        return await _extracted_from_create_user(db, user)
     except Exception as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         if isinstance(e, HTTPException):
             raise e  # re-raise HTTP exceptions as they are
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 # TODO Rename this here and in `create_user`
-def _extracted_from_create_user(db, user):
-    if existing_user := db.query(User).filter(User.username == user.username).first():
+async def _extracted_from_create_user(db, user):
+    if existing_user := await run_in_threadpool(_user_by_username, db, user.username):
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    # Hash the password before storing it (for security)
-    # Use bcrypt to hash the password (includes salt)
-    salt = bcrypt.gensalt()  # generate a random salt
-    hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), salt)
-    # store as utf-8 string so DB String column can hold it
-    hashed_password_str = hashed_password.decode("utf-8")
+    # Hash the password before storing it (for security); bcrypt runs on the
+    # bounded hashing executor, awaited without holding a server thread, and
+    # raises 503 when it is saturated
+    hashed_password_str = await hasher.hash_async(user.password)
 
-    db_user = User(
-        username=user.username, email=user.email, password=hashed_password_str
-    )
+    await run_in_threadpool(_insert_user, db, user, hashed_password_str)
+    email_outbox.worker.wake()
+
+    return {"message": "User created successfully"}
+
+
+def _user_by_username(db: Session, username: str) -> Optional[User]:
+    return db.scalars(_USER_BY_USERNAME, {"username": username}).first()
+
+
+def _insert_user(db: Session, user: s.UserCreate, hashed_password: str):
+    db_user = User(username=user.username, email=user.email, password=hashed_password)
     print(f"[debug] creating user: {db_user.username}, email: {db_user.email}")
     db.add(db_user)
+    # welcome email goes to the outbox in the same transaction; the background
+    # worker sends it, so registration does not wait on SMTP
+    email_outbox.enqueue_template(db, "welcome", db_user.email, username=db_user.username)
     db.commit()
     db.refresh(db_user)  # refresh to get the generated id
 
-    # send welcome email (optional, can be commented out if not set up)
-    send_welcome_email(db_user.email, db_user.username)
-
-    return {"message": "User created successfully"}
-
 
-def login_user(
+async def login_user(
     db: Session, user: s.UserLogin, response: Response, domain: Optional[str] = None
 ) -> dict:
     try:
-        return _extracted_from_login_user(db, user, response, domain)
+        return await _extracted_from_login_user(db, user, response, domain)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e  # re-raise HTTP exceptions as they are
@@ -66,16 +100,16 @@ def login_user(
 
 
 # TODO Rename this here and in `login_user`
-def _extracted_from_login_user(db, user, response, domain):
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def _extracted_from_login_user(db, user, response, domain):
+    db_user = await run_in_threadpool(_user_by_username, db, user.username)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # ensure stored password is bytes for bcrypt.checkpw
     stored = db_user.password
-    stored_bytes = stored.encode("utf-8") if isinstance(stored, str) else stored
-    if not bcrypt.checkpw(user.password.encode("utf-8"), stored_bytes):
+    if not await hasher.verify_async(user.password, stored):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # upgrade hashes made with an older bcrypt cost, off the request path
+    hasher.rehash_if_needed(User, db_user.id, user.password, stored)
 
     # use userId key for consistency with /users/me
     token_payload = {"userId": db_user.id, "username": db_user.username}
@@ -93,19 +127,32 @@ def logout_user(response: Response) -> dict:
 
 
 def verify_token(token: str) -> Optional[int]:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    """Return the `userId` of a valid token, or None if it is invalid or expired.
+
+    Verified tokens are cached until their `exp`, so repeat requests with the
+    same cookie are a dict lookup instead of a full `jwt.decode`.
+    """
+    if not token:
+        return None
+    user_id = verified_tokens.get(token)
+    if user_id is not None:
+        return user_id
     try:
-        payload = jwt.decode(token, jwt_secret, algorithms=["HS256"])
-        user_id = payload.get("userId")  # use userId key as set in login_user
-        return None if user_id is None else user_id
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
     except jwt.ExpiredSignatureError:
         return None  # token expired
     except Exception:
         return None  # invalid token
+    user_id = payload.get("userId")  # use userId key as set in login_user
+    if user_id is None:
+        return None
+    if exp := payload.get("exp"):
+        verified_tokens.put(token, user_id, exp)
+    return user_id
 
 
 def activate_user(db: Session, token: str) -> dict:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     try:
         return _extracted_from_activate_user(token, jwt_secret, db)
     except jwt.ExpiredSignatureError as e:
@@ -134,19 +181,18 @@ def _extracted_from_activate_user(token, jwt_secret, db):
 
 
 def get_profile(db: Session, user_id: int) -> dict:
+    return get_profile_with_etag(db, user_id)[0]
+
+
+def get_profile_with_etag(db: Session, user_id: int) -> Tuple[dict, str]:
+    """Return (profile, etag), read through the process-level profile cache."""
+    if cached := profiles.get(user_id):
+        return dict(cached[0]), cached[1]
     try:
-        if user := db.query(User).filter(User.id == user_id).first():
-            return {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "full_name": user.full_name,
-                "address": user.address,
-                "phone_number": user.phone_number,
-                "date_of_birth": user.date_of_birth,
-                "gender": user.gender,
-                "avatar": user.avatar_url,
-            }
+        generation = profiles.generation
+        if row := db.execute(_PROFILE_BY_ID, {"user_id": user_id}).first():
+            profile = dict(row._mapping)
+            return dict(profile), profiles.put(user_id, profile, generation)
         else:
             raise HTTPException(status_code=404, detail="User not found")
     except Exception as e:
@@ -155,6 +201,50 @@ def get_profile(db: Session, user_id: int) -> dict:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
+def get_profiles(
+    db: Session, user_ids: Iterable[int], fields: Optional[Iterable[str]] = None
+) -> dict:
+    """Return many profiles at once, in request order, plus the ids not found.
+
+    Cached profiles are served from the profile cache; the rest are loaded
+    with a single IN query and cached. `fields` limits each profile to the
+    given keys (`id` is always included).
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if len(ids) > USER_BATCH_MAX:
+        raise HTTPException(
+            status_code=400, detail=f"At most {USER_BATCH_MAX} ids per request"
+        )
+    if fields is not None:
+        fields = set(fields) | {"id"}
+        if unknown := fields - PROFILE_FIELDS:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+
+    found = {}
+    to_load: List[int] = []
+    for user_id in ids:
+        if cached := profiles.get(user_id):
+            found[user_id] = cached[0]
+        else:
+            to_load.append(user_id)
+    if to_load:
+        generation = profiles.generation
+        for row in db.execute(_PROFILES_BY_IDS, {"ids": to_load}).all():
+            profile = dict(row._mapping)
+            profiles.put(profile["id"], profile, generation)
+            found[profile["id"]] = profile
+
+    items = []
+    for user_id in ids:
+        if (profile := found.get(user_id)) is not None:
+            if fields is not None:
+                profile = {key: profile[key] for key in profile if key in fields}
+            items.append(dict(profile))
+    return {"items": items, "missing": [i for i in ids if i not in found]}
+
+
 def update_profile(db: Session, user_id: int, profile_data: dict) -> dict:
     try:
         return _extracted_from_update_profile(db, user_id, profile_data)
@@ -183,6 +273,7 @@ def _extracted_from_upload_avatar(db, user_id, avatar_url):
 
     user.avatar_url = avatar_url
     db.commit()
+    profiles.invalidate(user_id)
     db.refresh(user)
     return {"message": "Avatar updated successfully"}
 
@@ -199,6 +290,7 @@ def _extracted_from_update_profile(db, user_id, profile_data):
             setattr(user, key, value)
 
     db.commit()
+    profiles.invalidate(user_id)
     db.refresh(user)
     return {"message": "Profile updated successfully"}
 
@@ -221,7 +313,7 @@ def refresh_access_token(
     now = datetime.now(timezone.utc)
     with contextlib.suppress(Exception):
         payload = jwt.decode(
-            refresh_token, os.getenv("SECRET_KEY", "dev-secret"), algorithms=["HS256"]
+            refresh_token, settings.secret_key, algorithms=["HS256"]
         )
         exp = payload.get("exp")
         if exp and datetime.fromtimestamp(exp, timezone.utc) > now:
@@ -239,38 +331,49 @@ def reset_password(db: Session, user_id: int) -> dict:
 
     # In a real application, generate a secure token and send a password reset link
     # For this example, we'll just send a simple notification
-    send_reset_password_email(user.email, user.username, user.username)
+    email_outbox.enqueue_template(
+        db, "reset_password", user.email, token=user.username, username=user.username
+    )
+    db.commit()
+    email_outbox.worker.wake()
     return {"message": "Password reset instructions sent to email"}
 
 
-def change_password(db: Session, user_id: int, new_password: str) -> dict:
-    user = db.query(User).filter(User.id == user_id).first()
+async def change_password(db: Session, user_id: int, new_password: str) -> dict:
+    user = await run_in_threadpool(_user_by_id, db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Hash the new password before storing it
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(new_password.encode("utf-8"), salt)
-    hashed_password_str = hashed_password.decode("utf-8")
+    hashed_password_str = await hasher.hash_async(new_password)
 
-    user.password = hashed_password_str
-    db.commit()
-    db.refresh(user)
+    await run_in_threadpool(_set_password, db, user, hashed_password_str)
+    profiles.invalidate(user_id)
 
     return {"message": "Password changed successfully"}
 
 
+def _user_by_id(db: Session, user_id: int) -> Optional[User]:
+    return db.query(User).filter(User.id == user_id).first()
+
+
+def _set_password(db: Session, user: User, hashed_password: str):
+    user.password = hashed_password
+    db.commit()
+    db.refresh(user)
+
+
 def generate_token(
     payload: dict, response: Response, domain: Optional[str] = None
 ) -> str:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
-    exp = now + timedelta(hours=1)
+    exp = now + timedelta(seconds=settings.access_token_ttl_seconds)
     token = jwt.encode(
         {**payload, "exp": exp, "iat": now}, jwt_secret, algorithm="HS256"
     )
     # use secure cookies only in production (HTTPS). For local testing over HTTP set secure=False
-    secure_flag = os.getenv("ENV", "development") == "production"
+    secure_flag = settings.secure_cookies
     # set cookie with path and max_age so browsers accept it predictably
     response.set_cookie(
         key="access_token",
@@ -280,7 +383,7 @@ def generate_token(
         samesite="None",  # allow cross-site cookies for testing; set to "Lax" or "Strict" in production
         path="/",
         domain=domain,
-        max_age=3600,  # 1 hour in seconds
+        max_age=settings.access_token_ttl_seconds,
     )
     # debug: print Set-Cookie header that was added to the response
     with contextlib.suppress(Exception):
@@ -291,14 +394,14 @@ def generate_token(
 def generate_refresh_token(
     payload: dict, response: Response, domain: Optional[str] = None
 ) -> str:
-    jwt_secret = os.getenv("SECRET_KEY", "dev-secret")
+    jwt_secret = settings.secret_key
     now = datetime.now(timezone.utc)
-    exp = now + timedelta(days=7)  # refresh token valid for 7 days
+    exp = now + timedelta(seconds=settings.refresh_token_ttl_seconds)
     token = jwt.encode(
         {**payload, "exp": exp, "iat": now}, jwt_secret, algorithm="HS256"
     )
     # use secure cookies only in production (HTTPS). For local testing over HTTP set secure=False
-    secure_flag = os.getenv("ENV", "development") == "production"
+    secure_flag = settings.secure_cookies
     response.set_cookie(
         key="refresh_token",
         value=token,
@@ -307,7 +410,7 @@ def generate_refresh_token(
         samesite="None",  # allow cross-site cookies for testing; set to "Lax" or "Strict" in production
         path="/",
         domain=domain,
-        max_age=7 * 24 * 3600,
+        max_age=settings.refresh_token_ttl_seconds,
     )
     with contextlib.suppress(Exception):
         print("[debug] set-refresh-cookie header:", response.headers.get("set-cookie"))
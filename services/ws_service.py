@@ -1,7 +1,16 @@
 import asyncio
-from typing import Dict, Set, Any, Optional
+import json
+import os
+import time
+from typing import Dict, Iterable, Set, Any, Optional
 import traceback
 
+# per-socket send timeout for room fan-out, so one slow client cannot stall a room
+ROOM_SEND_TIMEOUT = float(os.getenv("WS_ROOM_SEND_TIMEOUT", "5"))
+# seconds a loaded room member set is trusted for fan-out; changes made by
+# other server processes show up after at most this long
+ROOM_INDEX_TTL = float(os.getenv("WS_ROOM_INDEX_TTL", "30"))
+
 
 class WebSocketManager:
     """Manage websocket connections keyed by user_id.
@@ -18,6 +27,12 @@ class WebSocketManager:
         self._loops: Dict[Any, asyncio.AbstractEventLoop] = {}
         # websocket -> metadata (e.g., current chat the websocket is viewing)
         self._current_chat: Dict[Any, int] = {}
+        # room membership index used for fan-out without a DB read per message:
+        # room_id -> member user ids (only for rooms loaded via set_room_members).
+        # Not used for authorization; see room_service.
+        self._room_members: Dict[int, Set[int]] = {}
+        # room_id -> monotonic time the member set was loaded
+        self._room_loaded_at: Dict[int, float] = {}
 
     async def connect(self, websocket, user_id: int):
         await websocket.accept()
@@ -77,6 +92,82 @@ class WebSocketManager:
         conns = list(self.connections.get(user_id, []))
         return any(self._current_chat.get(ws) == chat_with_user_id for ws in conns)
 
+    # -- room membership index -------------------------------------------
+    def has_room(self, room_id: int) -> bool:
+        """True if the room's member set is loaded and younger than ROOM_INDEX_TTL."""
+        loaded_at = self._room_loaded_at.get(room_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < ROOM_INDEX_TTL
+
+    def set_room_members(self, room_id: int, user_ids: Iterable[int]):
+        """Load (or replace) the member set for a room."""
+        self._room_members[room_id] = set(user_ids)
+        self._room_loaded_at[room_id] = time.monotonic()
+
+    def get_room_members(self, room_id: int) -> Set[int]:
+        return self._room_members.get(room_id, set())
+
+    def add_room_member(self, room_id: int, user_id: int):
+        # only patch rooms already indexed; others are loaded on first use
+        if room_id in self._room_members:
+            self._room_members[room_id].add(user_id)
+
+    def remove_room_member(self, room_id: int, user_id: int):
+        if room_id in self._room_members:
+            self._room_members[room_id].discard(user_id)
+
+    def drop_room(self, room_id: int):
+        self._room_members.pop(room_id, None)
+        self._room_loaded_at.pop(room_id, None)
+
+    def online_room_members(self, room_id: int) -> Set[int]:
+        """Members of `room_id` with at least one open websocket."""
+        members = self._room_members.get(room_id) or set()
+        # iterate the smaller side so cost is bounded by min(members, online users)
+        if len(members) <= len(self.connections):
+            return {uid for uid in members if uid in self.connections}
+        return {uid for uid in self.connections if uid in members}
+
+    def send_room_sync(
+        self, room_id: int, message: dict, exclude: Optional[int] = None
+    ) -> int:
+        """Fan a message out to every online member of a room (see send_users_sync)."""
+        return self.send_users_sync(
+            (uid for uid in self.online_room_members(room_id) if uid != exclude), message
+        )
+
+    def send_users_sync(self, user_ids: Iterable[int], message: dict) -> int:
+        """Send one message to many users' websockets (offline users are skipped).
+
+        The payload is serialized once and each event loop receives a single
+        batch coroutine that sends to its sockets concurrently with a per-socket
+        timeout. Returns the number of websockets the message was queued for.
+        """
+        payload = json.dumps(message, default=str)
+        by_loop: Dict[asyncio.AbstractEventLoop, list] = {}
+        for uid in user_ids:
+            for ws in list(self.connections.get(uid, [])):
+                loop = self._loops.get(ws)
+                if loop and loop.is_running():
+                    by_loop.setdefault(loop, []).append(ws)
+
+        queued = 0
+        for loop, sockets in by_loop.items():
+            try:
+                asyncio.run_coroutine_threadsafe(self._send_many(sockets, payload), loop)
+                queued += len(sockets)
+            except Exception:
+                traceback.print_exc()
+        return queued
+
+    async def _send_many(self, sockets: list, payload: str):
+        async def _send(ws):
+            try:
+                await asyncio.wait_for(ws.send_text(payload), timeout=ROOM_SEND_TIMEOUT)
+            except Exception:
+                traceback.print_exc()
+
+        await asyncio.gather(*(_send(ws) for ws in sockets))
+
     async def broadcast(self, message: dict):
         for user_id in list(self.connections.keys()):
             await self.send_personal(user_id, message)
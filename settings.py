@@ -0,0 +1,55 @@
+"""Application settings read from the environment once at import time.
+
+Import `settings` instead of calling os.getenv on hot paths (every request
+verifies a token). Values are fixed for the life of the process; restart
+to pick up changes.
+"""
+import os
+from dataclasses import dataclass
+
+# Optionally load environment variables from a .env file (development convenience)
+try:
+    from dotenv import load_dotenv
+
+    # project-root .env; variables already set in the environment win
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+except Exception:
+    # dotenv is optional; requirements include python-dotenv so this should usually succeed
+    pass
+
+
+@dataclass(frozen=True)
+class Settings:
+    secret_key: str
+    jwt_algorithm: str
+    env: str
+    access_token_ttl_seconds: int
+    refresh_token_ttl_seconds: int
+    token_cache_size: int
+    profile_cache_size: int
+    profile_cache_ttl_seconds: float
+    admin_role_cache_ttl_seconds: float
+
+    @property
+    def secure_cookies(self) -> bool:
+        # secure cookies only in production (HTTPS); local testing runs over HTTP
+        return self.env == "production"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            secret_key=os.getenv("SECRET_KEY", "dev-secret"),
+            jwt_algorithm="HS256",
+            env=os.getenv("ENV", "development"),
+            access_token_ttl_seconds=int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", "3600")),
+            refresh_token_ttl_seconds=int(
+                os.getenv("REFRESH_TOKEN_TTL_SECONDS", str(7 * 24 * 3600))
+            ),
+            token_cache_size=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "50000")),
+            profile_cache_size=int(os.getenv("PROFILE_CACHE_SIZE", "20000")),
+            profile_cache_ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL", "60")),
+            admin_role_cache_ttl_seconds=float(os.getenv("ADMIN_ROLE_CACHE_TTL", "30")),
+        )
+
+
+settings = Settings.from_env()
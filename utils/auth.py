@@ -5,13 +5,16 @@ from database import get_db
 from sqlalchemy.orm import Session
 
 
-def auth_required(request: Request, db: Session = Depends(get_db)):
-    """Dependency to require authentication on a route.
+def authenticate(request: Request) -> int:
+    """Verify the `access_token` cookie once per request and return its user id.
 
-    Usage:
-      - as a dependency in a route: dependencies=[Depends(auth_required)]
-      - or to get the user id: user_id = Depends(auth_required)
+    The result is kept on `request.state`, so `auth_required`, `require_role`
+    and any other dependency of the same request share one verification.
     """
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is not None:
+        return user_id
+
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -19,6 +22,18 @@ def auth_required(request: Request, db: Session = Depends(get_db)):
     user_id = verify_token(token)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    request.state.user_id = user_id
+    return user_id
+
+
+def auth_required(request: Request, db: Session = Depends(get_db)):
+    """Dependency to require authentication on a route.
+
+    Usage:
+      - as a dependency in a route: dependencies=[Depends(auth_required)]
+      - or to get the user id: user_id = Depends(auth_required)
+    """
+    user_id = authenticate(request)
 
     # activated user_id in request.state for access in route handlers
     # `get_db()` is a FastAPI dependency that yields a Session; here we
@@ -31,8 +46,6 @@ def auth_required(request: Request, db: Session = Depends(get_db)):
     # if not is_verified:
     #     raise HTTPException(status_code=403, detail="Account not verified")
 
-    # Attach user_id to request state for access in route handlers
-    request.state.user_id = user_id
     return user_id
 
 
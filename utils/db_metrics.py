@@ -0,0 +1,173 @@
+"""Connection pool instrumentation built on SQLAlchemy pool events.
+
+`pool_metrics.install(engine)` is called from `database.py`. It tracks:
+  - checked-out / overflow / idle connections (read live from the pool)
+  - a histogram of how long callers waited to acquire a connection
+  - checkout hold time per endpoint (endpoint label set by middleware)
+  - connections held longer than DB_POOL_LEAK_SECONDS (likely leaked)
+"""
+import contextvars
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+# label of the endpoint currently being served; set by RequestLoggerMiddleware
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_endpoint", default="-"
+)
+
+# histogram bucket upper bounds in milliseconds (last bucket is +inf)
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    def __init__(self, leak_seconds: float = 60.0):
+        self.leak_seconds = leak_seconds
+        self._lock = threading.Lock()
+        self._engine = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            # endpoint -> {"count", "total_ms", "max_ms"}
+            self.hold_by_endpoint: Dict[str, Dict[str, float]] = {}
+            # id(connection_record) -> (checked out at, endpoint)
+            self._outstanding: Dict[int, tuple] = {}
+
+    def install(self, engine):
+        """Attach pool listeners to `engine` and time connection acquisition.
+
+        Listeners are registered on the engine, not its current pool, so they
+        carry over to the new pool `engine.dispose()` creates. Pool events
+        only fire once a connection has been acquired, so the wait is timed
+        around `engine.raw_connection()`, which every Connection goes through.
+        """
+        self._engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+        original_raw_connection = engine.raw_connection
+
+        def timed_raw_connection(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_raw_connection(*args, **kwargs)
+            finally:
+                self._record_wait((time.perf_counter() - start) * 1000)
+
+        engine.raw_connection = timed_raw_connection
+        return self
+
+    # -- event handlers -------------------------------------------------
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self._outstanding[id(connection_record)] = (
+                time.monotonic(),
+                current_endpoint.get(),
+            )
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        now = time.monotonic()
+        with self._lock:
+            self.checkins += 1
+            entry = self._outstanding.pop(id(connection_record), None)
+            if entry is None:
+                return
+            started, endpoint = entry
+            held_ms = (now - started) * 1000
+            stats = self.hold_by_endpoint.setdefault(
+                endpoint, {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_ms"] += held_ms
+            stats["max_ms"] = max(stats["max_ms"], held_ms)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def _record_wait(self, waited_ms: float):
+        idx = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                idx = i
+                break
+        with self._lock:
+            self.wait_buckets[idx] += 1
+            self.wait_total_ms += waited_ms
+            self.wait_max_ms = max(self.wait_max_ms, waited_ms)
+
+    # -- reporting ------------------------------------------------------
+    def _pool_state(self) -> Dict[str, Optional[int]]:
+        pool = self._engine.pool if self._engine is not None else None
+
+        def _call(name):
+            fn = getattr(pool, name, None)
+            try:
+                return fn() if callable(fn) else None
+            except Exception:
+                return None
+
+        overflow = _call("overflow")
+        return {
+            "size": _call("size"),
+            "checked_out": _call("checkedout"),
+            "checked_in": _call("checkedin"),
+            # QueuePool reports unused base capacity as negative overflow
+            "overflow": max(overflow, 0) if overflow is not None else None,
+        }
+
+    def snapshot(self) -> dict:
+        """Return a JSON-serializable view of the current pool metrics."""
+        now = time.monotonic()
+        with self._lock:
+            waits = sum(self.wait_buckets)
+            labels = [f"le_{b}ms" for b in WAIT_BUCKETS_MS] + ["le_inf"]
+            leaked = [
+                {"endpoint": endpoint, "held_seconds": round(now - started, 3)}
+                for started, endpoint in self._outstanding.values()
+                if now - started >= self.leak_seconds
+            ]
+            hold = {
+                endpoint: {
+                    "count": int(st["count"]),
+                    "avg_ms": round(st["total_ms"] / st["count"], 3) if st["count"] else 0.0,
+                    "max_ms": round(st["max_ms"], 3),
+                }
+                for endpoint, st in self.hold_by_endpoint.items()
+            }
+            return {
+                "pool": self._pool_state(),
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait": {
+                    "count": waits,
+                    "avg_ms": round(self.wait_total_ms / waits, 3) if waits else 0.0,
+                    "max_ms": round(self.wait_max_ms, 3),
+                    "histogram": dict(zip(labels, self.wait_buckets)),
+                },
+                "hold_by_endpoint": hold,
+                "leaked": leaked,
+            }
+
+
+pool_metrics = PoolMetrics(leak_seconds=float(os.getenv("DB_POOL_LEAK_SECONDS", "60")))
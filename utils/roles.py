@@ -1,10 +1,14 @@
 from fastapi import Request, HTTPException, Depends
 from typing import Iterable
 from database import get_db
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 
-from services.user_service import verify_token
 from entities.user import UserAdmin
+from services.role_cache import admin_roles
+from utils.auth import authenticate
+
+_ADMIN_ROLE = select(UserAdmin.role).where(UserAdmin.id == bindparam("admin_id"))
 
 
 def require_role(*allowed_roles: Iterable[str]):
@@ -13,31 +17,26 @@ def require_role(*allowed_roles: Iterable[str]):
 
       dependencies=[Depends(require_role('admin','super_admin'))]
 
-    This dependency expects `auth_required` to have run (or it will call
-    token verification itself) and relies on `get_db` for DB access.
+    The token is verified once per request (shared with `auth_required`) and
+    the admin's role comes from a short-lived cache, so the `user_admins`
+    table is only read on a cache miss.
     """
 
     def _dependency(request: Request, db: Session = Depends(get_db)):
         # Ensure authentication via access_token cookie
-        token = request.cookies.get("access_token")
-        if not token:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-
-        user_id = verify_token(token)
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user_id = authenticate(request)
 
-        # load admin record
-        admin = db.query(UserAdmin).filter(UserAdmin.id == user_id).first()
-        if not admin:
+        # load admin role; None when there is no admin account for this id
+        role = admin_roles.get_or_load(
+            user_id, lambda admin_id: db.scalar(_ADMIN_ROLE, {"admin_id": admin_id})
+        )
+        if role is None:
             raise HTTPException(status_code=403, detail="Admin account not found")
 
-        role = getattr(admin, "role", None)
         if role not in allowed_roles:
             raise HTTPException(status_code=403, detail="Forbidden: insufficient role")
 
         # attach admin info to request.state for downstream handlers if needed
-        request.state.user_id = user_id
         request.state.user_role = role
         return True
 